@@ -1,3 +1,5 @@
+from kazo.charts.cache import Chart, chart_cache
+from kazo.charts.renderer import RenderError, chart_renderer
 from kazo.charts.templates import (
     daily_spending_chart,
     monthly_trend_chart,
@@ -5,6 +7,10 @@ from kazo.charts.templates import (
 )
 
 __all__ = [
+    "Chart",
+    "RenderError",
+    "chart_cache",
+    "chart_renderer",
     "daily_spending_chart",
     "monthly_trend_chart",
     "spending_by_category_chart",
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from kazo.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Chart:
+    """A rendered chart: its cache key, the PNG bytes, and the Telegram file_id once it has been uploaded."""
+
+    key: str
+    png: bytes
+    file_id: str | None = None
+
+
+def chart_key(*parts: Any) -> str:
+    """Hash of everything a chart is drawn from; identical inputs give an identical image."""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ChartCache:
+    """Rendered charts keyed by content hash, held in memory and evicted least recently used past max_bytes.
+
+    A chart remembers the file_id Telegram assigned on first upload, so identical charts are re-sent by reference.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._charts: OrderedDict[str, Chart] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Chart | None:
+        chart = self._charts.get(key)
+        if chart is None:
+            self.misses += 1
+            return None
+        self._charts.move_to_end(key)
+        self.hits += 1
+        return chart
+
+    def put(self, key: str, png: bytes) -> Chart:
+        if (old := self._charts.pop(key, None)) is not None:
+            self._bytes -= len(old.png)
+        chart = Chart(key, png)
+        self._charts[key] = chart
+        self._bytes += len(png)
+        while self._bytes > self.max_bytes and len(self._charts) > 1:
+            evicted_key, evicted = self._charts.popitem(last=False)
+            self._bytes -= len(evicted.png)
+            logger.debug("Evicted cached chart %s", evicted_key)
+        return chart
+
+    def remember_file_id(self, key: str, file_id: str) -> None:
+        if (chart := self._charts.get(key)) is not None:
+            chart.file_id = file_id
+
+    def forget_file_id(self, key: str) -> None:
+        if (chart := self._charts.get(key)) is not None:
+            chart.file_id = None
+
+    def stats(self) -> dict:
+        return {"charts": len(self._charts), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+chart_cache = ChartCache(int(settings.chart_cache_max_mb * 1024 * 1024))
@@ -0,0 +1,260 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+from collections.abc import Callable
+from multiprocessing.connection import Connection
+from typing import Any
+
+from kazo.config import settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_STARTUP_TIMEOUT = 60.0
+
+FigureSpec = dict[str, Any]
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderTimeout(RenderError):
+    pass
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _read_proc(pid: str, name: str) -> str | None:
+    try:
+        with open(f"/proc/{pid}/{name}") as f:
+            return f.read()
+    except OSError:  # exited meanwhile
+        return None
+
+
+def _tree_rss_mb(pid: int | None = None) -> float:
+    """Current resident memory of a process and all its descendants, in MB.
+
+    A render worker's browser runs in child processes its own rusage doesn't include. Read from /proc; where
+    there is none, only the process's own peak RSS is available.
+    """
+    pid = pid or os.getpid()
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return _peak_rss_mb()
+    children: dict[int, list[str]] = {}
+    for p in pids:
+        stat = _read_proc(p, "stat")
+        if stat:
+            # The command name in parentheses may contain spaces; the parent pid is the second field after it.
+            children.setdefault(int(stat.rsplit(")", 1)[1].split()[1]), []).append(p)
+
+    resident_pages = 0
+    stack = [str(pid)]
+    while stack:
+        p = stack.pop()
+        statm = _read_proc(p, "statm")
+        if statm:
+            resident_pages += int(statm.split()[1])
+        stack.extend(children.get(int(p), ()))
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _worker_main(target: Callable[[Connection], None], conn: Connection) -> None:
+    """Run a render worker as the leader of its own process group, so killing the group takes its browser too."""
+    os.setsid()
+    target(conn)
+
+
+def _render(spec: FigureSpec, scale: float) -> bytes:
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    return pio.to_image(go.Figure(spec), format="png", scale=scale)
+
+
+def _render_worker(conn: Connection) -> None:
+    """Worker process: keep one kaleido browser running and render figure specs until told to stop."""
+    import kaleido
+
+    start_server = getattr(kaleido, "start_sync_server", None)
+    if start_server is not None:
+        start_server(silence_warnings=True)
+    # Pay browser startup before real work; a broken setup surfaces on the first real render instead.
+    with contextlib.suppress(Exception):
+        _render({"data": [], "layout": {"width": 10, "height": 10}}, 1)
+    conn.send(("ready", None, _tree_rss_mb()))
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            spec, scale = message
+            try:
+                conn.send(("ok", _render(spec, scale), _tree_rss_mb()))
+            except Exception as e:
+                conn.send(("error", repr(e), _tree_rss_mb()))
+    finally:
+        stop_server = getattr(kaleido, "stop_sync_server", None)
+        if stop_server is not None:
+            stop_server(silence_warnings=True)
+
+
+class _Worker:
+    """One render process and the parent end of its pipe. Its blocking methods run in a thread, never on the loop."""
+
+    def __init__(self, ctx, target: Callable[[Connection], None]):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(target, child), daemon=True, name="kazo-chart-render")
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.renders = 0
+
+    def call(self, spec: FigureSpec, scale: float, timeout: float) -> tuple[str, Any, float]:
+        if not self.ready:
+            if not self.conn.poll(WORKER_STARTUP_TIMEOUT):
+                raise RenderTimeout("render worker did not start")
+            self.conn.recv()
+            self.ready = True
+        self.conn.send((spec, scale))
+        if not self.conn.poll(timeout):
+            raise RenderTimeout(f"render took longer than {timeout:.0f}s")
+        return self.conn.recv()
+
+    def retire(self) -> None:
+        with contextlib.suppress(OSError):
+            self.conn.send(None)
+        self.process.join(5)
+        self.kill()
+
+    def kill(self) -> None:
+        """Kill the worker and whatever it started (its browser), even if the worker itself already exited."""
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(self.process.pid, signal.SIGKILL)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    """Chart rendering in a pool of worker processes, each keeping a warm kaleido browser.
+
+    Figures are sent as plain specs over a pipe. A render that exceeds the timeout kills its worker's process
+    group; workers are replaced after max_renders renders or once the RSS of their process tree passes
+    max_memory_mb. With workers=0 figures render
+    in a thread of this process instead.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        max_renders: int,
+        max_memory_mb: float,
+        target: Callable[[Connection], None] = _render_worker,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_renders = max_renders
+        self.max_memory_mb = max_memory_mb
+        self._target = target
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: asyncio.Queue[_Worker] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._all: set[_Worker] = set()
+        self.rendered = 0
+        self.failed = 0
+        self.recycled = 0
+
+    async def _spawn(self) -> _Worker:
+        worker = await asyncio.to_thread(_Worker, self._ctx, self._target)
+        self._all.add(worker)
+        return worker
+
+    async def _ensure_started(self) -> asyncio.Queue[_Worker]:
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._loop is not loop:
+            self._loop = loop
+            self._idle = asyncio.Queue()
+            for worker in await asyncio.gather(*(self._spawn() for _ in range(self.workers))):
+                self._idle.put_nowait(worker)
+        return self._idle
+
+    async def start(self) -> None:
+        """Spawn the workers now so their browsers are warm before the first chart is requested."""
+        if self.workers > 0:
+            await self._ensure_started()
+
+    async def _discard(self, worker: _Worker, graceful: bool) -> None:
+        self._all.discard(worker)
+        await asyncio.to_thread(worker.retire if graceful else worker.kill)
+
+    async def render(self, spec: FigureSpec, scale: float = 1) -> bytes:
+        if self.workers <= 0:
+            return await asyncio.to_thread(_render, spec, scale)
+
+        idle = await self._ensure_started()
+        worker = await idle.get()
+        try:
+            status, payload, rss_mb = await asyncio.to_thread(worker.call, spec, scale, self.timeout)
+        except BaseException as e:
+            # Timed out, crashed, or the caller gave up: the worker may still be busy, so replace it.
+            self.failed += 1
+            await self._discard(worker, graceful=False)
+            idle.put_nowait(await self._spawn())
+            if isinstance(e, RenderError):
+                raise
+            if isinstance(e, OSError | EOFError):
+                raise RenderError("render worker died") from e
+            raise
+
+        worker.renders += 1
+        if worker.renders >= self.max_renders or rss_mb > self.max_memory_mb:
+            logger.info("Recycling chart worker after %d renders (%.0f MB)", worker.renders, rss_mb)
+            self.recycled += 1
+            await self._discard(worker, graceful=True)
+            worker = await self._spawn()
+        idle.put_nowait(worker)
+
+        if status != "ok":
+            self.failed += 1
+            raise RenderError(payload)
+        self.rendered += 1
+        return payload
+
+    async def stop(self) -> None:
+        workers, self._all = list(self._all), set()
+        await asyncio.gather(*(asyncio.to_thread(w.retire) for w in workers))
+        self._idle = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._all),
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "recycled": self.recycled,
+        }
+
+
+chart_renderer = RenderPool(
+    settings.chart_render_workers,
+    settings.chart_render_timeout,
+    settings.chart_render_max_renders,
+    settings.chart_render_max_memory_mb,
+)
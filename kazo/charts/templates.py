@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-import tempfile
-from typing import Any
-
-import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pio
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
 
+from kazo.charts.cache import Chart, chart_cache, chart_key
+from kazo.charts.renderer import chart_renderer
 from kazo.currency import currency_symbol
 
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 THEME: dict[str, Any] = {
     "colors": {
         "palette": [
@@ -50,22 +51,44 @@ THEME: dict[str, Any] = {
 
 PIE_CATEGORY_THRESHOLD = 6
 
-_custom_template = pio.templates["plotly_white"]
-_custom_template.layout.font = dict(
-    family=THEME["font"]["family"],
-    size=THEME["font"]["size"],
-    color=THEME["colors"]["text"],
-)
-_custom_template.layout.title = dict(
-    font=dict(size=THEME["font"]["title_size"], color=THEME["colors"]["text"]),
-    x=0.5,
-    xanchor="center",
-)
-_custom_template.layout.plot_bgcolor = THEME["colors"]["background"]
-_custom_template.layout.xaxis = dict(gridcolor=THEME["colors"]["grid"])
-_custom_template.layout.yaxis = dict(gridcolor=THEME["colors"]["grid"])
-pio.templates["kazo"] = _custom_template
-pio.templates.default = "kazo"
+
+def _plotly() -> ModuleType:
+    """Import plotly on first use (it is slow to load) and register the kazo template; returns graph_objects."""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    if "kazo" not in pio.templates:
+        template = pio.templates["plotly_white"]
+        template.layout.font = dict(
+            family=THEME["font"]["family"],
+            size=THEME["font"]["size"],
+            color=THEME["colors"]["text"],
+        )
+        template.layout.title = dict(
+            font=dict(size=THEME["font"]["title_size"], color=THEME["colors"]["text"]),
+            x=0.5,
+            xanchor="center",
+        )
+        template.layout.plot_bgcolor = THEME["colors"]["background"]
+        template.layout.xaxis = dict(gridcolor=THEME["colors"]["grid"])
+        template.layout.yaxis = dict(gridcolor=THEME["colors"]["grid"])
+        pio.templates["kazo"] = template
+        pio.templates.default = "kazo"
+    return go
+
+
+def warm_up() -> None:
+    """Load plotly and numpy ahead of the first chart; run it off the event loop."""
+    import numpy  # noqa: F401
+
+    _plotly()
+
+
+def _linear_trend(totals: list[float]) -> list[float]:
+    import numpy as np
+
+    x_idx = list(range(len(totals)))
+    return np.polyval(np.polyfit(x_idx, totals, 1), x_idx).tolist()
 
 
 def _fmt_amount(value: float, cur: str) -> str:
@@ -88,16 +111,22 @@ def _base_layout() -> dict[str, Any]:
     }
 
 
-def _save(fig: go.Figure) -> str:
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)  # noqa: SIM115
-    tmp.close()
-    fig.write_image(tmp.name, scale=THEME["size"]["scale"])
-    return tmp.name
+def _chart_key(chart: str, data: list[dict[str, Any]], cur: str, **options: Any) -> str:
+    return chart_key(chart, data, cur, options, THEME)
+
+
+async def _render_png(fig: go.Figure, key: str) -> Chart:
+    png = await chart_renderer.render(fig.to_dict(), scale=THEME["size"]["scale"])
+    return chart_cache.put(key, png)
 
 
-async def spending_by_category_chart(data: list[dict[str, Any]], cur: str) -> str | None:
+async def spending_by_category_chart(data: list[dict[str, Any]], cur: str) -> Chart | None:
     if not data:
         return None
+    key = _chart_key("category", data, cur)
+    if cached := chart_cache.get(key):
+        return cached
+    go = _plotly()
 
     categories = [row["category"] or "Other" for row in data]
     totals: list[float] = [row["total"] for row in data]
@@ -147,12 +176,16 @@ async def spending_by_category_chart(data: list[dict[str, Any]], cur: str) -> st
         )
         fig.update_yaxes(autorange="reversed")
 
-    return _save(fig)
+    return await _render_png(fig, key)
 
 
-async def monthly_trend_chart(data: list[dict[str, Any]], cur: str) -> str | None:
+async def monthly_trend_chart(data: list[dict[str, Any]], cur: str) -> Chart | None:
     if not data:
         return None
+    key = _chart_key("monthly", data, cur)
+    if cached := chart_cache.get(key):
+        return cached
+    go = _plotly()
 
     months = [row["month"] for row in data]
     totals: list[float] = [row["total"] for row in data]
@@ -171,13 +204,11 @@ async def monthly_trend_chart(data: list[dict[str, Any]], cur: str) -> str | Non
     )
 
     if len(totals) >= 3:
-        x_idx = list(range(len(totals)))
-        z = np.polyfit(x_idx, totals, 1)
-        trend = np.polyval(z, x_idx)
+        trend = _linear_trend(totals)
         fig.add_trace(
             go.Scatter(
                 x=months,
-                y=trend.tolist(),
+                y=trend,
                 mode="lines",
                 line=dict(color=THEME["colors"]["trend_line"], width=2, dash="dash"),
                 name="Trend",
@@ -193,12 +224,16 @@ async def monthly_trend_chart(data: list[dict[str, Any]], cur: str) -> str | Non
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
     )
 
-    return _save(fig)
+    return await _render_png(fig, key)
 
 
-async def daily_spending_chart(data: list[dict[str, Any]], cur: str, budget: float | None = None) -> str | None:
+async def daily_spending_chart(data: list[dict[str, Any]], cur: str, budget: float | None = None) -> Chart | None:
     if not data:
         return None
+    key = _chart_key("daily", data, cur, budget=budget)
+    if cached := chart_cache.get(key):
+        return cached
+    go = _plotly()
 
     sym = currency_symbol(cur)
     days = [row["expense_date"] for row in data]
@@ -235,13 +270,11 @@ async def daily_spending_chart(data: list[dict[str, Any]], cur: str, budget: flo
     )
 
     if len(totals) >= 5:
-        x_idx = list(range(len(totals)))
-        z = np.polyfit(x_idx, totals, 1)
-        trend = np.polyval(z, x_idx)
+        trend = _linear_trend(totals)
         fig.add_trace(
             go.Scatter(
                 x=days,
-                y=trend.tolist(),
+                y=trend,
                 mode="lines",
                 line=dict(color=THEME["colors"]["trend_line"], width=2, dash="dash"),
                 name="Trend",
@@ -277,4 +310,4 @@ async def daily_spending_chart(data: list[dict[str, Any]], cur: str, budget: flo
 
     fig.update_layout(**layout_kwargs)
 
-    return _save(fig)
+    return await _render_png(fig, key)
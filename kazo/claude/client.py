@@ -2,10 +2,15 @@ import asyncio
 import base64
 import json
 import logging
-import mimetypes
-from pathlib import Path
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
 
+from kazo.claude.resilience import ClaudeCLIError, call_with_breaker, get_breaker, retry_async
 from kazo.config import settings
+from kazo.media import Media
+from kazo.state import get_state_backend
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +22,12 @@ def _get_api_client():
     if _api_client is None:
         import anthropic
 
-        _api_client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+        # Retries are handled by kazo.claude.resilience so both backends share one policy.
+        _api_client = anthropic.AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            timeout=settings.claude_timeout,
+            max_retries=0,
+        )
     return _api_client
 
 
@@ -25,6 +35,12 @@ def _use_sdk() -> bool:
     return settings.anthropic_api_key is not None
 
 
+def warm_up() -> None:
+    """Import the SDK ahead of the first call when it will be used; run it off the event loop."""
+    if _use_sdk():
+        import anthropic  # noqa: F401
+
+
 SDK_MODEL_MAP = {
     "sonnet": "claude-sonnet-4-5-20250929",
     "haiku": "claude-haiku-4-5-20251001",
@@ -32,8 +48,23 @@ SDK_MODEL_MAP = {
 }
 
 
-def _resolve_model() -> str:
-    return SDK_MODEL_MAP.get(settings.claude_model, settings.claude_model)
+STRUCTURED_TOOL_NAME = "structured_output"
+
+BATCH_MAX_REQUESTS = 10_000
+
+
+def model_for_task(task: str | None = None) -> str:
+    """Model alias configured for `task` (CLAUDE_MODEL_<TASK>), falling back to CLAUDE_MODEL."""
+    if task:
+        override = getattr(settings, f"claude_model_{task}", None)
+        if override:
+            return override
+    return settings.claude_model
+
+
+def _resolve_model(task: str | None = None) -> str:
+    model = model_for_task(task)
+    return SDK_MODEL_MAP.get(model, model)
 
 
 # --- CLI backend ---
@@ -58,36 +89,28 @@ async def _run_claude_once(args: list[str], timeout: int) -> dict:
         logger.debug("Claude CLI stderr: %s", stderr_text)
 
     if proc.returncode != 0:
-        raise RuntimeError(f"Claude CLI error (rc={proc.returncode}): {stderr_text}")
+        raise ClaudeCLIError(f"Claude CLI error (rc={proc.returncode}): {stderr_text}")
 
     raw = stdout.decode()
     logger.debug("Claude CLI raw response: %s", raw[:2000])
     try:
         return json.loads(raw)
     except json.JSONDecodeError:
-        raise RuntimeError(f"Claude CLI returned non-JSON: {raw[:500]}") from None
+        raise ClaudeCLIError(f"Claude CLI returned non-JSON: {raw[:500]}") from None
 
 
-async def _run_cli(args: list[str], timeout: int | None = None, retries: int = 1) -> dict:
+async def _run_cli(args: list[str], timeout: int | None = None, retries: int | None = None) -> dict:
     effective_timeout = timeout or settings.claude_timeout
-    last_error: Exception | None = None
-    for attempt in range(1 + retries):
-        try:
-            return await _run_claude_once(args, effective_timeout)
-        except (TimeoutError, RuntimeError) as exc:
-            last_error = exc
-            if attempt < retries:
-                logger.warning("Claude CLI attempt %d failed (%s), retrying...", attempt + 1, exc)
-                await asyncio.sleep(1)
-    raise last_error  # type: ignore[misc]
+    effective_retries = settings.claude_max_retries if retries is None else retries
+    return await retry_async(lambda: _run_claude_once(args, effective_timeout), effective_retries, "Claude CLI")
 
 
-async def _ask_cli(prompt: str, system_prompt: str = "") -> str:
+async def _ask_cli(prompt: str, system_prompt: str = "", task: str | None = None) -> str:
     args = [
         "-p",
         prompt,
         "--model",
-        settings.claude_model,
+        model_for_task(task),
         "--output-format",
         "json",
         "--no-session-persistence",
@@ -105,7 +128,18 @@ async def _ask_cli_structured(
     prompt: str,
     json_schema: dict,
     system_prompt: str = "",
-    image_path: str | None = None,
+    media: Media | None = None,
+    task: str | None = None,
+) -> dict:
+    if media is None:
+        return await _run_cli_structured(prompt, json_schema, system_prompt, None, task)
+    # The CLI can only read attachments from disk, so this is the one place media is written out.
+    with media.as_file() as path:
+        return await _run_cli_structured(prompt, json_schema, system_prompt, path, task)
+
+
+async def _run_cli_structured(
+    prompt: str, json_schema: dict, system_prompt: str, image_path: str | None, task: str | None
 ) -> dict:
     schema_str = json.dumps(json_schema)
 
@@ -116,7 +150,7 @@ async def _ask_cli_structured(
         "-p",
         prompt,
         "--model",
-        settings.claude_model,
+        model_for_task(task),
         "--output-format",
         "json",
         "--json-schema",
@@ -151,74 +185,210 @@ async def _ask_cli_structured(
 # --- SDK backend ---
 
 
-async def _ask_sdk(prompt: str, system_prompt: str = "") -> str:
+async def _sdk_create(client, params: dict):
+    return await retry_async(lambda: client.messages.create(**params), settings.claude_max_retries, "Claude SDK")
+
+
+async def _ask_sdk(prompt: str, system_prompt: str = "", task: str | None = None) -> str:
     client = _get_api_client()
     kwargs: dict = {
-        "model": _resolve_model(),
+        "model": _resolve_model(task),
         "max_tokens": 1024,
         "messages": [{"role": "user", "content": prompt}],
     }
     if system_prompt:
         kwargs["system"] = system_prompt
 
-    response = await client.messages.create(**kwargs)
+    response = await _sdk_create(client, kwargs)
     return response.content[0].text
 
 
-def _image_media_type(path: str) -> str:
-    mime, _ = mimetypes.guess_type(path)
-    return mime or "image/jpeg"
-
-
-async def _ask_sdk_structured(
+def _structured_params(
     prompt: str,
     json_schema: dict,
     system_prompt: str = "",
-    image_path: str | None = None,
+    media: Media | None = None,
+    task: str | None = None,
 ) -> dict:
-    client = _get_api_client()
-
     content: list[dict] = []
-    if image_path:
-        image_data = Path(image_path).read_bytes()
+    if media is not None:
         content.append(
             {
-                "type": "image",
+                # PDFs go through the document block; the image block rejects them.
+                "type": "document" if media.media_type == "application/pdf" else "image",
                 "source": {
                     "type": "base64",
-                    "media_type": _image_media_type(image_path),
-                    "data": base64.standard_b64encode(image_data).decode(),
+                    "media_type": media.media_type,
+                    "data": base64.standard_b64encode(media.data).decode("ascii"),
                 },
             }
         )
     content.append({"type": "text", "text": prompt})
 
-    tool_name = "structured_output"
     tools = [
         {
-            "name": tool_name,
+            "name": STRUCTURED_TOOL_NAME,
             "description": "Return the structured output matching the schema.",
             "input_schema": json_schema,
         }
     ]
 
-    kwargs: dict = {
-        "model": _resolve_model(),
+    params: dict = {
+        "model": _resolve_model(task),
         "max_tokens": 2048,
         "messages": [{"role": "user", "content": content}],
         "tools": tools,
-        "tool_choice": {"type": "tool", "name": tool_name},
+        "tool_choice": {"type": "tool", "name": STRUCTURED_TOOL_NAME},
     }
     if system_prompt:
-        kwargs["system"] = system_prompt
+        params["system"] = system_prompt
+    return params
 
-    response = await client.messages.create(**kwargs)
 
-    for block in response.content:
-        if block.type == "tool_use" and block.name == tool_name:
+def _extract_tool_input(content: list) -> dict:
+    for block in content:
+        if block.type == "tool_use" and block.name == STRUCTURED_TOOL_NAME:
             return block.input
 
-    raise RuntimeError(f"Claude SDK returned no tool_use block. Response: {str(response.content)[:300]}")
+    raise RuntimeError(f"Claude SDK returned no tool_use block. Response: {str(content)[:300]}")
+
+
+async def _ask_sdk_structured(
+    prompt: str,
+    json_schema: dict,
+    system_prompt: str = "",
+    media: Media | None = None,
+    task: str | None = None,
+) -> dict:
+    client = _get_api_client()
+    response = await _sdk_create(client, _structured_params(prompt, json_schema, system_prompt, media, task))
+    return _extract_tool_input(response.content)
+
+
+# --- Batch backend ---
+
+
+@dataclass(slots=True)
+class BatchRequest:
+    custom_id: str
+    prompt: str
+    json_schema: dict
+    system_prompt: str = ""
+    task: str | None = None
+    on_result: Callable[[dict], Awaitable[None]] | None = None
+    on_error: Callable[[str], Awaitable[None]] | None = None
+
+
+_batch_backend = None
+
+
+def set_batch_backend(backend) -> None:
+    """Send batches to `backend` instead of the Anthropic API. Pass None to restore the default."""
+    global _batch_backend
+    _batch_backend = backend
+
+
+def _get_batch_backend():
+    if _batch_backend is not None:
+        return _batch_backend
+    return _get_api_client().messages.batches
+
+
+async def _deliver_batch_result(
+    request: BatchRequest,
+    results: dict[str, dict | None],
+    data: dict | None,
+    error: str | None = None,
+) -> None:
+    results[request.custom_id] = data
+    try:
+        if data is not None:
+            if request.on_result:
+                await request.on_result(data)
+        elif request.on_error:
+            await request.on_error(error or "unknown error")
+        else:
+            logger.warning("Batch request %s failed: %s", request.custom_id, error)
+    except Exception:
+        logger.exception("Batch callback for %s failed", request.custom_id)
+
+
+async def _run_batch_sequential(requests: list[BatchRequest]) -> dict[str, dict | None]:
+    results: dict[str, dict | None] = {}
+    for req in requests:
+        try:
+            data = await _ask_cli_structured(req.prompt, req.json_schema, req.system_prompt, task=req.task)
+        except Exception as exc:
+            await _deliver_batch_result(req, results, None, str(exc))
+        else:
+            await _deliver_batch_result(req, results, data)
+    return results
+
+
+async def _run_batch_chunk(
+    backend, requests: list[BatchRequest], poll_interval: float, results: dict[str, dict | None]
+) -> None:
+    batch = await backend.create(
+        requests=[
+            {
+                "custom_id": req.custom_id,
+                "params": _structured_params(req.prompt, req.json_schema, req.system_prompt, task=req.task),
+            }
+            for req in requests
+        ]
+    )
+    logger.info("Submitted message batch %s with %d requests", batch.id, len(requests))
+
+    while batch.processing_status != "ended":
+        await asyncio.sleep(poll_interval)
+        batch = await backend.retrieve(batch.id)
+
+    pending = {req.custom_id: req for req in requests}
+    async for entry in await backend.results(batch.id):
+        req = pending.pop(entry.custom_id, None)
+        if req is None:
+            continue
+        result = entry.result
+        if result.type != "succeeded":
+            detail = getattr(result, "error", None)
+            await _deliver_batch_result(req, results, None, f"{result.type}: {detail}" if detail else result.type)
+            continue
+        try:
+            data = _extract_tool_input(result.message.content)
+        except RuntimeError as exc:
+            await _deliver_batch_result(req, results, None, str(exc))
+        else:
+            await _deliver_batch_result(req, results, data)
+
+    for req in pending.values():
+        await _deliver_batch_result(req, results, None, "missing from batch results")
+
+
+async def run_structured_batch(
+    requests: list[BatchRequest],
+    poll_interval: float | None = None,
+) -> dict[str, dict | None]:
+    """Run structured requests through the Message Batches API.
+
+    Each request's callback fires as its result is read back. Returns parsed output
+    by custom_id, with None for requests that failed. Without an API key (and no
+    batch backend override) the requests run one by one through the CLI instead.
+    """
+    ids = [req.custom_id for req in requests]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Batch custom_id values must be unique")
+    if not requests:
+        return {}
+
+    if _batch_backend is None and not _use_sdk():
+        return await _run_batch_sequential(requests)
+
+    backend = _get_batch_backend()
+    interval = settings.claude_batch_poll_interval if poll_interval is None else poll_interval
+    results: dict[str, dict | None] = {}
+    for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+        await _run_batch_chunk(backend, requests[start : start + BATCH_MAX_REQUESTS], interval, results)
+    return results
 
 
 class RateLimitExceeded(Exception):
@@ -227,32 +397,78 @@ class RateLimitExceeded(Exception):
 
 # --- Public interface ---
 
+_scheduler: asyncio.Semaphore | None = None
+_scheduler_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _claude_scheduler() -> asyncio.Semaphore:
+    """Shared cap on in-flight Claude calls (CLAUDE_MAX_CONCURRENCY), one semaphore per event loop."""
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = asyncio.Semaphore(settings.claude_max_concurrency)
+        _scheduler_loop = loop
+    return _scheduler
+
+
+async def _timed(task: str | None, coro: Awaitable) -> Any:
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        logger.info(
+            "Claude %s call finished",
+            task or "default",
+            extra={"handler": f"claude:{task or 'default'}", "latency_ms": round((time.perf_counter() - start) * 1000)},
+        )
+
 
-async def ask_claude(prompt: str, system_prompt: str = "", chat_id: int | None = None) -> str:
+async def ask_claude(
+    prompt: str,
+    system_prompt: str = "",
+    chat_id: int | None = None,
+    task: str | None = None,
+) -> str:
     if chat_id is not None:
-        _enforce_rate_limit(chat_id)
-    if _use_sdk():
-        return await _ask_sdk(prompt, system_prompt)
-    return await _ask_cli(prompt, system_prompt)
+        await _enforce_rate_limit(chat_id)
+    async with _claude_scheduler():
+        if _use_sdk():
+            return await call_with_breaker("sdk", lambda: _timed(task, _ask_sdk(prompt, system_prompt, task=task)))
+        return await call_with_breaker("cli", lambda: _timed(task, _ask_cli(prompt, system_prompt, task=task)))
 
 
 async def ask_claude_structured(
     prompt: str,
     json_schema: dict,
     system_prompt: str = "",
-    image_path: str | None = None,
+    media: Media | None = None,
     chat_id: int | None = None,
+    task: str | None = None,
 ) -> dict:
     if chat_id is not None:
-        _enforce_rate_limit(chat_id)
-    if _use_sdk():
-        return await _ask_sdk_structured(prompt, json_schema, system_prompt, image_path)
-    return await _ask_cli_structured(prompt, json_schema, system_prompt, image_path)
+        await _enforce_rate_limit(chat_id)
+    async with _claude_scheduler():
+        if _use_sdk():
+            return await call_with_breaker(
+                "sdk",
+                lambda: _timed(task, _ask_sdk_structured(prompt, json_schema, system_prompt, media, task=task)),
+            )
+        return await call_with_breaker(
+            "cli",
+            lambda: _timed(task, _ask_cli_structured(prompt, json_schema, system_prompt, media, task=task)),
+        )
 
 
-def _enforce_rate_limit(chat_id: int) -> None:
-    from kazo.main import check_rate_limit, record_rate_limit
+async def _enforce_rate_limit(chat_id: int, cost: int = 1) -> None:
+    """Take `cost` slots of the chat's hourly Claude budget atomically, or raise RateLimitExceeded.
 
-    if not check_rate_limit(chat_id):
+    A call the circuit breaker would refuse raises ClaudeUnavailable first, so deferred work isn't charged for it.
+    """
+    get_breaker("sdk" if _use_sdk() else "cli").check()
+    if not await get_state_backend().hit(f"claude:{chat_id}", settings.rate_limit_per_hour, 3600, cost):
         raise RateLimitExceeded(f"Rate limit exceeded for chat {chat_id}")
-    record_rate_limit(chat_id)
+
+
+async def reserve_claude_calls(chat_id: int, count: int) -> None:
+    """Charge `count` calls against the chat's rate limit up front, for fan-out work made without chat_id."""
+    await _enforce_rate_limit(chat_id, count)
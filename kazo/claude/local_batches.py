@@ -0,0 +1,65 @@
+"""In-process stand-in for the Anthropic Message Batches API.
+
+Install with `set_batch_backend(LocalBatchServer(responder))` to run the batch flow
+offline. The responder receives each request's params and returns the structured
+output; raising marks that request as errored.
+"""
+
+import asyncio
+import itertools
+from collections.abc import AsyncIterator, Awaitable, Callable
+from types import SimpleNamespace
+
+from kazo.claude.client import STRUCTURED_TOOL_NAME
+
+Responder = Callable[[dict], Awaitable[dict]]
+
+
+class LocalBatchServer:
+    def __init__(self, responder: Responder, polls_until_ended: int = 1):
+        self._responder = responder
+        self._polls_until_ended = polls_until_ended
+        self._ids = itertools.count(1)
+        self._batches: dict[str, dict] = {}
+        self.submitted: list[list[dict]] = []
+
+    async def create(self, requests: list[dict]) -> SimpleNamespace:
+        batch_id = f"msgbatch_local_{next(self._ids)}"
+        self.submitted.append(requests)
+        entries = await asyncio.gather(*(self._run(req) for req in requests))
+        self._batches[batch_id] = {"entries": entries, "polls_left": self._polls_until_ended}
+        return self._status(batch_id)
+
+    async def retrieve(self, batch_id: str) -> SimpleNamespace:
+        batch = self._batches[batch_id]
+        batch["polls_left"] = max(batch["polls_left"] - 1, 0)
+        return self._status(batch_id)
+
+    async def results(self, batch_id: str) -> AsyncIterator[SimpleNamespace]:
+        batch = self._batches[batch_id]
+        if batch["polls_left"]:
+            raise RuntimeError(f"Batch {batch_id} has not ended yet")
+        return self._iter(batch["entries"])
+
+    async def cancel(self, batch_id: str) -> SimpleNamespace:
+        self._batches[batch_id]["polls_left"] = 0
+        return self._status(batch_id)
+
+    def _status(self, batch_id: str) -> SimpleNamespace:
+        ended = self._batches[batch_id]["polls_left"] == 0
+        return SimpleNamespace(id=batch_id, processing_status="ended" if ended else "in_progress")
+
+    async def _run(self, request: dict) -> SimpleNamespace:
+        try:
+            output = await self._responder(request["params"])
+        except Exception as exc:
+            result = SimpleNamespace(type="errored", error=str(exc))
+        else:
+            block = SimpleNamespace(type="tool_use", name=STRUCTURED_TOOL_NAME, input=output)
+            result = SimpleNamespace(type="succeeded", message=SimpleNamespace(content=[block]))
+        return SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+    @staticmethod
+    async def _iter(entries: list[SimpleNamespace]) -> AsyncIterator[SimpleNamespace]:
+        for entry in entries:
+            yield entry
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from kazo.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+_RETRYABLE_SDK_ERRORS = frozenset({"APIConnectionError", "APITimeoutError"})
+
+
+class ClaudeCLIError(RuntimeError):
+    pass
+
+
+class ClaudeUnavailable(Exception):
+    def __init__(self, backend: str, retry_after: float) -> None:
+        self.backend = backend
+        self.retry_after = retry_after
+        super().__init__(f"Claude {backend} backend is unavailable (retry in {retry_after:.0f}s)")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, ConnectionError, ClaudeCLIError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return type(exc).__name__ in _RETRYABLE_SDK_ERRORS
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given 0-based retry attempt."""
+    ceiling = min(settings.claude_retry_max_delay, settings.claude_retry_base_delay * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+async def retry_async(fn: Callable[[], Awaitable[Any]], retries: int, label: str) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as exc:
+            if attempt >= retries or not is_retryable(exc):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("%s attempt %d failed (%s), retrying in %.1fs", label, attempt + 1, exc, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def check(self) -> None:
+        """Raise ClaudeUnavailable if a call would be refused right now, without taking the half-open probe."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise ClaudeUnavailable(self.name, self.retry_after)
+
+    def before_call(self) -> None:
+        self.check()
+        if self.state == "half_open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Claude %s circuit closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning("Claude %s circuit opened after %d failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(backend: str) -> CircuitBreaker:
+    breaker = _breakers.get(backend)
+    if breaker is None:
+        breaker = CircuitBreaker(backend, settings.claude_breaker_threshold, settings.claude_breaker_reset_seconds)
+        _breakers[backend] = breaker
+    return breaker
+
+
+def reset_breakers() -> None:
+    _breakers.clear()
+
+
+async def call_with_breaker(backend: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    breaker = get_breaker(backend)
+    breaker.before_call()
+    try:
+        result = await fn()
+    except Exception as exc:
+        if is_retryable(exc):
+            breaker.record_failure()
+        else:
+            # The provider answered; the failure is ours, not an outage.
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
@@ -1,4 +1,4 @@
-from pydantic import Field, field_validator
+from pydantic import Field, field_validator, model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -21,15 +21,82 @@ class Settings(BaseSettings):
     base_currency: str = "EUR"
     db_path: str = "kazo.db"
     claude_model: str = "sonnet"
+    # Per-task overrides; unset tasks use claude_model.
+    claude_model_intent: str | None = "haiku"
+    claude_model_classify: str | None = "haiku"
+    claude_model_edit: str | None = "haiku"
+    claude_model_expense: str | None = None
+    claude_model_receipt: str | None = None
+    claude_model_escalation: str | None = "opus"
     claude_timeout: int = 60
+    claude_batch_poll_interval: float = 30.0
+    claude_max_retries: int = 2
+    claude_retry_base_delay: float = 1.0
+    claude_retry_max_delay: float = 8.0
+    claude_breaker_threshold: int = 5
+    claude_breaker_reset_seconds: float = 30.0
+    claude_queue_size: int = 100
+    chat_queue_size: int = 20
+    claude_max_concurrency: int = 4
+    pdf_max_pages: int = 10
+    # Chart rendering processes (0 renders in a thread instead); each is replaced after max renders or memory (MB).
+    chart_render_workers: int = 2
+    chart_render_timeout: float = 30.0
+    chart_render_max_renders: int = 200
+    chart_render_max_memory_mb: float = 512
+    # Rendered charts are kept in memory, keyed by a hash of their inputs, least recently used evicted past the cap.
+    chart_cache_max_mb: float = 50
+    # "sqlite" (main database, or STATE_DB_PATH) or "memory". Set STATE_SHARED when replicas share the file.
+    state_backend: str = "sqlite"
+    state_db_path: str | None = None
+    state_shared: bool = False
+    pending_max_entries: int = 1000
+    album_window_seconds: float = 1.5
+    album_max_concurrency: int = 3
+    receipt_workers: int = 3
+    receipt_queue_size: int = 50
+    # Receipts whose perceptual hash differs from a saved one by at most this many bits (0-7; -1 disables) get a
+    # "looks like expense #N" warning on their confirmation. Only byte-identical receipts are skipped outright.
+    duplicate_max_distance: int = 4
+    pending_sweep_interval: float = 15.0
+    # How often the running /stats figures are checked against a full recompute (and repaired if they drifted).
+    stats_verify_hours: float = 24
+    # Percentages of a monthly budget that trigger a notification when an expense crosses them; [] disables.
+    budget_alert_thresholds: list[int] = [80, 100]
+    # Weekly and monthly digests go out from this hour (server time) once their period has ended. Opted-in chats
+    # are handled digest_batch_size at a time, one send every digest_send_interval seconds. A failed send is
+    # retried on later checks, up to digest_max_attempts sends per period.
+    digest_hour: int = 9
+    digest_check_interval: float = 900.0
+    digest_batch_size: int = 100
+    digest_send_interval: float = 0.1
+    digest_max_attempts: int = 3
     rate_limit_per_hour: int = 30
+    intent_local_threshold: float = 0.8
     debug: bool = False
     health_check_port: int = 8080
+    # Set webhook_url (public base URL) to receive updates by webhook instead of long polling.
+    webhook_url: str | None = None
+    webhook_path: str = "/telegram/webhook"
+    webhook_secret: str | None = None
+    webhook_workers: int = 8
+    webhook_queue_size: int = 500
+    import_batch_size: int = 500
+    import_progress_interval: float = 2.0
+    # JSON file of extra /import column presets: {"name": {"date": "...", "amount": "...", ...}}
+    import_presets_file: str | None = None
     exchange_rate_url: str = Field(
         default="https://open.er-api.com/v6/latest",
         validation_alias="frankfurter_url",
     )
     exchange_rate_cache_hours: int = 24
 
+    @model_validator(mode="after")
+    def require_webhook_secret(self):
+        # Without a secret anyone who finds the URL can post forged updates.
+        if self.webhook_url and not self.webhook_secret:
+            raise ValueError("WEBHOOK_SECRET must be set when WEBHOOK_URL is set")
+        return self
+
 
 settings = Settings()
@@ -60,6 +60,19 @@ async def get_base_currency(chat_id: int) -> str:
     return settings.base_currency
 
 
+async def get_base_currencies(chat_ids: list[int]) -> dict[int, str]:
+    """Base currency of each chat in one query; chats without a setting get the default."""
+    db = await get_db()
+    placeholders = ", ".join("?" * len(chat_ids))
+    cursor = await db.execute(
+        f"SELECT chat_id, base_currency FROM chat_settings WHERE chat_id IN ({placeholders})",
+        chat_ids,
+    )
+    currencies = dict.fromkeys(chat_ids, settings.base_currency)
+    currencies.update({row["chat_id"]: row["base_currency"] for row in await cursor.fetchall()})
+    return currencies
+
+
 async def set_base_currency(chat_id: int, currency: str) -> None:
     db = await get_db()
     await db.execute(
@@ -54,6 +54,15 @@ CREATE TABLE IF NOT EXISTS bot_message_expenses (
     PRIMARY KEY (chat_id, bot_message_id)
 );
 
+-- Expenses saved from a multi-expense confirmation, by their 1-based number in it.
+CREATE TABLE IF NOT EXISTS bot_message_group_expenses (
+    chat_id INTEGER NOT NULL,
+    bot_message_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    expense_id INTEGER NOT NULL REFERENCES expenses(id) ON DELETE CASCADE,
+    PRIMARY KEY (chat_id, bot_message_id, position)
+);
+
 CREATE TABLE IF NOT EXISTS expense_items (
     id INTEGER PRIMARY KEY,
     expense_id INTEGER NOT NULL REFERENCES expenses(id) ON DELETE CASCADE,
@@ -77,12 +86,268 @@ CREATE TABLE IF NOT EXISTS budgets (
     UNIQUE(chat_id, category)
 );
 
+-- Budget thresholds already announced, so each one fires once per month. category '' is the total budget.
+CREATE TABLE IF NOT EXISTS budget_alerts (
+    chat_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    threshold INTEGER NOT NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id, category, month, threshold)
+);
+
 CREATE TABLE IF NOT EXISTS chat_settings (
     chat_id INTEGER PRIMARY KEY,
     base_currency TEXT NOT NULL DEFAULT 'EUR'
 );
+
+-- Chats opted in to scheduled digests, per kind, with the last period (2025-W07, 2025-02) each was sent for.
+CREATE TABLE IF NOT EXISTS digest_subscriptions (
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK(kind IN ('weekly', 'monthly')),
+    last_period TEXT,
+    PRIMARY KEY (chat_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_digest_subscriptions_kind ON digest_subscriptions(kind, last_period);
+
+-- Failed digest deliveries per chat and period, so a chat whose sends keep failing is only retried a few times.
+CREATE TABLE IF NOT EXISTS digest_failures (
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    period TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, kind, period)
+);
+
+CREATE TABLE IF NOT EXISTS receipt_jobs (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    status_message_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK(status IN ('queued', 'running', 'done', 'failed', 'cancelled')),
+    stage TEXT,
+    timings_json TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_receipt_jobs_chat_status ON receipt_jobs(chat_id, status);
+
+-- Receipt image fingerprints: an exact SHA-256 and a 64-bit perceptual hash split into eight 8-bit bands.
+-- Two hashes within Hamming distance 7 share at least one band, so band lookups find every near match.
+CREATE TABLE IF NOT EXISTS receipt_fingerprints (
+    expense_id INTEGER PRIMARY KEY REFERENCES expenses(id) ON DELETE CASCADE,
+    chat_id INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    phash INTEGER,
+    band0 INTEGER,
+    band1 INTEGER,
+    band2 INTEGER,
+    band3 INTEGER,
+    band4 INTEGER,
+    band5 INTEGER,
+    band6 INTEGER,
+    band7 INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_sha ON receipt_fingerprints(chat_id, sha256);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band0 ON receipt_fingerprints(chat_id, band0);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band1 ON receipt_fingerprints(chat_id, band1);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band2 ON receipt_fingerprints(chat_id, band2);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band3 ON receipt_fingerprints(chat_id, band3);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band4 ON receipt_fingerprints(chat_id, band4);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band5 ON receipt_fingerprints(chat_id, band5);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band6 ON receipt_fingerprints(chat_id, band6);
+CREATE INDEX IF NOT EXISTS idx_receipt_fp_band7 ON receipt_fingerprints(chat_id, band7);
+"""
+
+# Short-lived shared state (pending confirmations, rate-limit hits). Part of the main schema, and also
+# applied on its own when STATE_DB_PATH points the state backend at a separate file.
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pending_state_expires ON pending_state(namespace, expires_at);
+
+CREATE TABLE IF NOT EXISTS rate_limit_hits (
+    key TEXT NOT NULL,
+    ts REAL NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_hits_key_ts ON rate_limit_hits(key, ts);
 """
 
+SCHEMA += STATE_SCHEMA
+
+# Running per-chat statistics, kept current by triggers on every expense insert, update and delete so /stats
+# reads a handful of rows instead of aggregating the whole history. Uncategorised expenses count under ''.
+# kazo.services.stats_service rebuilds them from scratch and verifies them periodically.
+_STATS_ADD = """
+    INSERT INTO chat_stats (chat_id, count, total, max_expense, first_date, last_date)
+    VALUES (NEW.chat_id, 1, NEW.amount_base, NEW.amount_base, NEW.expense_date, NEW.expense_date)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        count = count + 1,
+        total = total + excluded.total,
+        max_expense = MAX(max_expense, excluded.max_expense),
+        first_date = MIN(first_date, excluded.first_date),
+        last_date = MAX(last_date, excluded.last_date);
+    INSERT INTO chat_category_stats (chat_id, category, count, total)
+    VALUES (NEW.chat_id, IFNULL(NEW.category, ''), 1, NEW.amount_base)
+    ON CONFLICT(chat_id, category) DO UPDATE SET count = count + 1, total = total + excluded.total;
+    INSERT INTO chat_store_stats (chat_id, store, count, total)
+    SELECT NEW.chat_id, NEW.store, 1, NEW.amount_base WHERE NEW.store IS NOT NULL
+    ON CONFLICT(chat_id, store) DO UPDATE SET count = count + 1, total = total + excluded.total;
+    INSERT INTO chat_month_stats (chat_id, month, count, total)
+    VALUES (NEW.chat_id, strftime('%Y-%m', NEW.expense_date), 1, NEW.amount_base)
+    ON CONFLICT(chat_id, month) DO UPDATE SET count = count + 1, total = total + excluded.total;
+    INSERT INTO chat_month_category_stats (chat_id, month, category, count, total)
+    VALUES (NEW.chat_id, strftime('%Y-%m', NEW.expense_date), IFNULL(NEW.category, ''), 1, NEW.amount_base)
+    ON CONFLICT(chat_id, month, category) DO UPDATE SET count = count + 1, total = total + excluded.total;
+"""
+
+# Max and first/last date can't be decremented; they are re-read (indexed for the dates) only when the
+# removed expense was the extreme.
+_STATS_REMOVE = """
+    UPDATE chat_stats SET count = count - 1, total = total - OLD.amount_base WHERE chat_id = OLD.chat_id;
+    UPDATE chat_stats SET
+        max_expense = (SELECT IFNULL(MAX(amount_base), 0) FROM expenses WHERE chat_id = OLD.chat_id),
+        first_date = (SELECT MIN(expense_date) FROM expenses WHERE chat_id = OLD.chat_id),
+        last_date = (SELECT MAX(expense_date) FROM expenses WHERE chat_id = OLD.chat_id)
+    WHERE chat_id = OLD.chat_id
+        AND (OLD.amount_base >= max_expense OR OLD.expense_date <= first_date OR OLD.expense_date >= last_date);
+    DELETE FROM chat_stats WHERE chat_id = OLD.chat_id AND count <= 0;
+    UPDATE chat_category_stats SET count = count - 1, total = total - OLD.amount_base
+    WHERE chat_id = OLD.chat_id AND category = IFNULL(OLD.category, '');
+    DELETE FROM chat_category_stats WHERE chat_id = OLD.chat_id AND category = IFNULL(OLD.category, '') AND count <= 0;
+    UPDATE chat_store_stats SET count = count - 1, total = total - OLD.amount_base
+    WHERE chat_id = OLD.chat_id AND store = OLD.store;
+    DELETE FROM chat_store_stats WHERE chat_id = OLD.chat_id AND store = OLD.store AND count <= 0;
+    UPDATE chat_month_stats SET count = count - 1, total = total - OLD.amount_base
+    WHERE chat_id = OLD.chat_id AND month = strftime('%Y-%m', OLD.expense_date);
+    DELETE FROM chat_month_stats
+    WHERE chat_id = OLD.chat_id AND month = strftime('%Y-%m', OLD.expense_date) AND count <= 0;
+    UPDATE chat_month_category_stats SET count = count - 1, total = total - OLD.amount_base
+    WHERE chat_id = OLD.chat_id AND month = strftime('%Y-%m', OLD.expense_date)
+        AND category = IFNULL(OLD.category, '');
+    DELETE FROM chat_month_category_stats
+    WHERE chat_id = OLD.chat_id AND month = strftime('%Y-%m', OLD.expense_date)
+        AND category = IFNULL(OLD.category, '') AND count <= 0;
+"""
+
+STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS chat_stats (
+    chat_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    max_expense REAL NOT NULL,
+    first_date DATE,
+    last_date DATE
+);
+
+CREATE TABLE IF NOT EXISTS chat_category_stats (
+    chat_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (chat_id, category)
+);
+
+CREATE TABLE IF NOT EXISTS chat_store_stats (
+    chat_id INTEGER NOT NULL,
+    store TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (chat_id, store)
+);
+
+CREATE TABLE IF NOT EXISTS chat_month_stats (
+    chat_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (chat_id, month)
+);
+
+-- Period totals per category, read by budget alerts without scanning the month's expenses.
+CREATE TABLE IF NOT EXISTS chat_month_category_stats (
+    chat_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (chat_id, month, category)
+);
+
+-- Recreated on every start so existing databases pick up changes to the trigger bodies.
+DROP TRIGGER IF EXISTS trg_expenses_stats_insert;
+CREATE TRIGGER trg_expenses_stats_insert AFTER INSERT ON expenses
+BEGIN{_STATS_ADD}END;
+
+DROP TRIGGER IF EXISTS trg_expenses_stats_delete;
+CREATE TRIGGER trg_expenses_stats_delete AFTER DELETE ON expenses
+BEGIN{_STATS_REMOVE}END;
+
+DROP TRIGGER IF EXISTS trg_expenses_stats_update;
+CREATE TRIGGER trg_expenses_stats_update
+AFTER UPDATE OF chat_id, amount_base, category, store, expense_date ON expenses
+BEGIN{_STATS_REMOVE}{_STATS_ADD}END;
+"""
+
+SCHEMA += STATS_SCHEMA
+
+
+def _bump_version(chat_id: str) -> str:
+    return f"""
+    INSERT INTO chat_data_version (chat_id, version) VALUES ({chat_id}, 1)
+    ON CONFLICT(chat_id) DO UPDATE SET version = version + 1;"""
+
+
+# A per-chat counter bumped by every change to the chat's expenses or subscriptions. Results derived from them
+# (forecast fits) are cached with the version they were computed at and reused while it is unchanged.
+VERSION_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS chat_data_version (
+    chat_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_version_insert AFTER INSERT ON expenses
+BEGIN{_bump_version("NEW.chat_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_version_delete AFTER DELETE ON expenses
+BEGIN{_bump_version("OLD.chat_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_expenses_version_update AFTER UPDATE ON expenses
+BEGIN{_bump_version("OLD.chat_id")}{_bump_version("NEW.chat_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_subscriptions_version_insert AFTER INSERT ON subscriptions
+BEGIN{_bump_version("NEW.chat_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_subscriptions_version_delete AFTER DELETE ON subscriptions
+BEGIN{_bump_version("OLD.chat_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_subscriptions_version_update AFTER UPDATE ON subscriptions
+BEGIN{_bump_version("OLD.chat_id")}{_bump_version("NEW.chat_id")}
+END;
+"""
+
+SCHEMA += VERSION_SCHEMA
+
 _db: aiosqlite.Connection | None = None
 
 
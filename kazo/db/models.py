@@ -51,3 +51,9 @@ class Subscription:
     billing_day: int | None = None
     active: bool = True
     created_at: datetime | None = None
+
+
+@dataclass(slots=True)
+class ReceiptFingerprint:
+    sha256: str
+    phash: int | None = None
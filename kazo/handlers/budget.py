@@ -5,9 +5,12 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
 
+from kazo.config import settings
 from kazo.currency import format_amount, get_base_currency
+from kazo.db.models import Expense
 from kazo.services.budget_service import (
     budget_vs_actual,
+    check_budget_alerts,
     get_all_budgets,
     remove_budget,
     set_budget,
@@ -22,6 +25,32 @@ def _progress_bar(pct: float, width: int = 10) -> str:
     return "█" * filled + "░" * (width - filled)
 
 
+def _alert_text(alert: dict, base: str) -> str:
+    label = alert["category"] or "Total"
+    if alert["threshold"] >= 100:
+        head = f"🚨 {label} budget exceeded"
+    else:
+        head = f"⚠️ {label} budget {alert['threshold']}% used"
+    return (
+        f"{head}: {format_amount(alert['spent'], base)} of {format_amount(alert['budget'], base)} "
+        f"this month ({format_amount(max(alert['remaining'], 0), base)} left)"
+    )
+
+
+async def notify_budget_alerts(message: Message, chat_id: int, expenses: list[Expense]) -> None:
+    """Tell the chat about budgets these newly saved expenses pushed past an alert threshold."""
+    if not settings.budget_alert_thresholds:
+        return
+    try:
+        alerts = await check_budget_alerts(chat_id, expenses)
+        if alerts:
+            base = await get_base_currency(chat_id)
+            await message.answer("\n".join(_alert_text(a, base) for a in alerts))
+    except Exception:
+        # The expenses are already saved; a failed alert must not turn the confirmation into an error.
+        logger.exception("Budget alert check failed", extra={"chat_id": chat_id, "handler": "budget"})
+
+
 @router.message(Command("setbudget"))
 async def cmd_setbudget(message: Message):
     parts = message.text.split(maxsplit=2) if message.text else []
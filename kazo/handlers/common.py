@@ -12,13 +12,15 @@ from kazo.categories import get_categories, get_categories_str
 from kazo.claude.client import ask_claude, ask_claude_structured
 from kazo.currency import format_amount, get_base_currency
 from kazo.db.models import Expense
-from kazo.handlers.pending import store_pending
-from kazo.services.currency_service import convert_to_base
+from kazo.handlers.pending import store_pending, store_pending_group
+from kazo.intent import classify_local
+from kazo.services.currency_service import InvalidCurrencyError, convert_to_base, get_rates, normalize_currency
 from kazo.services.expense_service import (
     delete_last_expense,
     get_expense_by_bot_message,
     get_expense_by_id,
     get_expenses,
+    get_group_expenses_by_bot_message,
     get_last_expense,
     link_bot_message,
     update_expense,
@@ -28,6 +30,7 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 _HAS_NUMBER = re.compile(r"\d")
+_GROUP_ENTRY = re.compile(r"^#(\d+)\s*:?\s*")
 
 PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
 
@@ -58,6 +61,13 @@ EXPENSE_SCHEMA = {
     "additionalProperties": False,
 }
 
+EXPENSES_SCHEMA = {
+    "type": "object",
+    "properties": {"expenses": {"type": "array", "items": EXPENSE_SCHEMA, "minItems": 1}},
+    "required": ["expenses"],
+    "additionalProperties": False,
+}
+
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -81,7 +91,8 @@ async def cmd_help(message: Message):
         "Tracking expenses:\n"
         '  Send text with amount: "spent 50 on groceries"\n'
         "  Send receipt photo/PDF\n"
-        "  Send product photo\n\n"
+        "  Send product photo\n"
+        "  /jobs — receipts in progress (cancel)\n\n"
         "Editing:\n"
         "  Reply to expense → type correction\n"
         "  /edit — edit last expense\n"
@@ -93,9 +104,13 @@ async def cmd_help(message: Message):
         "  /monthly — month-over-month comparison\n"
         "  /daily — daily spending chart\n"
         "  /stats — all-time statistics\n"
+        "  /anomalies [days] — unusual days and expenses\n"
+        "  /forecast — projected month and quarter spending\n"
         "  /budget — budget status\n"
+        "  /digest weekly|monthly|off — scheduled summaries\n"
         "  /search <keyword> — find expenses\n"
         "  /export — download CSV\n"
+        "  /import [preset] — import a CSV (send as caption)\n"
         "  /backup — download database\n\n"
         "Items & prices:\n"
         "  /price <item> — price history\n"
@@ -224,6 +239,7 @@ async def _classify_intent(text: str) -> dict:
         prompt=text,
         json_schema=INTENT_SCHEMA,
         system_prompt=system_prompt,
+        task="intent",
     )
 
 
@@ -261,6 +277,7 @@ async def _handle_query(message: Message):
             f"Be concise (2-4 sentences). Use {base} for amounts. If the data doesn't contain enough info, say so."
         ),
         chat_id=message.chat.id,
+        task="query",
     )
     await message.answer(answer, parse_mode="Markdown")
 
@@ -318,6 +335,7 @@ async def _handle_conversational_intent(message: Message, intent: str, args: str
                     "If they seem to want to log an expense, remind them to include an amount."
                 ),
                 chat_id=message.chat.id,
+                task="chat",
             ),
             parse_mode="Markdown",
         )
@@ -333,7 +351,11 @@ async def handle_text_expense(message: Message):
 
     if not _HAS_NUMBER.search(message.text):
         try:
-            result = await _classify_intent(message.text)
+            result = classify_local(message.text)
+            if result is None:
+                result = await _classify_intent(message.text)
+            else:
+                logger.debug("Intent classified locally: %s", result["intent"], extra={"chat_id": message.chat.id})
             intent = result.get("intent", "chat")
             args = result.get("args")
             await _handle_conversational_intent(message, intent, args)
@@ -356,28 +378,60 @@ async def handle_text_expense(message: Message):
     try:
         parsed = await ask_claude_structured(
             prompt=message.text,
-            json_schema=EXPENSE_SCHEMA,
+            json_schema=EXPENSES_SCHEMA,
             system_prompt=system_prompt,
             chat_id=message.chat.id,
+            task="expense",
         )
     except Exception:
         logger.exception("Failed to parse expense", extra={"chat_id": message.chat.id})
         await message.answer('Sorry, I couldn\'t understand that. Try something like "spent 50 on groceries".')
         return
 
-    try:
-        amount = parsed["amount"]
-        currency = parsed["currency"].upper()
-        category = parsed["category"].lower()
-    except (KeyError, AttributeError):
-        logger.exception("Malformed Claude response: %s", parsed, extra={"chat_id": message.chat.id})
-        await message.answer("Sorry, I couldn't parse that properly. Please try again.")
-        return
+    entries = []
+    for entry in parsed.get("expenses") or []:
+        try:
+            amount = entry["amount"]
+            currency = normalize_currency(entry["currency"])  # the same key get_rates returns
+            category = entry["category"].lower()
+        except (KeyError, AttributeError, TypeError):
+            logger.warning("Malformed expense in Claude response: %s", entry, extra={"chat_id": message.chat.id})
+            continue
+        if amount > 0:
+            entries.append((entry, amount, currency, category))
 
-    if amount <= 0:
+    if not entries:
+        logger.warning("No usable expense in Claude response: %s", parsed, extra={"chat_id": message.chat.id})
         await message.answer("Couldn't determine a valid amount. Please try again.")
         return
 
+    try:
+        rates = await get_rates([currency for _, _, currency, _ in entries], base)
+    except InvalidCurrencyError as e:
+        await message.answer(str(e))
+        return
+
+    all_categories = await get_categories(message.chat.id)
+    pending = [
+        _build_text_expense(message, entry, amount, currency, category, rates[currency], base, all_categories)
+        for entry, amount, currency, category in entries
+    ]
+    if len(pending) == 1:
+        await store_pending(message, *pending[0])
+    else:
+        await store_pending_group(message, pending, kind="expense")
+
+
+def _build_text_expense(
+    message: Message,
+    parsed: dict,
+    amount: float,
+    currency: str,
+    category: str,
+    rate: float,
+    base: str,
+    all_categories: list[str],
+) -> tuple[Expense, str]:
     store = parsed.get("store")
     note = parsed.get("note")
     items = parsed.get("items")
@@ -389,7 +443,7 @@ async def handle_text_expense(message: Message):
         logger.warning("Invalid date from Claude: %s, using today", expense_date, extra={"chat_id": message.chat.id})
         expense_date = date.today().isoformat()
 
-    amount_base, rate = await convert_to_base(amount, currency, message.chat.id)
+    amount_base = round(amount * rate, 2)
 
     expense = Expense(
         id=None,
@@ -407,7 +461,6 @@ async def handle_text_expense(message: Message):
         note=note,
     )
 
-    all_categories = await get_categories(message.chat.id)
     is_new_category = category not in all_categories
     cat_note = " (new category)" if is_new_category else ""
     currency_note = f" ({amount} {currency})" if currency != base else ""
@@ -432,8 +485,7 @@ async def handle_text_expense(message: Message):
         f"🏷 {category}{cat_note}\n"
         f"📅 {expense_date}" + (f"\n🏪 {store}" if store else "") + (f"\n📝 {note}" if note else "") + items_text
     )
-
-    await store_pending(message, expense, display_text)
+    return expense, display_text
 
 
 EDIT_SCHEMA = {
@@ -456,9 +508,24 @@ async def handle_edit_reply(message: Message):
     if not reply or not reply.from_user or not reply.from_user.is_bot:
         return
 
+    correction = message.text
     expense = await get_expense_by_bot_message(message.chat.id, reply.message_id)
     if not expense:
-        return
+        saved = await get_group_expenses_by_bot_message(message.chat.id, reply.message_id)
+        if not saved:
+            return
+        numbered = _GROUP_ENTRY.match(correction)
+        if numbered:
+            expense = saved.get(int(numbered.group(1)))
+            correction = correction[numbered.end() :]
+        elif len(saved) == 1:
+            expense = next(iter(saved.values()))
+        if not expense or not correction:
+            numbers = ", ".join(f"#{n}" for n in saved)
+            await message.answer(
+                f"Which one? Start your reply with its number ({numbers}), e.g. #{next(iter(saved))} dining"
+            )
+            return
 
     base = await get_base_currency(message.chat.id)
     categories_str = await get_categories_str(message.chat.id)
@@ -472,7 +539,7 @@ async def handle_edit_reply(message: Message):
             category=expense["category"],
             store=expense["store"] or "none",
             expense_date=expense["expense_date"],
-            correction=message.text,
+            correction=correction,
             categories=categories_str,
             today=date.today().isoformat(),
             base_currency=base,
@@ -481,10 +548,11 @@ async def handle_edit_reply(message: Message):
 
     try:
         changes = await ask_claude_structured(
-            prompt=message.text,
+            prompt=correction,
             json_schema=EDIT_SCHEMA,
             system_prompt=edit_prompt,
             chat_id=message.chat.id,
+            task="edit",
         )
     except Exception:
         logger.exception("Failed to parse edit", extra={"chat_id": message.chat.id})
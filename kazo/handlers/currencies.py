@@ -84,6 +84,7 @@ async def cmd_setcurrency(message: Message) -> None:
 
 @router.message(Command("settings"))
 async def cmd_settings(message: Message) -> None:
+    from kazo.claude.client import model_for_task
     from kazo.config import settings
 
     base = await get_base_currency(message.chat.id)
@@ -93,5 +94,7 @@ async def cmd_settings(message: Message) -> None:
         f"Base currency: {base}\n"
         f"Backend: {backend}\n"
         f"Model: {settings.claude_model}\n"
+        f"Intent/photo models: {model_for_task('intent')}/{model_for_task('classify')}\n"
+        f"Receipt model: {model_for_task('receipt')} (escalates to {model_for_task('escalation')})\n"
         f"\nUse /setcurrency to change base currency."
     )
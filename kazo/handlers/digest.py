@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from datetime import date
+
+from aiogram import Bot, Router
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.filters import Command
+from aiogram.types import BufferedInputFile, Message
+
+from kazo.charts import Chart, RenderError, chart_cache, spending_by_category_chart
+from kazo.config import settings
+from kazo.services.digest_service import (
+    DIGEST_KINDS,
+    Digest,
+    DigestPeriod,
+    build_digests,
+    claim_digest,
+    digest_period,
+    digest_text,
+    due_chats,
+    get_digest_kinds,
+    release_digest,
+    set_digest,
+)
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+CAPTION_LIMIT = 1024
+DIGEST_USAGE = "Usage: /digest weekly | monthly | both | off\n/digest weekly off — stop one of them"
+
+
+@router.message(Command("digest"))
+async def cmd_digest(message: Message) -> None:
+    args = message.text.split()[1:] if message.text else []
+    if not args:
+        kinds = await get_digest_kinds(message.chat.id)
+        status = ", ".join(kinds) if kinds else "off"
+        await message.answer(f"📬 Digests: {status}\n\n{DIGEST_USAGE}")
+        return
+
+    target = args[0].lower()
+    enabled = not (len(args) > 1 and args[1].lower() == "off")
+    if target == "off":
+        kinds, enabled = DIGEST_KINDS, False
+    elif target == "both":
+        kinds = DIGEST_KINDS
+    elif target in DIGEST_KINDS:
+        kinds = (target,)
+    else:
+        await message.answer(DIGEST_USAGE)
+        return
+
+    for kind in kinds:
+        await set_digest(message.chat.id, kind, enabled)
+    kinds = await get_digest_kinds(message.chat.id)
+    if kinds:
+        await message.answer(f"📬 Digests on: {', '.join(kinds)}. Sent from {settings.digest_hour}:00.")
+    else:
+        await message.answer("📬 Digests off.")
+
+
+async def _send_photo(bot: Bot, chat_id: int, chart: Chart, caption: str | None) -> None:
+    if chart.file_id:
+        try:
+            await bot.send_photo(chat_id, chart.file_id, caption=caption)
+            return
+        except TelegramBadRequest:
+            chart_cache.forget_file_id(chart.key)
+    sent = await bot.send_photo(chat_id, BufferedInputFile(chart.png, filename="chart.png"), caption=caption)
+    if sent.photo:
+        chart_cache.remember_file_id(chart.key, sent.photo[-1].file_id)
+
+
+async def _deliver(bot: Bot, digest: Digest, period: DigestPeriod, chart: Chart | None) -> None:
+    text = digest_text(digest, period)
+    if chart is None:
+        await bot.send_message(digest.chat_id, text)
+        return
+    fits = len(text) <= CAPTION_LIMIT
+    await _send_photo(bot, digest.chat_id, chart, text if fits else None)
+    if not fits:
+        await bot.send_message(digest.chat_id, text)
+
+
+async def _deliver_with_retry(bot: Bot, digest: Digest, period: DigestPeriod, chart: Chart | None) -> None:
+    """Deliver, waiting out one flood-control response from Telegram before giving up."""
+    try:
+        await _deliver(bot, digest, period, chart)
+    except TelegramRetryAfter as e:
+        logger.warning("Digest send throttled for %ss", e.retry_after, extra={"chat_id": digest.chat_id})
+        await asyncio.sleep(e.retry_after)
+        await _deliver(bot, digest, period, chart)
+
+
+async def _render(digest: Digest) -> Chart | None:
+    try:
+        return await spending_by_category_chart(digest.categories, digest.base)
+    except RenderError:
+        logger.warning("Digest chart failed", exc_info=True, extra={"chat_id": digest.chat_id, "handler": "digest"})
+        return None
+
+
+async def send_digests(bot: Bot, kind: str, today: date | None = None) -> int:
+    """Send the last completed period's digest to every opted-in chat still due one; returns how many were sent.
+
+    Chats are handled in batches whose figures come from a few grouped queries. A batch's charts render through
+    the shared pool, which bounds how many run at once, while sends go out one every digest_send_interval
+    seconds. Each chat is claimed before sending, so restarts and replicas don't send a digest twice; a failed send
+    releases the claim for a later run, up to digest_max_attempts times. A chat with no expenses in the period is
+    skipped. A chat that blocked the bot is unsubscribed.
+    """
+    period = digest_period(kind, today)
+    chat_ids = await due_chats(period)
+    if not chat_ids:
+        return 0
+    start = time.perf_counter()
+    sent = 0
+    for i in range(0, len(chat_ids), settings.digest_batch_size):
+        batch = chat_ids[i : i + settings.digest_batch_size]
+        digests = await build_digests(batch, period)
+        charts = {d.chat_id: asyncio.create_task(_render(d)) for d in digests.values() if d.categories}
+        try:
+            for chat_id in batch:
+                digest = digests[chat_id]
+                if not await claim_digest(chat_id, period) or not digest.categories:
+                    continue
+                try:
+                    await _deliver_with_retry(bot, digest, period, await charts.pop(chat_id))
+                except TelegramForbiddenError:
+                    logger.info("Chat blocked the bot, stopping its digests", extra={"chat_id": chat_id})
+                    for k in DIGEST_KINDS:
+                        await set_digest(chat_id, k, False)
+                    continue
+                except Exception:
+                    logger.exception("Digest send failed", extra={"chat_id": chat_id, "handler": "digest"})
+                    if not await release_digest(chat_id, period):
+                        logger.warning(
+                            "Giving up on the %s digest after %d attempts",
+                            period.key,
+                            settings.digest_max_attempts,
+                            extra={"chat_id": chat_id, "handler": "digest"},
+                        )
+                    continue
+                sent += 1
+                await asyncio.sleep(settings.digest_send_interval)
+        finally:
+            # Let renders already handed to the pool finish: cancelling one mid-render kills its worker process.
+            if charts:
+                await asyncio.wait(charts.values())
+    logger.info(
+        "Sent %d %s digests for %s",
+        sent,
+        kind,
+        period.key,
+        extra={"handler": "digest", "latency_ms": round((time.perf_counter() - start) * 1000)},
+    )
+    return sent
@@ -1,17 +1,27 @@
 import csv
 import io
 import logging
+import tempfile
+import time
 from calendar import monthrange
 from datetime import date
 from pathlib import Path
 
-from aiogram import Router
+from aiogram import Bot, Router
 from aiogram.filters import Command
 from aiogram.types import BufferedInputFile, FSInputFile, Message
 
 from kazo.config import settings
 from kazo.currency import get_base_currency
 from kazo.services.expense_service import get_expenses
+from kazo.services.import_service import (
+    DEFAULT_PRESET,
+    ImportFormatError,
+    ImportInterruptedError,
+    ImportResult,
+    import_csv,
+    load_presets,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -90,3 +100,75 @@ async def cmd_backup(message: Message):
     doc = FSInputFile(db_path, filename=f"kazo_backup_{date.today().isoformat()}.db")
     size_mb = db_path.stat().st_size / (1024 * 1024)
     await message.answer_document(doc, caption=f"Kazo database backup ({size_mb:.1f} MB)")
+
+
+CSV_MIMES = {"text/csv", "text/plain", "application/csv", "application/vnd.ms-excel", "text/comma-separated-values"}
+
+
+def _import_progress_text(result: ImportResult) -> str:
+    return f"Importing... {result.imported} rows saved ({result.rows_per_second:.0f} rows/s)"
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, bot: Bot):
+    if not message.from_user:
+        return
+    doc = message.document or (message.reply_to_message.document if message.reply_to_message else None)
+    presets = load_presets()
+    preset_names = ", ".join(sorted(presets))
+    if doc is None or not (doc.mime_type in CSV_MIMES or (doc.file_name or "").lower().endswith(".csv")):
+        await message.answer(
+            "Send a CSV file with the caption /import [preset], or reply to one with /import [preset].\n"
+            f"Presets: {preset_names}"
+        )
+        return
+
+    parts = (message.text or message.caption or "").split(maxsplit=1)
+    preset_name = parts[1].strip().lower() if len(parts) > 1 else DEFAULT_PRESET
+    preset = presets.get(preset_name)
+    if preset is None:
+        await message.answer(f"Unknown preset '{preset_name}'. Presets: {preset_names}")
+        return
+
+    status = await message.answer(f"Importing {doc.file_name or 'CSV'} ({preset_name})...")
+    last_edit = time.monotonic()
+
+    async def report(result: ImportResult) -> None:
+        nonlocal last_edit
+        if time.monotonic() - last_edit < settings.import_progress_interval:
+            return
+        last_edit = time.monotonic()
+        try:
+            await status.edit_text(_import_progress_text(result))
+        except Exception:
+            logger.debug("Could not edit import progress", exc_info=True)
+
+    file = await bot.get_file(doc.file_id)
+    # Spooled to disk and decoded lazily, so the CSV is never held in memory as a whole.
+    with tempfile.TemporaryFile() as raw:
+        await bot.download_file(file.file_path, raw)
+        raw.seek(0)
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            result = await import_csv(text, message.chat.id, message.from_user.id, preset, progress=report)
+        except ImportFormatError as e:
+            await status.edit_text(f"Import failed: {e}")
+            return
+        except ImportInterruptedError as e:
+            logger.warning("Import interrupted: %s", e, exc_info=True, extra={"chat_id": message.chat.id})
+            await status.edit_text(
+                f"Import stopped after {e.result.imported} of {e.result.rows} rows: {e}.\n"
+                "The rows already imported were kept — remove them from the file before importing it again."
+            )
+            return
+        finally:
+            text.detach()
+
+    lines = [
+        f"Imported {result.imported} of {result.rows} rows in {result.elapsed:.1f}s "
+        f"({result.rows_per_second:.0f} rows/s)."
+    ]
+    if result.skipped:
+        reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(result.errors.items()))
+        lines.append(f"Skipped {result.skipped}: {reasons}.")
+    await status.edit_text("\n".join(lines))
@@ -1,14 +1,23 @@
 import json
 import logging
 import time
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 
 from aiogram import Router
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
+from kazo.config import settings
 from kazo.currency import format_amount, get_base_currency
-from kazo.db.models import Expense
-from kazo.services.expense_service import detect_recurring, link_bot_message, save_expense
+from kazo.db.models import Expense, ReceiptFingerprint
+from kazo.handlers.budget import notify_budget_alerts
+from kazo.services.expense_service import (
+    detect_recurring,
+    link_bot_message,
+    link_group_message,
+    save_expense,
+    save_expenses,
+)
+from kazo.services.pending_store import PendingStore
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -21,21 +30,96 @@ class PendingExpense:
     expense: Expense
     display_text: str
     items: list[dict] | None = None
-    created_at: float = field(default_factory=time.monotonic)
+    created_at: float = field(default_factory=time.time)
+    # Receipt image fingerprint, saved with the expense so later copies are recognised as duplicates.
+    fingerprint: ReceiptFingerprint | None = None
 
 
-_pending: dict[str, PendingExpense] = {}
+@dataclass(slots=True)
+class PendingGroup:
+    """Several expenses confirmed from one message; status[i] is None until entry i is saved or cancelled."""
 
+    entries: list[PendingExpense]
+    status: list[str | None]
+    created_at: float = field(default_factory=time.time)
+    kind: str = "receipt"
+
+
+def _dump_pending(pending: PendingExpense) -> str:
+    return json.dumps(asdict(pending), default=str)
+
+
+def _pending_from_dict(data: dict) -> PendingExpense:
+    fingerprint = data.get("fingerprint")
+    return PendingExpense(
+        **{
+            **data,
+            "expense": Expense(**data["expense"]),
+            "fingerprint": ReceiptFingerprint(**fingerprint) if fingerprint else None,
+        }
+    )
 
-def _make_key(chat_id: int, message_id: int) -> str:
-    return f"{chat_id}:{message_id}"
 
+def _load_pending(payload: str) -> PendingExpense:
+    return _pending_from_dict(json.loads(payload))
 
-def _cleanup_expired():
-    now = time.monotonic()
-    expired = [k for k, v in _pending.items() if now - v.created_at > PENDING_TTL]
-    for k in expired:
-        del _pending[k]
+
+def _dump_group(group: PendingGroup) -> str:
+    return json.dumps(asdict(group), default=str)
+
+
+def _load_group(payload: str) -> PendingGroup:
+    data = json.loads(payload)
+    entries = [_pending_from_dict(e) for e in data["entries"]]
+    return PendingGroup(
+        entries=entries, status=data["status"], created_at=data["created_at"], kind=data.get("kind", "receipt")
+    )
+
+
+async def _on_expired(bot, key: str, pending: PendingExpense | None) -> None:
+    if bot is None:
+        return
+    chat_id, message_id = (int(part) for part in key.split(":"))
+    text = "⌛ Expired — send the expense again to log it."
+    if pending is not None:
+        text = f"{pending.display_text}\n\n{text}"
+    await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+
+
+_store = PendingStore(
+    "expense",
+    PENDING_TTL,
+    _dump_pending,
+    _load_pending,
+    on_expire=_on_expired,
+    max_entries=settings.pending_max_entries,
+)
+_pending: dict[str, PendingExpense] = _store.cache
+
+
+async def _on_group_expired(bot, key: str, group: PendingGroup | None) -> None:
+    if bot is None:
+        return
+    chat_id, message_id = (int(part) for part in key.split(":"))
+    kind = group.kind if group is not None else "expense"
+    text = f"⌛ Expired — unconfirmed {kind}s were not saved."
+    if group is not None:
+        text = f"{_group_display(group)}\n\n{text}"
+    await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+
+
+_group_store = PendingStore(
+    "expense_group",
+    PENDING_TTL,
+    _dump_group,
+    _load_group,
+    on_expire=_on_group_expired,
+    max_entries=settings.pending_max_entries,
+)
+
+
+def _make_key(chat_id: int, message_id: int) -> str:
+    return f"{chat_id}:{message_id}"
 
 
 def confirmation_keyboard(has_items: bool = False) -> InlineKeyboardMarkup:
@@ -98,20 +182,22 @@ async def _build_receipt_display(pending: PendingExpense) -> str:
     )
 
 
-async def store_pending(message: Message, expense: Expense, display_text: str) -> Message:
-    _cleanup_expired()
+async def store_pending(
+    message: Message, expense: Expense, display_text: str, fingerprint: ReceiptFingerprint | None = None
+) -> Message:
     items = json.loads(expense.items_json) if expense.items_json else None
     has_items = bool(items)
     sent = await message.answer(display_text, reply_markup=confirmation_keyboard(has_items))
     key = _make_key(sent.chat.id, sent.message_id)
-    _pending[key] = PendingExpense(expense=expense, display_text=display_text, items=items)
+    pending = PendingExpense(expense=expense, display_text=display_text, items=items, fingerprint=fingerprint)
+    await _store.put(key, pending, pending.created_at)
     return sent
 
 
 @router.callback_query(lambda c: c.data == "expense:confirm")
 async def on_confirm(callback: CallbackQuery):
     key = _make_key(callback.message.chat.id, callback.message.message_id)
-    pending = _pending.pop(key, None)
+    pending = await _store.pop(key)
 
     if not pending:
         await callback.answer("This expense has expired or was already handled.")
@@ -129,7 +215,7 @@ async def on_confirm(callback: CallbackQuery):
             expense.items_json = json.dumps(pending.items)
 
     display = await _build_receipt_display(pending) if pending.items is not None else pending.display_text
-    expense_id = await save_expense(expense)
+    expense_id = await save_expense(expense, pending.fingerprint)
     await link_bot_message(callback.message.chat.id, callback.message.message_id, expense_id)
 
     suffix = "\n\nSaved ✓ (reply to edit)"
@@ -142,12 +228,13 @@ async def on_confirm(callback: CallbackQuery):
 
     await callback.message.edit_text(display + suffix)
     await callback.answer("Expense saved!")
+    await notify_budget_alerts(callback.message, expense.chat_id, [expense])
 
 
 @router.callback_query(lambda c: c.data == "expense:edit_items")
 async def on_edit_items(callback: CallbackQuery):
     key = _make_key(callback.message.chat.id, callback.message.message_id)
-    pending = _pending.get(key)
+    pending = await _store.get(key)
 
     if not pending or not pending.items:
         await callback.answer("No items to edit.")
@@ -161,27 +248,34 @@ async def on_edit_items(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data and c.data.startswith("expense:remove:"))
 async def on_remove_item(callback: CallbackQuery):
     key = _make_key(callback.message.chat.id, callback.message.message_id)
-    pending = _pending.get(key)
-
-    if not pending or not pending.items:
-        await callback.answer("This expense has expired or was already handled.")
-        return
-
     try:
         idx = int(callback.data.split(":")[2])
     except (IndexError, ValueError):
         await callback.answer("Invalid item.")
         return
 
-    if idx < 0 or idx >= len(pending.items):
+    removed: list[dict] = []
+
+    def remove(pending: PendingExpense) -> bool:
+        removed.clear()
+        if pending.items and 0 <= idx < len(pending.items):
+            removed.append(pending.items.pop(idx))
+        return bool(removed)
+
+    # Removed in the state backend itself, so a tap racing a confirm can't bring the popped entry back.
+    pending = await _store.update(key, remove)
+
+    if not pending or not (pending.items or removed):
+        await callback.answer("This expense has expired or was already handled.")
+        return
+    if not removed:
         await callback.answer("Item not found.")
         return
 
-    removed = pending.items.pop(idx)
-    await callback.answer(f"Removed {removed['name']}")
+    await callback.answer(f"Removed {removed[0]['name']}")
 
     if not pending.items:
-        _pending.pop(key, None)
+        await _store.pop(key)
         await callback.message.edit_text("All items removed — expense cancelled.")
         return
 
@@ -192,7 +286,7 @@ async def on_remove_item(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data == "expense:cancel")
 async def on_cancel(callback: CallbackQuery):
     key = _make_key(callback.message.chat.id, callback.message.message_id)
-    pending = _pending.pop(key, None)
+    pending = await _store.pop(key)
 
     if not pending:
         await callback.answer("This expense has expired or was already handled.")
@@ -201,3 +295,126 @@ async def on_cancel(callback: CallbackQuery):
 
     await callback.message.edit_text("Expense cancelled.")
     await callback.answer("Cancelled.")
+
+
+GROUP_STATUS_LABELS = {"saved": "Saved ✓", "cancelled": "Cancelled"}
+
+
+def _group_display(group: PendingGroup) -> str:
+    blocks = []
+    for i, (entry, status) in enumerate(zip(group.entries, group.status, strict=True), 1):
+        label = f" — {GROUP_STATUS_LABELS[status]}" if status else ""
+        blocks.append(f"#{i}{label}\n{entry.display_text}")
+    return "\n\n".join(blocks)
+
+
+def _group_keyboard(group: PendingGroup) -> InlineKeyboardMarkup | None:
+    rows = [
+        [
+            InlineKeyboardButton(text=f"Confirm #{i}", callback_data=f"expense:group:confirm:{i - 1}"),
+            InlineKeyboardButton(text=f"Cancel #{i}", callback_data=f"expense:group:cancel:{i - 1}"),
+        ]
+        for i, status in enumerate(group.status, 1)
+        if status is None
+    ]
+    if not rows:
+        return None
+    if len(rows) > 1:
+        rows.append(
+            [
+                InlineKeyboardButton(text="Confirm all", callback_data="expense:group:confirm:all"),
+                InlineKeyboardButton(text="Cancel all", callback_data="expense:group:cancel:all"),
+            ]
+        )
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def store_pending_group(
+    message: Message,
+    entries: list[tuple[Expense, str]],
+    kind: str = "receipt",
+    fingerprints: list[ReceiptFingerprint | None] | None = None,
+) -> Message:
+    """Send one confirmation for several expenses, each confirmable or cancellable on its own."""
+    fingerprints = fingerprints or [None] * len(entries)
+    group = PendingGroup(
+        entries=[
+            PendingExpense(
+                expense=expense,
+                display_text=display_text,
+                items=json.loads(expense.items_json) if expense.items_json else None,
+                fingerprint=fp,
+            )
+            for (expense, display_text), fp in zip(entries, fingerprints, strict=True)
+        ],
+        status=[None] * len(entries),
+        kind=kind,
+    )
+    sent = await message.answer(_group_display(group), reply_markup=_group_keyboard(group))
+    await _group_store.put(_make_key(sent.chat.id, sent.message_id), group, group.created_at)
+    return sent
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith("expense:group:"))
+async def on_group_action(callback: CallbackQuery):
+    key = _make_key(callback.message.chat.id, callback.message.message_id)
+    try:
+        _, _, action, target = callback.data.split(":")
+        only = None if target == "all" else int(target)
+    except ValueError:
+        await callback.answer("Invalid action.")
+        return
+    status = "saved" if action == "confirm" else "cancelled"
+    claimed: list[int] = []
+
+    def claim(group: PendingGroup) -> bool:
+        indexes = range(len(group.entries)) if only is None else [only]
+        claimed[:] = [i for i in indexes if 0 <= i < len(group.entries) and group.status[i] is None]
+        for i in claimed:
+            group.status[i] = status
+        return bool(claimed)
+
+    def release(group: PendingGroup) -> bool:
+        for i in claimed:
+            group.status[i] = None
+        return True
+
+    # The claim is written to the state backend before saving, so a double tap — or the same tap
+    # delivered to another replica — can't save the same expense twice.
+    group = await _group_store.update(key, claim)
+
+    if not group:
+        await callback.answer("These expenses have expired or were already handled.")
+        await callback.message.edit_reply_markup(reply_markup=None)
+        return
+    if not claimed:
+        await callback.answer("Already handled.")
+        return
+
+    if action == "confirm":
+        try:
+            ids = await save_expenses(
+                [group.entries[i].expense for i in claimed], [group.entries[i].fingerprint for i in claimed]
+            )
+        except Exception:
+            await _group_store.update(key, release)
+            raise
+        await link_group_message(
+            callback.message.chat.id,
+            callback.message.message_id,
+            {i + 1: expense_id for i, expense_id in zip(claimed, ids, strict=True)},
+        )
+
+    if all(group.status):
+        await _group_store.pop(key)
+
+    text = _group_display(group)
+    if "saved" in group.status:
+        text += "\n\nReply with #number and a correction to edit a saved one."
+    await callback.message.edit_text(text, reply_markup=_group_keyboard(group))
+    noun = group.kind if len(claimed) == 1 else f"{group.kind}s"
+    await callback.answer(f"{len(claimed)} {noun} {status}.")
+    if action == "confirm":
+        await notify_budget_alerts(
+            callback.message, callback.message.chat.id, [group.entries[i].expense for i in claimed]
+        )
@@ -1,11 +1,15 @@
+import asyncio
 import json
 import logging
-import tempfile
 import time
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import date
 from pathlib import Path
 
 from aiogram import Bot, F, Router
+from aiogram.filters import Command
 from aiogram.types import (
     CallbackQuery,
     InlineKeyboardButton,
@@ -14,11 +18,27 @@ from aiogram.types import (
 )
 
 from kazo.categories import get_categories_str
-from kazo.claude.client import ask_claude_structured
+from kazo.claude.client import RateLimitExceeded, ask_claude_structured, model_for_task, reserve_claude_calls
+from kazo.claude.resilience import ClaudeUnavailable
+from kazo.config import settings
 from kazo.currency import format_amount, get_base_currency
-from kazo.db.models import Expense
-from kazo.handlers.pending import store_pending
+from kazo.db.models import Expense, ReceiptFingerprint
+from kazo.handlers.pending import store_pending, store_pending_group
+from kazo.jobs import JobFn, JobQueue
+from kazo.media import Media, download_media
+from kazo.pdf import page_count, split_pages
 from kazo.services.currency_service import convert_to_base
+from kazo.services.fingerprint_service import find_duplicate, find_similar, fingerprint
+from kazo.services.job_service import (
+    cancel_job,
+    create_job,
+    finish_job,
+    get_active_jobs,
+    requeue_job,
+    set_job_stage,
+    start_job,
+)
+from kazo.services.pending_store import PendingStore
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -115,37 +135,236 @@ MIME_TO_SUFFIX = {
     "image/heif": ".heif",
 }
 
+SUFFIX_TO_MIME = {suffix: mime for mime, suffix in MIME_TO_SUFFIX.items()}
+
 PRODUCT_SESSION_TTL = 600  # 10 minutes
 
-_product_sessions: dict[int, dict] = {}
+RECEIPT_MISMATCH_TOLERANCE = 0.1
+
+PDF_PAGE_PROMPT = (
+    "Extract all information from page {page} of {pages} of this receipt. "
+    "List only the items printed on this page. Set total to 0 if this page does not show the grand total."
+)
+
+
+async def _on_product_session_expired(bot, message_id: int, session: dict | None) -> None:
+    if bot is None or session is None:
+        return
+    await bot.edit_message_text(
+        "⌛ Expired — send the photo again to log these products.", chat_id=session["chat_id"], message_id=message_id
+    )
+
+
+_product_store = PendingStore(
+    "product",
+    PRODUCT_SESSION_TTL,
+    json.dumps,
+    json.loads,
+    on_expire=_on_product_session_expired,
+    parse_key=int,
+    max_entries=settings.pending_max_entries,
+)
+_product_sessions: dict[int, dict] = _product_store.cache
+
+AlbumPart = tuple[Message, str, str]  # message, file_id, suffix
+
+JOB_STAGE_LABELS = {
+    "download": "Downloading",
+    "preprocess": "Preparing",
+    "classify": "Looking at it",
+    "extract": "Reading",
+}
+
+receipt_jobs = JobQueue("receipt", settings.receipt_workers, settings.receipt_queue_size)
+
 
+@dataclass(slots=True)
+class JobProgress:
+    """Stage tracking for one receipt job: records per-stage timings and keeps its status message current."""
 
-def _cleanup_product_sessions():
-    now = time.monotonic()
-    expired = [k for k, v in _product_sessions.items() if now - v["created_at"] > PRODUCT_SESSION_TTL]
-    for k in expired:
-        del _product_sessions[k]
+    job_id: int
+    bot: Bot
+    chat_id: int
+    message_id: int
+    timings: dict[str, float] = field(default_factory=dict)
 
+    async def show(self, text: str) -> None:
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except Exception:
+            logger.debug("Could not edit status of receipt job %s", self.job_id, exc_info=True)
 
-async def _classify_image(image_path: str) -> str:
+    @asynccontextmanager
+    async def stage(self, name: str):
+        await set_job_stage(self.job_id, name, self.timings)
+        await self.show(f"⏳ {JOB_STAGE_LABELS[name]}...")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 2)
+
+    def summary(self) -> str:
+        total = sum(self.timings.values())
+        stages = " · ".join(f"{name} {seconds:.1f}s" for name, seconds in self.timings.items())
+        return f"✓ Done in {total:.1f}s ({stages})"
+
+
+# A job's stages, given its progress; returns the final status text, or None to show the timing summary.
+ReceiptWork = Callable[[JobProgress], Awaitable[str | None]]
+
+
+_albums: dict[str, list[AlbumPart]] = {}
+
+
+async def _classify_image(media: Media) -> str:
     system_prompt = (PROMPTS_DIR / "classify_photo.txt").read_text()
     try:
         result = await ask_claude_structured(
             prompt="Classify this image.",
             json_schema=CLASSIFY_SCHEMA,
             system_prompt=system_prompt,
-            image_path=image_path,
+            media=media,
+            task="classify",
         )
         return result.get("type", "other")
+    except ClaudeUnavailable:
+        raise
     except Exception:
         logger.exception("Failed to classify image")
         return "receipt"  # default to receipt flow on error
 
 
-async def _handle_receipt(message: Message, bot: Bot, image_path: str):
-    base = await get_base_currency(message.chat.id)
-    categories_str = await get_categories_str(message.chat.id)
-    system_prompt = (
+def _receipt_mismatch(parsed: dict) -> float | None:
+    items = parsed.get("items") or []
+    total = parsed.get("total")
+    if not items or not isinstance(total, int | float) or total <= 0:
+        return None
+    items_sum = sum(i.get("price") or 0 for i in items)
+    if items_sum <= 0:
+        return None
+    return abs(items_sum - total) / total
+
+
+def _receipt_is_valid(parsed: dict) -> bool:
+    if not isinstance(parsed.get("currency"), str) or not isinstance(parsed.get("category"), str):
+        return False
+    total = parsed.get("total")
+    if not isinstance(total, int | float) or total <= 0:
+        return False
+    mismatch = _receipt_mismatch(parsed)
+    return mismatch is None or mismatch <= RECEIPT_MISMATCH_TOLERANCE
+
+
+async def _extract_receipt(message: Message, media: Media, system_prompt: str, charge: bool = True) -> dict:
+    """Extract with the receipt model, escalating to the larger model only when validation fails.
+
+    Pass charge=False when the call was already reserved against the rate limit.
+    """
+    kwargs = {
+        "prompt": "Extract all information from this receipt.",
+        "json_schema": RECEIPT_SCHEMA,
+        "system_prompt": system_prompt,
+        "media": media,
+    }
+    parsed = await ask_claude_structured(**kwargs, chat_id=message.chat.id if charge else None, task="receipt")
+    if _receipt_is_valid(parsed) or model_for_task("escalation") == model_for_task("receipt"):
+        return parsed
+
+    logger.info(
+        "Receipt failed validation, escalating to %s",
+        model_for_task("escalation"),
+        extra={"chat_id": message.chat.id, "handler": "receipt"},
+    )
+    try:
+        # Charged even when the first call was reserved: an escalation is an extra call to a larger model.
+        escalated = await ask_claude_structured(**kwargs, chat_id=message.chat.id, task="escalation")
+    except RateLimitExceeded:
+        logger.warning(
+            "Rate limit reached, keeping the unescalated receipt",
+            extra={"chat_id": message.chat.id, "handler": "receipt"},
+        )
+        return parsed
+    except Exception:
+        logger.exception(
+            "Escalated receipt extraction failed", extra={"chat_id": message.chat.id, "handler": "receipt"}
+        )
+        return parsed
+    if "total" not in escalated or "currency" not in escalated:
+        return parsed
+    return escalated
+
+
+def _merge_receipt_pages(pages: list[dict]) -> dict:
+    """Combine per-page extractions in page order.
+
+    Items are concatenated; store, currency and date come from the first page that has them; the category is the
+    most common one (earliest wins ties); the total is the largest printed total, else the items sum.
+    """
+    merged: dict = {"items": []}
+    categories: list[str] = []
+    for page in pages:
+        merged["items"].extend(page.get("items") or [])
+        for key in ("store", "currency", "expense_date"):
+            if not merged.get(key) and page.get(key):
+                merged[key] = page[key]
+        if page.get("category"):
+            categories.append(page["category"])
+
+    totals = [p["total"] for p in pages if isinstance(p.get("total"), int | float) and p["total"] > 0]
+    if totals:
+        merged["total"] = max(totals)
+    else:
+        merged["total"] = round(sum(i.get("price") or 0 for i in merged["items"]), 2)
+    if categories:
+        merged["category"] = max(categories, key=categories.count)
+    return merged
+
+
+async def _extract_pdf_pages(
+    message: Message, pdf: Media, pages: list[Media], system_prompt: str, charge: bool = True
+) -> dict:
+    """Extract every page concurrently, then merge; falls back to the whole document if the merge doesn't validate.
+
+    Pass charge=False when one call for the document was already reserved against the rate limit.
+    """
+    await reserve_claude_calls(message.chat.id, len(pages) if charge else len(pages) - 1)
+    start = time.perf_counter()
+    extracted = await asyncio.gather(
+        *(
+            ask_claude_structured(
+                prompt=PDF_PAGE_PROMPT.format(page=i, pages=len(pages)),
+                json_schema=RECEIPT_SCHEMA,
+                system_prompt=system_prompt,
+                media=page,
+                task="receipt",
+            )
+            for i, page in enumerate(pages, 1)
+        )
+    )
+    merged = _merge_receipt_pages(list(extracted))
+    logger.info(
+        "Extracted %d PDF pages",
+        len(pages),
+        extra={
+            "chat_id": message.chat.id,
+            "handler": "receipt",
+            "latency_ms": round((time.perf_counter() - start) * 1000),
+        },
+    )
+    if _receipt_is_valid(merged):
+        return merged
+
+    logger.info(
+        "Merged PDF pages failed validation, retrying as one document",
+        extra={"chat_id": message.chat.id, "handler": "receipt"},
+    )
+    return await _extract_receipt(message, pdf, system_prompt, charge=charge)
+
+
+async def _receipt_system_prompt(chat_id: int, base: str) -> str:
+    categories_str = await get_categories_str(chat_id)
+    return (
         (PROMPTS_DIR / "parse_receipt.txt")
         .read_text()
         .format(
@@ -155,14 +374,9 @@ async def _handle_receipt(message: Message, bot: Bot, image_path: str):
         )
     )
 
-    parsed = await ask_claude_structured(
-        prompt="Extract all information from this receipt.",
-        json_schema=RECEIPT_SCHEMA,
-        system_prompt=system_prompt,
-        image_path=image_path,
-        chat_id=message.chat.id,
-    )
 
+async def _build_receipt_expense(message: Message, parsed: dict, base: str) -> tuple[Expense, str]:
+    """Turn an extraction into an expense and its confirmation text; ValueError carries the reply for the user."""
     try:
         total = parsed["total"]
         currency = parsed["currency"].upper()
@@ -171,26 +385,23 @@ async def _handle_receipt(message: Message, bot: Bot, image_path: str):
         logger.exception(
             "Malformed Claude response: %s", parsed, extra={"chat_id": message.chat.id, "handler": "receipt"}
         )
-        await message.answer("Sorry, I couldn't parse that receipt properly. Please try again.")
-        return
+        raise ValueError("Sorry, I couldn't parse that receipt properly. Please try again.") from None
 
     if not total or total <= 0:
-        await message.answer("Couldn't determine a valid total. Please try again.")
-        return
+        raise ValueError("Couldn't determine a valid total. Please try again.")
 
     store = parsed.get("store")
     items = parsed.get("items", [])
     expense_date = parsed.get("expense_date", date.today().isoformat())
 
-    if items:
-        items_sum = sum(i.get("price", 0) for i in items)
-        if items_sum > 0 and abs(items_sum - total) / total > 0.1:
-            logger.warning(
-                "Receipt total %.2f doesn't match items sum %.2f (diff > 10%%)",
-                total,
-                items_sum,
-                extra={"chat_id": message.chat.id, "handler": "receipt"},
-            )
+    mismatch = _receipt_mismatch(parsed)
+    if mismatch is not None and mismatch > RECEIPT_MISMATCH_TOLERANCE:
+        logger.warning(
+            "Receipt total %.2f doesn't match items sum (diff %.0f%%)",
+            total,
+            mismatch * 100,
+            extra={"chat_id": message.chat.id, "handler": "receipt"},
+        )
 
     amount_base, rate = await convert_to_base(total, currency, message.chat.id)
 
@@ -225,11 +436,71 @@ async def _handle_receipt(message: Message, bot: Bot, image_path: str):
         f"🏷 {category}\n"
         f"📅 {expense_date}" + (f"\n🏪 {store}" if store else "") + items_text
     )
+    return expense, display_text
+
+
+async def _handle_receipt(
+    message: Message,
+    bot: Bot,
+    media: Media,
+    pages: list[Media] | None = None,
+    fp: ReceiptFingerprint | None = None,
+) -> str | None:
+    base = await get_base_currency(message.chat.id)
+    system_prompt = await _receipt_system_prompt(message.chat.id, base)
+
+    if pages:
+        parsed = await _extract_pdf_pages(message, media, pages, system_prompt)
+    else:
+        parsed = await _extract_receipt(message, media, system_prompt)
+
+    try:
+        expense, display_text = await _build_receipt_expense(message, parsed, base)
+    except ValueError as e:
+        return str(e)
+
+    display_text += await _similar_note(expense, fp, base)
+    await store_pending(message, expense, display_text, fp)
+    return None
+
+
+async def _find_duplicate(message: Message, media: Media) -> tuple[ReceiptFingerprint, str | None]:
+    """Fingerprint a download; the second value is the reply to send instead when these exact bytes were logged."""
+    fp = await asyncio.to_thread(fingerprint, media)
+    existing = await find_duplicate(message.chat.id, fp)
+    if existing is None:
+        return fp, None
+    logger.info(
+        "Duplicate of expense %s, skipping extraction",
+        existing["id"],
+        extra={"chat_id": message.chat.id, "handler": "receipt"},
+    )
+    base = await get_base_currency(message.chat.id)
+    label = existing["store"] or existing["category"] or "Receipt"
+    return fp, (
+        f"🔁 Already logged: {label} — {format_amount(existing['amount_base'], base)} on {existing['expense_date']} "
+        f"(expense #{existing['id']}). Nothing new was saved."
+    )
 
-    await store_pending(message, expense, display_text)
 
+async def _similar_note(expense: Expense, fp: ReceiptFingerprint | None, base: str) -> str:
+    """A warning for the confirmation when the photo looks like an already saved receipt; empty otherwise.
 
-async def _handle_product_photo(message: Message, bot: Bot, image_path: str):
+    Similar photos are often just the same store's layout, so the user decides whether to save.
+    """
+    if fp is None:
+        return ""
+    similar = await find_similar(expense.chat_id, fp)
+    if similar is None:
+        return ""
+    label = similar["store"] or similar["category"] or "Receipt"
+    logged = f"{label} — {format_amount(similar['amount_base'], base)} on {similar['expense_date']}"
+    if similar["amount"] == expense.amount and str(similar["expense_date"]) == str(expense.expense_date):
+        return f"\n\n⚠️ Same total and date as expense #{similar['id']} ({logged}). Probably already logged."
+    return f"\n\n⚠️ Looks like expense #{similar['id']} ({logged}). Confirm only if this is a different receipt."
+
+
+async def _handle_product_photo(message: Message, bot: Bot, media: Media) -> str | None:
     categories_str = await get_categories_str(message.chat.id)
     system_prompt = (
         (PROMPTS_DIR / "identify_products.txt")
@@ -244,16 +515,14 @@ async def _handle_product_photo(message: Message, bot: Bot, image_path: str):
         prompt="Identify all products visible in this image.",
         json_schema=PRODUCT_SCHEMA,
         system_prompt=system_prompt,
-        image_path=image_path,
+        media=media,
         chat_id=message.chat.id,
+        task="product",
     )
 
     products = parsed.get("products", [])
     if not products:
-        await message.answer(
-            "I couldn't identify any products in this image. Try a clearer photo or send a receipt instead."
-        )
-        return
+        return "I couldn't identify any products in this image. Try a clearer photo or send a receipt instead."
 
     category = parsed.get("category", "other").lower()
     description = parsed.get("description", "Products")
@@ -274,16 +543,21 @@ async def _handle_product_photo(message: Message, bot: Bot, image_path: str):
         ),
     )
 
-    _cleanup_product_sessions()
-    _product_sessions[sent.message_id] = {
-        "chat_id": message.chat.id,
-        "user_id": message.from_user.id,
-        "products": products,
-        "category": category,
-        "description": description,
-        "bot_message_id": sent.message_id,
-        "created_at": time.monotonic(),
-    }
+    created_at = time.time()
+    await _product_store.put(
+        sent.message_id,
+        {
+            "chat_id": message.chat.id,
+            "user_id": message.from_user.id,
+            "products": products,
+            "category": category,
+            "description": description,
+            "bot_message_id": sent.message_id,
+            "created_at": created_at,
+        },
+        created_at,
+    )
+    return None
 
 
 async def _process_product_prices(message: Message, session: dict):
@@ -305,6 +579,7 @@ async def _process_product_prices(message: Message, session: dict):
             json_schema=PRODUCT_PRICE_SCHEMA,
             system_prompt=system_prompt,
             chat_id=message.chat.id,
+            task="expense",
         )
     except Exception:
         logger.exception(
@@ -323,7 +598,7 @@ async def _process_product_prices(message: Message, session: dict):
         await message.answer("Couldn't determine a valid total. Please try again.")
         return
 
-    _product_sessions.pop(session["bot_message_id"], None)
+    await _product_store.pop(session["bot_message_id"])
 
     amount_base, rate = await convert_to_base(total, currency, message.chat.id)
 
@@ -362,30 +637,225 @@ async def _process_product_prices(message: Message, session: dict):
     await store_pending(message, expense, display_text)
 
 
-async def _parse_and_save(message: Message, bot: Bot, file_id: str, suffix: str):
-    file = await bot.get_file(file_id)
-
-    tmp_path: str | None = None
+def _pdf_page_count(pdf: Media) -> int:
     try:
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-            tmp_path = tmp.name
-            await bot.download_file(file.file_path, tmp)
+        return page_count(pdf.data)
+    except Exception:
+        logger.warning("Could not read PDF page count, sending it as one document", exc_info=True)
+        return 0
+
+
+def _split_pdf_pages(pdf: Media) -> list[Media]:
+    return [Media(page, pdf.media_type) for page in split_pages(pdf.data)]
 
-        image_type = await _classify_image(tmp_path)
-        logger.info("Image classified as: %s", image_type, extra={"chat_id": message.chat.id, "handler": "photo"})
 
+def _prepare_pdf(media: Media) -> tuple[list[Media], str | None]:
+    """Split a multi-page PDF into pages (none for images and single pages); the second value rejects long ones."""
+    if media.media_type != "application/pdf":
+        return [], None
+    count = _pdf_page_count(media)
+    if count > settings.pdf_max_pages:
+        return [], (
+            f"This PDF has {count} pages; I can read up to {settings.pdf_max_pages}. "
+            "Please send just the receipt pages."
+        )
+    if count > 1:
+        return _split_pdf_pages(media), None
+    return [], None
+
+
+async def _parse_and_save(message: Message, bot: Bot, file_id: str, suffix: str, progress: JobProgress) -> str | None:
+    """Run the stages of one receipt job; returns the final status text when there is nothing to confirm.
+
+    The file stays in memory from download to request encoding.
+    """
+    async with progress.stage("download"):
+        media = await download_media(bot, file_id, SUFFIX_TO_MIME.get(suffix, "image/jpeg"))
+
+    async with progress.stage("preprocess"):
+        fp, duplicate = await _find_duplicate(message, media)
+        if duplicate:
+            return duplicate
+        pages, rejection = _prepare_pdf(media)
+        if rejection:
+            return rejection
+
+    async with progress.stage("classify"):
+        image_type = await _classify_image(pages[0] if pages else media)
+    logger.info("Image classified as: %s", image_type, extra={"chat_id": message.chat.id, "handler": "photo"})
+
+    if image_type not in ("product", "receipt"):
+        return "I'm not sure what this is. Send a receipt photo or a picture of products you bought."
+    async with progress.stage("extract"):
         if image_type == "product":
-            await _handle_product_photo(message, bot, tmp_path)
-        elif image_type == "receipt":
-            await _handle_receipt(message, bot, tmp_path)
-        else:
-            await message.answer("I'm not sure what this is. Send a receipt photo or a picture of products you bought.")
-    except Exception:
+            return await _handle_product_photo(message, bot, pages[0] if pages else media)
+        return await _handle_receipt(message, bot, media, pages, fp)
+
+
+async def _run_receipt_job(job_id: int, message: Message, bot: Bot, status_id: int, work: ReceiptWork):
+    if not await start_job(job_id):
+        return
+    progress = JobProgress(job_id, bot, message.chat.id, status_id)
+    try:
+        outcome = await work(progress)
+    except RateLimitExceeded as e:
+        logger.warning("Rate limit hit: %s", e, extra={"chat_id": message.chat.id, "handler": "photo"})
+        await finish_job(job_id, "failed", progress.timings, "rate_limited")
+        await progress.show(f"Rate limit reached ({settings.rate_limit_per_hour}/hour). Please wait a bit.")
+        return
+    except ClaudeUnavailable as e:
+        # Not a failure of this receipt: run it again once the breaker lets calls through.
+        logger.warning(
+            "Claude unavailable, requeueing receipt job %s: %s", job_id, e, extra={"chat_id": message.chat.id}
+        )
+        if await requeue_job(job_id, progress.timings):
+            delay = e.retry_after or settings.claude_breaker_reset_seconds
+            receipt_jobs.submit_later(job_id, _receipt_job(job_id, message, bot, status_id, work), delay)
+            await progress.show("Claude is unavailable right now, message queued. I'll process it once it's back.")
+        return
+    except Exception as e:
         logger.exception("Failed to process image", extra={"chat_id": message.chat.id, "handler": "photo"})
-        await message.answer("Sorry, I couldn't process that image. Try a clearer photo.")
+        await finish_job(job_id, "failed", progress.timings, type(e).__name__)
+        await progress.show("Sorry, I couldn't process that image. Try a clearer photo.")
+        return
+
+    await finish_job(job_id, "done", progress.timings)
+    await progress.show(outcome or progress.summary())
+    logger.info(
+        "Receipt job %s done",
+        job_id,
+        extra={
+            "chat_id": message.chat.id,
+            "handler": "photo",
+            "latency_ms": round(sum(progress.timings.values()) * 1000),
+        },
+    )
+
+
+def _receipt_job(job_id: int, message: Message, bot: Bot, status_id: int, work: ReceiptWork) -> JobFn:
+    return lambda: _run_receipt_job(job_id, message, bot, status_id, work)
+
+
+async def _enqueue_receipt(
+    message: Message, bot: Bot, file_id: str, suffix: str, work: ReceiptWork, status_text: str = "⏳ Queued..."
+):
+    """Record a receipt job and hand it to the workers; the handler returns without waiting for it."""
+    if receipt_jobs.full():
+        await message.answer("I'm still working through other receipts. Please send this one again in a minute.")
+        return
+    status = await message.answer(status_text)
+    job_id = await create_job(message.chat.id, message.from_user.id, file_id, suffix, status.message_id)
+    queued = receipt_jobs.submit(job_id, _receipt_job(job_id, message, bot, status.message_id, work))
+    if not queued:
+        await cancel_job(message.chat.id, job_id)
+        await status.edit_text("I'm still working through other receipts. Please send this one again in a minute.")
+
+
+async def _collect_album(message: Message, file_id: str, suffix: str) -> list[AlbumPart] | None:
+    """Buffer album parts; the first part's handler waits out the window and receives the whole album."""
+    group_id = message.media_group_id
+    parts = _albums.get(group_id)
+    if parts is not None:
+        parts.append((message, file_id, suffix))
+        return None
+    _albums[group_id] = [(message, file_id, suffix)]
+    try:
+        await asyncio.sleep(settings.album_window_seconds)
     finally:
-        if tmp_path:
-            Path(tmp_path).unlink(missing_ok=True)
+        parts = _albums.pop(group_id)
+    return parts
+
+
+async def _process_album(parts: list[AlbumPart], bot: Bot, progress: JobProgress) -> str | None:
+    """Download and extract every receipt of an album concurrently, then confirm them in one message.
+
+    Runs as one receipt job. Albums are treated as receipts (no per-photo classification); each part runs
+    download then extraction under one semaphore, so early parts are extracted while later ones are still
+    downloading. PDF parts get the same page limit and per-page extraction as a PDF sent on its own.
+    """
+    message = parts[0][0]
+    await reserve_claude_calls(message.chat.id, len(parts))
+
+    base = await get_base_currency(message.chat.id)
+    system_prompt = await _receipt_system_prompt(message.chat.id, base)
+    budget = asyncio.Semaphore(settings.album_max_concurrency)
+
+    async def run_part(part_message: Message, file_id: str, suffix: str) -> tuple[ReceiptFingerprint, dict | str]:
+        async with budget:
+            media = await download_media(bot, file_id, SUFFIX_TO_MIME.get(suffix, "image/jpeg"))
+            fp, duplicate = await _find_duplicate(part_message, media)
+            if duplicate:
+                return fp, duplicate
+            pages, rejection = _prepare_pdf(media)
+            if rejection:
+                return fp, rejection
+            if pages:
+                return fp, await _extract_pdf_pages(part_message, media, pages, system_prompt, charge=False)
+            return fp, await _extract_receipt(part_message, media, system_prompt, charge=False)
+
+    start = time.perf_counter()
+    async with progress.stage("extract"):
+        results = await asyncio.gather(*(run_part(*part) for part in parts), return_exceptions=True)
+    # An outage fails every part alike: retry the whole album once Claude is back rather than report them all.
+    if unavailable := next((r for r in results if isinstance(r, ClaudeUnavailable)), None):
+        raise unavailable
+    logger.info(
+        "Extracted album of %d receipts",
+        len(parts),
+        extra={
+            "chat_id": message.chat.id,
+            "handler": "receipt_album",
+            "latency_ms": round((time.perf_counter() - start) * 1000),
+        },
+    )
+
+    entries: list[tuple[Expense, str]] = []
+    fingerprints: list[ReceiptFingerprint | None] = []
+    notices: list[str] = []
+    failed: list[int] = []
+    for i, ((part_message, _, _), result) in enumerate(zip(parts, results, strict=True), 1):
+        if isinstance(result, BaseException):
+            logger.error(
+                "Album receipt %d failed",
+                i,
+                exc_info=result,
+                extra={"chat_id": message.chat.id, "handler": "receipt_album"},
+            )
+            failed.append(i)
+            continue
+        fp, parsed = result
+        if isinstance(parsed, str):
+            notices.append(f"#{i}: {parsed}")
+            continue
+        try:
+            expense, display_text = await _build_receipt_expense(part_message, parsed, base)
+        except ValueError:
+            failed.append(i)
+            continue
+        entries.append((expense, display_text + await _similar_note(expense, fp, base)))
+        fingerprints.append(fp)
+
+    if notices:
+        await message.answer("\n".join(notices))
+    if not entries:
+        return None if notices else "Sorry, I couldn't read any of those receipts. Try clearer photos."
+    if failed:
+        await message.answer(f"Couldn't read receipt {', '.join(f'#{i}' for i in failed)} — send it again on its own.")
+    await store_pending_group(message, entries, fingerprints=fingerprints)
+    return None
+
+
+async def _enqueue_album(parts: list[AlbumPart], bot: Bot):
+    # One job for the whole album, recorded under its first file, so /jobs lists and cancels it as a unit.
+    message, file_id, suffix = parts[0]
+    await _enqueue_receipt(
+        message,
+        bot,
+        file_id,
+        suffix,
+        lambda progress: _process_album(parts, bot, progress),
+        status_text=f"Processing {len(parts)} receipts...",
+    )
 
 
 @router.message(F.reply_to_message & F.text & ~F.text.startswith("/"))
@@ -394,7 +864,7 @@ async def handle_product_price_reply(message: Message):
         return
 
     reply_msg_id = message.reply_to_message.message_id
-    session = _product_sessions.get(reply_msg_id)
+    session = await _product_store.get(reply_msg_id)
     if not session:
         return
     if session["chat_id"] != message.chat.id:
@@ -408,12 +878,23 @@ async def handle_receipt_photo(message: Message, bot: Bot):
     if not message.from_user:
         return
 
-    await message.answer("Processing image...")
     photo = message.photo[-1]
-    await _parse_and_save(message, bot, photo.file_id, ".jpg")
+    if message.media_group_id:
+        parts = await _collect_album(message, photo.file_id, ".jpg")
+        if parts:
+            await _enqueue_album(parts, bot)
+        return
 
+    await _enqueue_receipt(
+        message,
+        bot,
+        photo.file_id,
+        ".jpg",
+        lambda progress: _parse_and_save(message, bot, photo.file_id, ".jpg", progress),
+    )
 
-@router.message(F.document)
+
+@router.message(F.document.mime_type.in_(SUPPORTED_DOC_MIMES))
 async def handle_receipt_document(message: Message, bot: Bot):
     if not message.from_user:
         return
@@ -424,15 +905,22 @@ async def handle_receipt_document(message: Message, bot: Bot):
     if mime not in SUPPORTED_DOC_MIMES:
         return
 
-    await message.answer("Processing document...")
     suffix = MIME_TO_SUFFIX.get(mime, ".bin")
-    await _parse_and_save(message, bot, doc.file_id, suffix)
+    if message.media_group_id:
+        parts = await _collect_album(message, doc.file_id, suffix)
+        if parts:
+            await _enqueue_album(parts, bot)
+        return
+
+    await _enqueue_receipt(
+        message, bot, doc.file_id, suffix, lambda progress: _parse_and_save(message, bot, doc.file_id, suffix, progress)
+    )
 
 
 @router.callback_query(lambda c: c.data == "product:cancel")
 async def on_product_cancel(callback: CallbackQuery):
     msg_id = callback.message.message_id
-    session = _product_sessions.pop(msg_id, None)
+    session = await _product_store.pop(msg_id)
 
     if not session:
         await callback.answer("Session expired.")
@@ -441,3 +929,53 @@ async def on_product_cancel(callback: CallbackQuery):
 
     await callback.message.edit_text("Product identification cancelled.")
     await callback.answer("Cancelled.")
+
+
+def _jobs_keyboard(jobs: list[dict]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=f"Cancel #{job['id']}", callback_data=f"job:cancel:{job['id']}")] for job in jobs
+        ]
+    )
+
+
+@router.message(Command("jobs"))
+async def cmd_jobs(message: Message):
+    jobs = await get_active_jobs(message.chat.id)
+    if not jobs:
+        await message.answer("No receipts in progress.")
+        return
+    lines = ["Receipts in progress:"]
+    for job in jobs:
+        stage = JOB_STAGE_LABELS.get(job["stage"], "Queued") if job["status"] == "running" else "Queued"
+        lines.append(f"  #{job['id']} — {stage} (since {job['created_at']} UTC)")
+    await message.answer("\n".join(lines), reply_markup=_jobs_keyboard(jobs))
+
+
+@router.callback_query(lambda c: c.data and c.data.startswith("job:cancel:"))
+async def on_job_cancel(callback: CallbackQuery, bot: Bot):
+    try:
+        job_id = int(callback.data.split(":")[2])
+    except (IndexError, ValueError):
+        await callback.answer("Invalid job.")
+        return
+
+    job = await cancel_job(callback.message.chat.id, job_id)
+    if job is None:
+        await callback.answer("That receipt is already finished.")
+        return
+    receipt_jobs.cancel(job_id)
+    if job["status_message_id"]:
+        try:
+            await bot.edit_message_text(
+                "✖ Cancelled.", chat_id=callback.message.chat.id, message_id=job["status_message_id"]
+            )
+        except Exception:
+            logger.debug("Could not edit status of cancelled job %s", job_id, exc_info=True)
+
+    remaining = await get_active_jobs(callback.message.chat.id)
+    if remaining:
+        await callback.message.edit_reply_markup(reply_markup=_jobs_keyboard(remaining))
+    else:
+        await callback.message.edit_text("No receipts in progress.")
+    await callback.answer(f"Cancelled #{job_id}.")
@@ -1,14 +1,24 @@
 import logging
+from collections.abc import Awaitable
 from datetime import date, timedelta
-from pathlib import Path
 
 from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import FSInputFile, Message
-
-from kazo.charts import daily_spending_chart, monthly_trend_chart, spending_by_category_chart
+from aiogram.types import BufferedInputFile, Message
+
+from kazo.charts import (
+    Chart,
+    RenderError,
+    chart_cache,
+    daily_spending_chart,
+    monthly_trend_chart,
+    spending_by_category_chart,
+)
 from kazo.currency import format_amount, get_base_currency
+from kazo.services.anomaly_service import find_anomalies
 from kazo.services.budget_service import budget_vs_actual
+from kazo.services.forecast_service import forecast
 from kazo.services.summary_service import (
     all_time_stats,
     daily_spending,
@@ -20,6 +30,35 @@ from kazo.services.summary_service import (
 logger = logging.getLogger(__name__)
 router = Router()
 
+ANOMALY_DAYS = 90
+ANOMALY_LIMIT = 5
+FORECAST_LIMIT = 8
+
+
+async def _answer_with_chart(message: Message, text: str, render: Awaitable[Chart | None]) -> None:
+    """Send the report with its chart as the photo caption; text only when there is no chart or it fails to render.
+
+    A chart Telegram already has is sent by file_id instead of being uploaded again.
+    """
+    try:
+        chart = await render
+    except RenderError:
+        logger.warning("Chart rendering failed", exc_info=True, extra={"chat_id": message.chat.id, "handler": "chart"})
+        chart = None
+    if chart is None:
+        await message.answer(text)
+        return
+    if chart.file_id:
+        try:
+            await message.answer_photo(chart.file_id, caption=text)
+            return
+        except TelegramBadRequest:
+            logger.info("Cached chart file_id rejected, uploading again", extra={"chat_id": message.chat.id})
+            chart_cache.forget_file_id(chart.key)
+    sent = await message.answer_photo(BufferedInputFile(chart.png, filename="chart.png"), caption=text)
+    if sent.photo:
+        chart_cache.remember_file_id(chart.key, sent.photo[-1].file_id)
+
 
 def _parse_date_range(arg: str | None) -> tuple[date, date, str] | None:
     today = date.today()
@@ -80,14 +119,7 @@ async def cmd_summary(message: Message):
             budget_lines.append(f"  {label}: {bar} {pct:.0f}% ({format_amount(bd['remaining'], base)} left)")
         text += "\n\n💰 Budget:\n" + "\n".join(budget_lines)
 
-    chart_path = await spending_by_category_chart(data, base)
-    if chart_path:
-        try:
-            await message.answer_photo(FSInputFile(chart_path), caption=text)
-        finally:
-            Path(chart_path).unlink(missing_ok=True)
-    else:
-        await message.answer(text)
+    await _answer_with_chart(message, text, spending_by_category_chart(data, base))
 
 
 @router.message(Command("monthly"))
@@ -103,14 +135,7 @@ async def cmd_monthly(message: Message):
 
     text = "📈 Monthly spending:\n\n" + "\n".join(lines)
 
-    chart_path = await monthly_trend_chart(list(reversed(data)), base)
-    if chart_path:
-        try:
-            await message.answer_photo(FSInputFile(chart_path), caption=text)
-        finally:
-            Path(chart_path).unlink(missing_ok=True)
-    else:
-        await message.answer(text)
+    await _answer_with_chart(message, text, monthly_trend_chart(list(reversed(data)), base))
 
 
 @router.message(Command("daily"))
@@ -139,14 +164,7 @@ async def cmd_daily(message: Message) -> None:
                 total_budget = bd["budget"]
                 break
 
-    chart_path = await daily_spending_chart(data, base, budget=total_budget)
-    if chart_path:
-        try:
-            await message.answer_photo(FSInputFile(chart_path), caption=text)
-        finally:
-            Path(chart_path).unlink(missing_ok=True)
-    else:
-        await message.answer(text)
+    await _answer_with_chart(message, text, daily_spending_chart(data, base, budget=total_budget))
 
 
 @router.message(Command("stats"))
@@ -188,6 +206,70 @@ async def cmd_stats(message: Message) -> None:
     await message.answer("\n".join(lines))
 
 
+@router.message(Command("anomalies"))
+async def cmd_anomalies(message: Message) -> None:
+    parts = message.text.split(maxsplit=1) if message.text else []
+    try:
+        days = int(parts[1]) if len(parts) > 1 else ANOMALY_DAYS
+    except ValueError:
+        await message.answer("Usage: /anomalies [days]\n/anomalies 30")
+        return
+    days = max(1, min(days, 3650))
+
+    result = await find_anomalies(message.chat.id, days)
+    if result is None:
+        await message.answer("No expenses recorded yet.")
+        return
+    if not result["days"] and not result["expenses"]:
+        await message.answer(f"Nothing unusual in the last {days} days.")
+        return
+
+    base = await get_base_currency(message.chat.id)
+    lines = [f"🔎 Unusual spending (last {days} days)"]
+    if result["days"]:
+        lines.append("\nDays:")
+        for d in result["days"][:ANOMALY_LIMIT]:
+            weekday = date.fromisoformat(d["date"]).strftime("%a")
+            lines.append(
+                f"• {d['date']} ({weekday}): {format_amount(d['total'], base)}"
+                f" — usually ~{format_amount(d['baseline'], base)}"
+            )
+    if result["expenses"]:
+        lines.append("\nExpenses:")
+        for e in result["expenses"][:ANOMALY_LIMIT]:
+            where = f" at {e['store']}" if e["store"] else ""
+            lines.append(
+                f"• {e['expense_date']}: {format_amount(e['amount_base'], base)}{where}"
+                f" ({e['category'] or 'uncategorized'}) — typical {format_amount(e['typical'], base)}"
+            )
+    await message.answer("\n".join(lines))
+
+
+def _forecast_line(row: dict, base: str) -> str:
+    line = f"{format_amount(row['spent'], base)} → ~{format_amount(row['projected'], base)}"
+    if row["budget"]:
+        warning = " ⚠️" if row["pct"] > 100 else ""
+        line += f" ({row['pct']:.0f}% of {format_amount(row['budget'], base)}){warning}"
+    return line
+
+
+@router.message(Command("forecast"))
+async def cmd_forecast(message: Message) -> None:
+    result = await forecast(message.chat.id)
+    if not result["quarter"]["total"]["projected"]:
+        await message.answer("Not enough data to forecast yet.")
+        return
+
+    base = await get_base_currency(message.chat.id)
+    lines = ["🔮 Forecast"]
+    for period in (result["month"], result["quarter"]):
+        lines.append(f"\n{period['label']} — {period['days_left']} days left")
+        lines.append(f"Total: {_forecast_line(period['total'], base)}")
+        for row in period["categories"][:FORECAST_LIMIT]:
+            lines.append(f"  • {row['category'] or 'uncategorized'}: {_forecast_line(row, base)}")
+    await message.answer("\n".join(lines))
+
+
 @router.message(Command("search"))
 async def cmd_search(message: Message) -> None:
     parts = message.text.split(maxsplit=1) if message.text else []
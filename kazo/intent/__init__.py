@@ -0,0 +1,11 @@
+from kazo.intent.classifier import (
+    IntentPrediction,
+    classify_local,
+    predict,
+)
+
+__all__ = [
+    "IntentPrediction",
+    "classify_local",
+    "predict",
+]
@@ -0,0 +1,133 @@
+import itertools
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+
+from kazo.config import settings
+
+MODEL_PATH = Path(__file__).parent / "model.json"
+TRAINING_PATH = Path(__file__).parent / "training.tsv"
+# Held-out labelled messages scored by scripts/eval_intent.py; same format as the training data.
+EVAL_PATH = Path(__file__).parent / "eval.tsv"
+
+# Intents that need extracted arguments or a Claude answer anyway are always left to Claude.
+LOCAL_INTENTS = frozenset(
+    {"undo", "edit", "summary", "categories", "subscriptions", "rate", "items", "help", "chat"},
+)
+
+# Intents that delete data are only taken from an exact rule match, never from the model.
+RULE_ONLY_INTENTS = frozenset({"undo"})
+# The model drops words it has never seen, so a text it knows less than this share of is left to Claude.
+MIN_COVERAGE = 0.5
+# Words that can reverse a sentence's meaning; the model would drop them or weigh them like any other word.
+NEGATIONS = frozenset(
+    {"no", "not", "never", "dont", "don't", "didnt", "didn't", "doesnt", "doesn't", "cant", "can't", "cannot"},
+)
+
+_WORD = re.compile(r"[a-z']+")
+
+_RULES: list[tuple[re.Pattern[str], str]] = [
+    (re.compile(r"^(undo|scratch that|take that back)( (that|it|the last( one| expense)?))?$"), "undo"),
+    (re.compile(r"^(delete|remove) (that|it|the last( one| expense)?|my last expense)$"), "undo"),
+    (re.compile(r"^((show|list) )?(my |the )?categor(y|ies)( list)?$"), "categories"),
+    (re.compile(r"^((show|list) )?(my |the )?subs(criptions)?$"), "subscriptions"),
+    (re.compile(r"^(help|show help|what can you do|how does this work)$"), "help"),
+    (re.compile(r"^(hi|hey|hello|hello there|thanks|thank you|ok|okay|cool|nice|bye)$"), "chat"),
+    (re.compile(r"^(summary|(show|give me) (a |my )?summary)$"), "summary"),
+]
+
+
+@dataclass(slots=True)
+class IntentPrediction:
+    intent: str
+    confidence: float
+    source: str
+
+
+def normalize(text: str) -> str:
+    words = _WORD.findall(text.lower())
+    if words and words[-1] == "please":
+        words.pop()
+    return " ".join(words)
+
+
+def tokenize(text: str) -> list[str]:
+    words = normalize(text).split()
+    return words + [f"{a} {b}" for a, b in itertools.pairwise(words)]
+
+
+def train(examples: Iterable[tuple[str, str]], alpha: float = 1.0) -> dict:
+    """Fit a multinomial naive Bayes model over word unigrams and bigrams."""
+    class_counts: Counter[str] = Counter()
+    token_counts: dict[str, Counter[str]] = defaultdict(Counter)
+    for intent, text in examples:
+        class_counts[intent] += 1
+        token_counts[intent].update(tokenize(text))
+
+    vocab = sorted({tok for counts in token_counts.values() for tok in counts})
+    total = sum(class_counts.values())
+    model: dict = {"classes": sorted(class_counts), "log_prior": {}, "log_likelihood": {}}
+    for intent in model["classes"]:
+        counts = token_counts[intent]
+        denom = sum(counts.values()) + alpha * len(vocab)
+        model["log_prior"][intent] = round(math.log(class_counts[intent] / total), 6)
+        model["log_likelihood"][intent] = {tok: round(math.log((counts[tok] + alpha) / denom), 6) for tok in vocab}
+    return model
+
+
+def load_training_examples(path: Path = TRAINING_PATH) -> list[tuple[str, str]]:
+    examples = []
+    for line in path.read_text().splitlines():
+        if line.strip():
+            intent, text = line.split("\t", 1)
+            examples.append((intent, text))
+    return examples
+
+
+@cache
+def load_model() -> dict:
+    return json.loads(MODEL_PATH.read_text())
+
+
+def predict(text: str, model: dict | None = None) -> IntentPrediction | None:
+    """Exact rules first, then the model; None for negated text or text the model mostly doesn't know."""
+    normalized = normalize(text)
+    for pattern, intent in _RULES:
+        if pattern.match(normalized):
+            return IntentPrediction(intent=intent, confidence=1.0, source="rule")
+
+    words = normalized.split()
+    if NEGATIONS.intersection(words):
+        return None
+
+    model = model or load_model()
+    likelihood = model["log_likelihood"]
+    vocab = likelihood[model["classes"][0]]
+    if sum(word in vocab for word in words) < MIN_COVERAGE * len(words):
+        return None
+    tokens = [tok for tok in tokenize(text) if tok in vocab]
+    if not tokens:
+        return None
+
+    scores = {c: model["log_prior"][c] + sum(likelihood[c][tok] for tok in tokens) for c in model["classes"]}
+    best = max(scores, key=scores.__getitem__)
+    norm = sum(math.exp(s - scores[best]) for s in scores.values())
+    return IntentPrediction(intent=best, confidence=1.0 / norm, source="model")
+
+
+def classify_local(text: str, threshold: float | None = None) -> dict | None:
+    """Return an intent result shaped like the Claude classifier's, or None when unsure."""
+    prediction = predict(text)
+    if prediction is None or prediction.intent not in LOCAL_INTENTS:
+        return None
+    if prediction.intent in RULE_ONLY_INTENTS and prediction.source != "rule":
+        return None
+    min_confidence = settings.intent_local_threshold if threshold is None else threshold
+    if prediction.confidence < min_confidence:
+        return None
+    return {"intent": prediction.intent}
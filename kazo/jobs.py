@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[None]]
+
+
+class JobQueue:
+    """Bounded queue of background jobs run by a fixed number of workers, each job cancellable by id.
+
+    Workers start on the first submit and are bound to that event loop; a queue used from a new loop
+    (a restart, or each test) starts over with fresh workers.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue[tuple[int, JobFn]] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[int, asyncio.Task] = {}
+        self._cancelled: set[int] = set()
+        self._delayed: set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_workers(self) -> asyncio.Queue[tuple[int, JobFn]]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._running = {}
+            self._cancelled = set()
+            self._workers = [asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+        return self._queue
+
+    def submit(self, job_id: int, run: JobFn) -> bool:
+        """Queue a job; False when the queue is full."""
+        try:
+            self._ensure_workers().put_nowait((job_id, run))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def submit_later(self, job_id: int, run: JobFn, delay: float) -> None:
+        """Queue a job after `delay` seconds, trying again every `delay` while the queue is full."""
+
+        async def resubmit() -> None:
+            while True:
+                await asyncio.sleep(delay)
+                if self.submit(job_id, run):
+                    return
+                logger.warning("%s queue full, job %s waits another %.0fs", self.name, job_id, delay)
+
+        task = asyncio.create_task(resubmit())
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a running job, or mark a queued one to be skipped. True if the job was running."""
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return True
+        self._cancelled.add(job_id)
+        return False
+
+    async def _worker(self, queue: asyncio.Queue[tuple[int, JobFn]]) -> None:
+        while True:
+            job_id, run = await queue.get()
+            try:
+                if job_id in self._cancelled:
+                    self._cancelled.discard(job_id)
+                    continue
+                # Each job gets its own task, so cancelling it leaves the worker running.
+                task = asyncio.create_task(run())
+                self._running[job_id] = task
+                try:
+                    await asyncio.wait([task])
+                finally:
+                    self._running.pop(job_id, None)
+                    if not task.done():
+                        task.cancel()
+                if task.cancelled():
+                    logger.info("%s job %s cancelled", self.name, job_id)
+                elif task.exception() is not None:
+                    self.failed += 1
+                    logger.error("%s job %s failed", self.name, job_id, exc_info=task.exception())
+                else:
+                    self.completed += 1
+            finally:
+                queue.task_done()
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel running jobs and stop the workers; queued and delayed jobs are dropped."""
+        for task in [*self._running.values(), *self._workers, *self._delayed]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._delayed, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
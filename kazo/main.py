@@ -2,12 +2,21 @@ import asyncio
 import json
 import logging
 import shutil
+import signal
 import time
-from collections import defaultdict
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
 
 from aiogram import Bot, Dispatcher
 from aiogram.types import CallbackQuery, Message
+from aiohttp import web
 
+from kazo.charts import chart_cache, chart_renderer
+from kazo.charts.templates import warm_up as warm_up_charts
+from kazo.claude.client import warm_up as warm_up_claude
+from kazo.claude.resilience import ClaudeUnavailable, get_breaker
 from kazo.config import settings
 from kazo.db.database import close_db, get_db, init_db
 from kazo.handlers import (
@@ -15,6 +24,7 @@ from kazo.handlers import (
     categories,
     common,
     currencies,
+    digest,
     export,
     items,
     pending,
@@ -23,37 +33,164 @@ from kazo.handlers import (
     summary,
 )
 from kazo.logging import setup_logging
+from kazo.services.digest_service import DIGEST_KINDS
+from kazo.services.job_service import fail_interrupted_jobs
+from kazo.services.stats_service import ensure_stats, verify_stats
+from kazo.state import close_state_backend
+from kazo.webhook import UpdatePool, build_webhook_app
 
 setup_logging(level=logging.DEBUG if settings.debug else logging.INFO)
 logger = logging.getLogger(__name__)
 
-_rate_limit_windows: dict[int, list[float]] = defaultdict(list)
+# Updates that hit an open Claude circuit, replayed once the backend recovers.
+_deferred_updates: deque[tuple] = deque()
 
 
-def check_rate_limit(chat_id: int) -> bool:
-    now = time.monotonic()
-    window = _rate_limit_windows[chat_id]
-    cutoff = now - 3600
-    _rate_limit_windows[chat_id] = [t for t in window if t > cutoff]
-    return len(_rate_limit_windows[chat_id]) < settings.rate_limit_per_hour
-
-
-def record_rate_limit(chat_id: int) -> None:
-    _rate_limit_windows[chat_id].append(time.monotonic())
+def _event_chat_id(event) -> int | None:
+    if hasattr(event, "chat") and event.chat:
+        return event.chat.id
+    if hasattr(event, "message") and event.message and event.message.chat:
+        return event.message.chat.id
+    return None
 
 
 async def auth_middleware(handler, event, data: dict):
-    chat_id = None
-    if hasattr(event, "chat") and event.chat:
-        chat_id = event.chat.id
-    elif hasattr(event, "message") and event.message and event.message.chat:
-        chat_id = event.message.chat.id
+    chat_id = _event_chat_id(event)
     if settings.allowed_chat_ids and chat_id not in settings.allowed_chat_ids:
         logger.warning("Unauthorized access", extra={"chat_id": chat_id})
         return
     return await handler(event, data)
 
 
+@dataclass(slots=True)
+class _ChatLane:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    depth: int = 0  # running + waiting updates
+    last_wait_ms: int = 0
+
+
+_chat_lanes: dict[int, _ChatLane] = {}
+
+
+async def chat_order_middleware(handler, event, data: dict):
+    """Run each chat's updates one at a time in arrival order; different chats stay fully parallel.
+
+    asyncio.Lock wakes waiters FIFO, so the lane is the queue. Album parts bypass it: the album
+    collector waits for its siblings, which would otherwise be stuck behind it.
+    """
+    chat_id = _event_chat_id(event)
+    if chat_id is None or getattr(event, "media_group_id", None):
+        return await handler(event, data)
+
+    lane = _chat_lanes.setdefault(chat_id, _ChatLane())
+    if lane.depth >= settings.chat_queue_size:
+        logger.warning("Chat queue full, dropping update", extra={"chat_id": chat_id, "handler": "chat_queue"})
+        if isinstance(event, Message):
+            await event.answer("I'm still working through your earlier messages — please send that again shortly.")
+        elif isinstance(event, CallbackQuery):
+            await event.answer("Still working through your earlier messages.", show_alert=True)
+        return
+
+    lane.depth += 1
+    enqueued = time.monotonic()
+    try:
+        async with lane.lock:
+            lane.last_wait_ms = round((time.monotonic() - enqueued) * 1000)
+            logger.debug(
+                "Chat queue wait",
+                extra={"chat_id": chat_id, "handler": "chat_queue", "latency_ms": lane.last_wait_ms},
+            )
+            return await handler(event, data)
+    finally:
+        lane.depth -= 1
+        if lane.depth == 0:
+            del _chat_lanes[chat_id]
+
+
+def chat_queue_stats() -> dict[str, Any]:
+    return {
+        "active_chats": len(_chat_lanes),
+        "queued": sum(lane.depth for lane in _chat_lanes.values()),
+        "wait_ms": {str(chat_id): lane.last_wait_ms for chat_id, lane in _chat_lanes.items()},
+    }
+
+
+def _claude_backend() -> str:
+    return "sdk" if settings.anthropic_api_key else "cli"
+
+
+def _defer_update(handler, event, data: dict) -> bool:
+    if data.get("claude_replay"):
+        # Popped for replay and refused again: back to the head, so the updates behind it still follow it.
+        _deferred_updates.appendleft((handler, event, data))
+        return True
+    if len(_deferred_updates) >= settings.claude_queue_size:
+        return False
+    _deferred_updates.append((handler, event, {**data, "claude_replay": True}))
+    return True
+
+
+async def replay_deferred_once() -> None:
+    """Replay deferred updates in order while Claude accepts calls; stop at the first one deferred again."""
+    breaker = get_breaker(_claude_backend())
+    while _deferred_updates:
+        try:
+            breaker.check()
+        except ClaudeUnavailable:
+            return
+        handler, event, data = _deferred_updates.popleft()
+        logger.info("Replaying update deferred during Claude outage")
+        queued = len(_deferred_updates)
+        await error_boundary_middleware(handler, event, data)
+        if len(_deferred_updates) > queued:
+            return
+
+
+async def replay_deferred_updates() -> None:
+    while True:
+        await asyncio.sleep(settings.claude_breaker_reset_seconds)
+        await replay_deferred_once()
+
+
+async def sweep_pending_state(bot: Bot) -> None:
+    stores = (pending._store, pending._group_store, receipts._product_store)
+    for store in stores:
+        await store.load()
+    while True:
+        await asyncio.sleep(settings.pending_sweep_interval)
+        for store in stores:
+            try:
+                expired = await store.sweep(bot)
+            except Exception:
+                logger.exception("Pending %s sweep failed", store.namespace)
+                continue
+            if expired:
+                logger.info("Expired %d pending %s entries", expired, store.namespace)
+
+
+async def verify_stats_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.stats_verify_hours * 3600)
+        try:
+            repaired = await verify_stats()
+        except Exception:
+            logger.exception("Statistics verification failed")
+            continue
+        logger.info("Statistics verified, %d chats repaired", len(repaired))
+
+
+async def send_digests_periodically(bot: Bot) -> None:
+    while True:
+        await asyncio.sleep(settings.digest_check_interval)
+        if datetime.now().hour < settings.digest_hour:
+            continue
+        for kind in DIGEST_KINDS:
+            try:
+                await digest.send_digests(bot, kind)
+            except Exception:
+                logger.exception("Sending %s digests failed", kind)
+
+
 async def error_boundary_middleware(handler, event, data: dict):
     try:
         return await handler(event, data)
@@ -61,6 +198,23 @@ async def error_boundary_middleware(handler, event, data: dict):
         from kazo.claude.client import RateLimitExceeded
 
         chat_id = event.chat.id if hasattr(event, "chat") and event.chat else None
+        if isinstance(exc, ClaudeUnavailable):
+            logger.warning("Claude unavailable: %s", exc, extra={"chat_id": chat_id})
+            queued = _defer_update(handler, event, data)
+            if data.get("claude_replay"):
+                return
+            if queued:
+                msg = "Claude is unavailable right now, message queued. I'll process it once it's back."
+            else:
+                msg = "Claude is unavailable right now. Please try again in a few minutes."
+            try:
+                if isinstance(event, Message):
+                    await event.answer(msg)
+                elif isinstance(event, CallbackQuery):
+                    await event.answer(msg, show_alert=True)
+            except Exception:
+                pass
+            return
         if isinstance(exc, RateLimitExceeded):
             logger.warning("Rate limit hit: %s", exc, extra={"chat_id": chat_id})
             msg = f"Rate limit reached ({settings.rate_limit_per_hour}/hour). Please wait a bit."
@@ -82,9 +236,8 @@ async def error_boundary_middleware(handler, event, data: dict):
             logger.error("Failed to send error message", exc_info=True, extra={"chat_id": chat_id})
 
 
-async def _health_check(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-    await reader.read(4096)
-    checks: dict[str, str] = {}
+async def _health_report() -> tuple[bool, dict]:
+    checks: dict[str, Any] = {}
     try:
         db = await get_db()
         await db.execute("SELECT 1")
@@ -93,8 +246,19 @@ async def _health_check(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
         checks["db"] = f"error: {e}"
     checks["claude_cli"] = "ok" if shutil.which("claude") else "not found"
     checks["sdk"] = "configured" if settings.anthropic_api_key else "not configured"
+    checks["claude_circuit"] = get_breaker(_claude_backend()).state
+    checks["chat_queues"] = chat_queue_stats()
+    checks["receipt_jobs"] = receipts.receipt_jobs.stats()
+    checks["chart_renderer"] = chart_renderer.stats()
+    checks["chart_cache"] = chart_cache.stats()
     healthy = checks["db"] == "ok"
-    body = json.dumps({"status": "healthy" if healthy else "unhealthy", "checks": checks})
+    return healthy, {"status": "healthy" if healthy else "unhealthy", "checks": checks}
+
+
+async def _health_check(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    await reader.read(4096)
+    healthy, report = await _health_report()
+    body = json.dumps(report)
     status = "200 OK" if healthy else "503 Service Unavailable"
     body_bytes = body.encode()
     response = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body_bytes)}\r\n\r\n{body}"
@@ -104,16 +268,15 @@ async def _health_check(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
     await writer.wait_closed()
 
 
-async def main():
-    await init_db()
-
-    bot = Bot(token=settings.telegram_bot_token)
+def build_dispatcher() -> Dispatcher:
     dp = Dispatcher()
 
     dp.message.outer_middleware(error_boundary_middleware)
     dp.callback_query.outer_middleware(error_boundary_middleware)
     dp.message.middleware(auth_middleware)
     dp.callback_query.middleware(auth_middleware)
+    dp.message.middleware(chat_order_middleware)
+    dp.callback_query.middleware(chat_order_middleware)
 
     dp.include_router(pending.router)
     dp.include_router(receipts.router)
@@ -123,18 +286,111 @@ async def main():
     dp.include_router(currencies.router)
     dp.include_router(items.router)
     dp.include_router(budget.router)
+    dp.include_router(digest.router)
     dp.include_router(export.router)
     dp.include_router(common.router)
+    return dp
+
 
+async def _run_polling(dp: Dispatcher, bot: Bot) -> None:
     health_server = await asyncio.start_server(_health_check, "0.0.0.0", settings.health_check_port)
     logger.info("Health check listening on :%d", settings.health_check_port)
-
-    logger.info("Starting Kazo bot")
     try:
         await dp.start_polling(bot)
     finally:
-        logger.info("Shutting down gracefully...")
         health_server.close()
         await health_server.wait_closed()
+
+
+async def _run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Serve the webhook and health check together on the health-check port until SIGTERM or SIGINT.
+
+    On a stop signal, updates already acknowledged to Telegram are drained from the pool before the server
+    closes; updates arriving meanwhile get a 503, so Telegram redelivers them to the next instance.
+    """
+    assert settings.webhook_url is not None
+    pool = UpdatePool(dp, bot, settings.webhook_workers, settings.webhook_queue_size, settings.chat_queue_size)
+    app = build_webhook_app(pool, settings.webhook_path, settings.webhook_secret, health=_health_report)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", settings.health_check_port).start()
+    await bot.set_webhook(
+        settings.webhook_url.rstrip("/") + settings.webhook_path,
+        secret_token=settings.webhook_secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info("Webhook listening on :%d%s", settings.health_check_port, settings.webhook_path)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        logger.info("Stop signal received, draining %d queued webhook updates", pool.stats()["queued"])
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await pool.stop()
+        await runner.cleanup()
+
+
+async def notify_interrupted_jobs(bot: Bot) -> None:
+    """Fail receipt jobs a previous process left in flight and tell their chats."""
+    for job in await fail_interrupted_jobs():
+        if not job["status_message_id"]:
+            continue
+        try:
+            await bot.edit_message_text(
+                "Interrupted by a restart — please send this receipt again.",
+                chat_id=job["chat_id"],
+                message_id=job["status_message_id"],
+            )
+        except Exception:
+            logger.debug("Could not edit status of interrupted job %s", job["id"], exc_info=True)
+
+
+async def warm_up_subsystems() -> None:
+    """Load charting and the Claude SDK in the background so startup doesn't wait on them."""
+    start = time.perf_counter()
+    try:
+        await chart_renderer.start()
+        await asyncio.to_thread(warm_up_charts)
+        await asyncio.to_thread(warm_up_claude)
+    except Exception:
+        logger.warning("Warm-up failed; subsystems will load on first use", exc_info=True)
+        return
+    logger.info("Warm-up done", extra={"latency_ms": round((time.perf_counter() - start) * 1000)})
+
+
+async def main():
+    await init_db()
+    await ensure_stats()
+
+    bot = Bot(token=settings.telegram_bot_token)
+    dp = build_dispatcher()
+    await notify_interrupted_jobs(bot)
+
+    replay_task = asyncio.create_task(replay_deferred_updates())
+    sweep_task = asyncio.create_task(sweep_pending_state(bot))
+    warm_up_task = asyncio.create_task(warm_up_subsystems())
+    verify_task = asyncio.create_task(verify_stats_periodically())
+    digest_task = asyncio.create_task(send_digests_periodically(bot))
+
+    logger.info("Starting Kazo bot (%s)", "webhook" if settings.webhook_url else "polling")
+    try:
+        if settings.webhook_url:
+            await _run_webhook(dp, bot)
+        else:
+            await _run_polling(dp, bot)
+    finally:
+        logger.info("Shutting down gracefully...")
+        replay_task.cancel()
+        sweep_task.cancel()
+        warm_up_task.cancel()
+        verify_task.cancel()
+        digest_task.cancel()
+        await receipts.receipt_jobs.stop()
+        await chart_renderer.stop()
+        await close_state_backend()
         await close_db()
         logger.info("Shutdown complete")
@@ -0,0 +1,40 @@
+import io
+import mimetypes
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from aiogram import Bot
+
+
+@dataclass(slots=True, frozen=True)
+class Media:
+    """A file held in memory: the downloaded bytes (a view of the download buffer, not a copy) and its media type."""
+
+    data: bytes | memoryview
+    media_type: str
+
+    @classmethod
+    def from_path(cls, path: str | Path) -> "Media":
+        mime, _ = mimetypes.guess_type(str(path))
+        return cls(Path(path).read_bytes(), mime or "image/jpeg")
+
+    @contextmanager
+    def as_file(self) -> Iterator[str]:
+        """Materialize to a temporary file for consumers that can only take a path; removed on exit."""
+        suffix = mimetypes.guess_extension(self.media_type) or ".bin"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(self.data)
+        try:
+            yield tmp.name
+        finally:
+            Path(tmp.name).unlink(missing_ok=True)
+
+
+async def download_media(bot: Bot, file_id: str, media_type: str) -> Media:
+    file = await bot.get_file(file_id)
+    buf = io.BytesIO()
+    await bot.download_file(file.file_path, buf)
+    return Media(buf.getbuffer(), media_type)
@@ -0,0 +1,21 @@
+import io
+
+
+def page_count(data: bytes | memoryview) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+
+def split_pages(data: bytes | memoryview) -> list[bytes]:
+    """Split a PDF into single-page PDFs, in document order."""
+    from pypdf import PdfReader, PdfWriter
+
+    pages: list[bytes] = []
+    for page in PdfReader(io.BytesIO(data)).pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buf = io.BytesIO()
+        writer.write(buf)
+        pages.append(buf.getvalue())
+    return pages
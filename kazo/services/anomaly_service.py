@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any
+
+from kazo.db.database import get_db
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Modified z-score cut-off (Iglewicz and Hoaglin): values beyond it are reported as outliers.
+Z_THRESHOLD = 3.5
+# Trailing days of history a day's spending is compared against.
+ROLLING_WINDOW = 28
+# Expenses of a category are only judged once it has this many to compare with.
+MIN_CATEGORY_HISTORY = 8
+# Smallest spread (in log amount, about 10%) so categories of near-identical amounts don't flag every cent.
+MIN_LOG_SPREAD = 0.1
+# Multiplying by 0.6745 / MAD makes the median absolute deviation comparable to a standard deviation.
+MAD_SCALE = 0.6745
+# The mean absolute deviation of a normal distribution is its standard deviation / 1.2533.
+MEAN_AD_SCALE = 1.2533
+
+
+@dataclass(slots=True)
+class SpendingSeries:
+    """A chat's full expense history as parallel arrays, one entry per expense, ordered by date."""
+
+    ids: np.ndarray
+    days: np.ndarray  # datetime64[D]
+    amounts: np.ndarray
+    category_codes: np.ndarray  # index into categories
+    categories: list[str | None]
+    stores: list[str | None]
+
+
+async def load_series(chat_id: int) -> SpendingSeries | None:
+    """Read every expense of the chat in one query; None when there are none."""
+    import numpy as np
+
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT id, expense_date, amount_base, category, store FROM expenses
+        WHERE chat_id = ? ORDER BY expense_date, id""",
+        (chat_id,),
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        return None
+    ids, dates, amounts, category_names, stores = zip(*rows, strict=True)
+    categories = list(dict.fromkeys(category_names))
+    codes = {name: i for i, name in enumerate(categories)}
+    return SpendingSeries(
+        ids=np.array(ids, dtype=np.int64),
+        days=np.array([str(d)[:10] for d in dates], dtype="datetime64[D]"),
+        amounts=np.array(amounts, dtype=np.float64),
+        category_codes=np.array([codes[name] for name in category_names], dtype=np.intp),
+        categories=categories,
+        stores=list(stores),
+    )
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Median of values per group label (every label in range(n_groups) present), from one sort."""
+    import numpy as np
+
+    ordered = values[np.lexsort((values, groups))]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+
+def rolling_median(values: np.ndarray, window: int) -> np.ndarray:
+    """Median of the window days before each day (the day itself excluded), seeded with the first window."""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    seed = np.full(window, np.median(values[:window]))
+    padded = np.concatenate([seed, values])
+    return np.median(sliding_window_view(padded, window)[:-1], axis=1)
+
+
+def robust_z(values: np.ndarray) -> np.ndarray:
+    """Modified z-scores around the median; uses the mean absolute deviation when over half the values are equal."""
+    import numpy as np
+
+    deviation = values - np.median(values)
+    mad = np.median(np.abs(deviation))
+    if mad > 0:
+        return MAD_SCALE * deviation / mad
+    mean_ad = np.mean(np.abs(deviation))
+    if mean_ad == 0:
+        return np.zeros_like(values)
+    return deviation / (MEAN_AD_SCALE * mean_ad)
+
+
+def daily_totals(series: SpendingSeries) -> tuple[np.ndarray, np.ndarray]:
+    """Spending per calendar day from the first expense to the last, zero-filled; returns (days, totals)."""
+    import numpy as np
+
+    offsets = (series.days - series.days[0]).astype(np.int64)
+    totals = np.bincount(offsets, weights=series.amounts, minlength=int(offsets[-1]) + 1)
+    return series.days[0] + np.arange(len(totals)), totals
+
+
+def seasonal_baseline(days: np.ndarray, totals: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+    """Expected spending per day: the trailing rolling median of weekday-adjusted totals, times the weekday index.
+
+    The weekday index is each weekday's mean over the overall daily mean, so weekend shopping is not an anomaly.
+    """
+    import numpy as np
+
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday is 0
+    per_weekday = np.bincount(weekday, weights=totals, minlength=7) / np.maximum(np.bincount(weekday, minlength=7), 1)
+    mean = totals.mean()
+    index = np.clip(per_weekday / mean, 0.1, None) if mean > 0 else np.ones(7)
+    return rolling_median(totals / index[weekday], window) * index[weekday]
+
+
+def detect_anomalies(series: SpendingSeries, since: date, threshold: float = Z_THRESHOLD) -> dict[str, Any]:
+    """Outlier days and expenses on or after since, judged against the chat's whole history.
+
+    Days are scored on their spending over the seasonal baseline, expenses on their log amount against the
+    median of their category. Both lists are sorted most unusual first.
+    """
+    import numpy as np
+
+    start = np.datetime64(since, "D")
+
+    days, totals = daily_totals(series)
+    baseline = seasonal_baseline(days, totals)
+    day_z = robust_z(totals - baseline)
+    flagged = np.flatnonzero((day_z > threshold) & (days >= start) & (totals > baseline))
+    flagged = flagged[np.argsort(-day_z[flagged])]
+    outlier_days = [
+        {
+            "date": days[i].item().isoformat(),
+            "total": float(totals[i]),
+            "baseline": float(baseline[i]),
+            "z": float(day_z[i]),
+        }
+        for i in flagged
+    ]
+
+    n_categories = len(series.categories)
+    log_amounts = np.log1p(np.maximum(series.amounts, 0))
+    codes = series.category_codes
+    center = _group_median(log_amounts, codes, n_categories)
+    spread = _group_median(np.abs(log_amounts - center[codes]), codes, n_categories)
+    spread = np.maximum(spread, MIN_LOG_SPREAD)
+    expense_z = MAD_SCALE * (log_amounts - center[codes]) / spread[codes]
+    enough = np.bincount(codes, minlength=n_categories)[codes] >= MIN_CATEGORY_HISTORY
+    flagged = np.flatnonzero(enough & (expense_z > threshold) & (series.days >= start))
+    flagged = flagged[np.argsort(-expense_z[flagged])]
+    outlier_expenses = [
+        {
+            "id": int(series.ids[i]),
+            "expense_date": series.days[i].item().isoformat(),
+            "store": series.stores[i],
+            "category": series.categories[codes[i]],
+            "amount_base": float(series.amounts[i]),
+            "typical": float(np.expm1(center[codes[i]])),
+            "z": float(expense_z[i]),
+        }
+        for i in flagged
+    ]
+    return {"days": outlier_days, "expenses": outlier_expenses}
+
+
+async def find_anomalies(chat_id: int, days: int = 90) -> dict[str, Any] | None:
+    """Unusual days and expenses of the last `days` days; None when the chat has no expenses."""
+    series = await load_series(chat_id)
+    if series is None:
+        return None
+    return detect_anomalies(series, date.today() - timedelta(days=days - 1))
@@ -1,7 +1,8 @@
 from datetime import date
 
+from kazo.config import settings
 from kazo.db.database import get_db
-from kazo.db.models import Budget
+from kazo.db.models import Budget, Expense
 
 
 async def set_budget(chat_id: int, amount_base: float, category: str | None = None) -> Budget:
@@ -14,6 +15,11 @@ async def set_budget(chat_id: int, amount_base: float, category: str | None = No
         "INSERT INTO budgets (chat_id, category, amount_base) VALUES (?, ?, ?)",
         (chat_id, category, amount_base),
     )
+    # A changed budget is evaluated afresh, so its thresholds can be announced again.
+    await db.execute(
+        "DELETE FROM budget_alerts WHERE chat_id = ? AND category = ?",
+        (chat_id, category or ""),
+    )
     await db.commit()
     return Budget(id=None, chat_id=chat_id, category=category, amount_base=amount_base)
 
@@ -50,36 +56,94 @@ async def remove_budget(chat_id: int, category: str | None = None) -> bool:
     return cursor.rowcount > 0
 
 
+def _budget_row(category: str | None, budget: float, spent: float) -> dict:
+    return {
+        "category": category,
+        "budget": budget,
+        "spent": spent,
+        "remaining": budget - spent,
+        "pct": (spent / budget * 100) if budget > 0 else 0,
+    }
+
+
 async def budget_vs_actual(chat_id: int, start_date: date, end_date: date) -> list[dict]:
+    """Every budget of the chat with what was spent against it between the dates, from one scan of the range."""
+    db = await get_db()
+    cursor = await db.execute(
+        """WITH spent AS MATERIALIZED (
+            SELECT category, SUM(amount_base) AS total FROM expenses
+            WHERE chat_id = ? AND expense_date >= ? AND expense_date <= ?
+            GROUP BY category
+        )
+        SELECT b.category, b.amount_base AS budget,
+            COALESCE(CASE WHEN b.category IS NULL THEN (SELECT SUM(total) FROM spent)
+                ELSE (SELECT total FROM spent WHERE spent.category = b.category) END, 0) AS spent
+        FROM budgets b WHERE b.chat_id = ? ORDER BY b.category""",
+        (chat_id, start_date.isoformat(), end_date.isoformat(), chat_id),
+    )
+    return [_budget_row(row["category"], row["budget"], row["spent"]) for row in await cursor.fetchall()]
+
+
+# What budget row b has spent in month ? (bound twice), from the running month totals.
+_MONTH_SPENT = """COALESCE(CASE WHEN b.category IS NULL
+    THEN (SELECT total FROM chat_month_stats WHERE chat_id = b.chat_id AND month = ?)
+    ELSE (SELECT total FROM chat_month_category_stats
+          WHERE chat_id = b.chat_id AND month = ? AND category = b.category) END, 0)"""
+
+
+async def month_budget_status(chat_ids: list[int], month: str) -> dict[int, list[dict]]:
+    """Every budget of the given chats against their spending in month (YYYY-MM), in one query."""
     db = await get_db()
-    budgets = await get_all_budgets(chat_id)
-    if not budgets:
+    placeholders = ", ".join("?" * len(chat_ids))
+    cursor = await db.execute(
+        f"""SELECT b.chat_id, b.category, b.amount_base AS budget, {_MONTH_SPENT} AS spent
+        FROM budgets b WHERE b.chat_id IN ({placeholders})
+        ORDER BY b.chat_id, b.category""",
+        (month, month, *chat_ids),
+    )
+    status: dict[int, list[dict]] = {}
+    for row in await cursor.fetchall():
+        status.setdefault(row["chat_id"], []).append(_budget_row(row["category"], row["budget"], row["spent"]))
+    return status
+
+
+async def check_budget_alerts(chat_id: int, expenses: list[Expense]) -> list[dict]:
+    """Monthly budgets that just crossed an alert threshold, checked after these expenses were saved.
+
+    Spending is read from the running month totals, so the check costs a few key lookups however long the
+    history is. Each threshold is reported once per budget and month; only the highest newly crossed one is
+    returned, as a budget_vs_actual row with its "threshold".
+    """
+    thresholds = sorted(settings.budget_alert_thresholds)
+    month = date.today().strftime("%Y-%m")
+    current = [e for e in expenses if str(e.expense_date).startswith(month)]
+    if not thresholds or not current:
         return []
+    categories = sorted({e.category for e in current if e.category})
 
-    result = []
-    for b in budgets:
-        if b.category is None:
-            cursor = await db.execute(
-                """SELECT COALESCE(SUM(amount_base), 0) as spent
-                FROM expenses WHERE chat_id = ? AND expense_date >= ? AND expense_date <= ?""",
-                (chat_id, start_date.isoformat(), end_date.isoformat()),
-            )
-        else:
+    db = await get_db()
+    placeholders = ", ".join("?" * len(categories))
+    cursor = await db.execute(
+        f"""SELECT b.category, b.amount_base AS budget, {_MONTH_SPENT} AS spent
+        FROM budgets b WHERE b.chat_id = ? AND (b.category IS NULL OR b.category IN ({placeholders}))
+        ORDER BY b.category""",
+        (month, month, chat_id, *categories),
+    )
+    alerts = []
+    for row in await cursor.fetchall():
+        status = _budget_row(row["category"], row["budget"], row["spent"])
+        crossed = []
+        for threshold in thresholds:
+            if status["pct"] < threshold:
+                break
             cursor = await db.execute(
-                """SELECT COALESCE(SUM(amount_base), 0) as spent
-                FROM expenses WHERE chat_id = ? AND category = ?
-                AND expense_date >= ? AND expense_date <= ?""",
-                (chat_id, b.category, start_date.isoformat(), end_date.isoformat()),
+                """INSERT INTO budget_alerts (chat_id, category, month, threshold) VALUES (?, ?, ?, ?)
+                ON CONFLICT DO NOTHING""",
+                (chat_id, row["category"] or "", month, threshold),
             )
-        row = await cursor.fetchone()
-        spent = row["spent"]
-        result.append(
-            {
-                "category": b.category,
-                "budget": b.amount_base,
-                "spent": spent,
-                "remaining": b.amount_base - spent,
-                "pct": (spent / b.amount_base * 100) if b.amount_base > 0 else 0,
-            }
-        )
-    return result
+            if cursor.rowcount:
+                crossed.append(threshold)
+        if crossed:
+            alerts.append({**status, "threshold": crossed[-1]})
+    await db.commit()
+    return alerts
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import re
+from collections.abc import Iterable
 from datetime import UTC, datetime, timedelta
 
 import httpx
@@ -56,8 +58,13 @@ class InvalidCurrencyError(ValueError):
         super().__init__(f"Unknown currency '{currency}'. Use /rate to see supported currencies.")
 
 
+def normalize_currency(currency: str) -> str:
+    """The code a currency is keyed by everywhere, e.g. in get_rates results: " usd" -> "USD"."""
+    return currency.strip().upper()
+
+
 def validate_currency(currency: str) -> str:
-    code = currency.upper().strip()
+    code = normalize_currency(currency)
     if not _CURRENCY_RE.match(code):
         raise InvalidCurrencyError(currency)
     if code not in SUPPORTED_CURRENCIES:
@@ -128,6 +135,13 @@ async def get_rate(from_currency: str, to_currency: str) -> float:
         raise
 
 
+async def get_rates(currencies: Iterable[str], to_currency: str) -> dict[str, float]:
+    """Rate to `to_currency` for each distinct currency, looked up concurrently."""
+    unique = sorted({validate_currency(c) for c in currencies})
+    rates = await asyncio.gather(*(get_rate(c, to_currency) for c in unique))
+    return dict(zip(unique, rates, strict=True))
+
+
 async def convert_to_base(amount: float, currency: str, chat_id: int) -> tuple[float, float]:
     base = await get_base_currency(chat_id)
     rate = await get_rate(currency, base)
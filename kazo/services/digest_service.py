@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from kazo.config import settings
+from kazo.currency import format_amount, get_base_currencies
+from kazo.db.database import get_db
+from kazo.services.budget_service import month_budget_status
+
+DIGEST_KINDS = ("weekly", "monthly")
+DIGEST_TOP_CATEGORIES = 6
+
+
+@dataclass(slots=True)
+class DigestPeriod:
+    """The last completed week (Monday to Sunday) or month, and the one before it for comparison."""
+
+    kind: str
+    key: str  # 2025-W07 or 2025-02; opted-in chats record the last key they were sent
+    label: str
+    start: date
+    end: date
+    previous_start: date
+
+
+@dataclass(slots=True)
+class Digest:
+    chat_id: int
+    base: str
+    categories: list[dict] = field(default_factory=list)  # {category, total, count}, largest first
+    previous_total: float = 0.0
+    budgets: list[dict] = field(default_factory=list)  # budget_vs_actual rows for the month the period ends in
+
+    @property
+    def total(self) -> float:
+        return sum(c["total"] for c in self.categories)
+
+    @property
+    def count(self) -> int:
+        return sum(c["count"] for c in self.categories)
+
+
+def digest_period(kind: str, today: date | None = None) -> DigestPeriod:
+    today = today or date.today()
+    if kind == "weekly":
+        end = today - timedelta(days=today.weekday() + 1)
+        start = end - timedelta(days=6)
+        year, week, _ = start.isocalendar()
+        label = f"{start.day} {start:%b} - {end.day} {end:%b %Y}"
+        return DigestPeriod(kind, f"{year}-W{week:02d}", label, start, end, start - timedelta(days=7))
+    end = today.replace(day=1) - timedelta(days=1)
+    start = end.replace(day=1)
+    previous_start = (start - timedelta(days=1)).replace(day=1)
+    return DigestPeriod(kind, start.strftime("%Y-%m"), start.strftime("%B %Y"), start, end, previous_start)
+
+
+async def get_digest_kinds(chat_id: int) -> list[str]:
+    db = await get_db()
+    cursor = await db.execute("SELECT kind FROM digest_subscriptions WHERE chat_id = ? ORDER BY kind DESC", (chat_id,))
+    return [row["kind"] for row in await cursor.fetchall()]
+
+
+async def set_digest(chat_id: int, kind: str, enabled: bool) -> None:
+    """Opt a chat in to or out of a digest. A new subscriber's first digest covers the next period to end."""
+    db = await get_db()
+    if enabled:
+        await db.execute(
+            """INSERT INTO digest_subscriptions (chat_id, kind, last_period) VALUES (?, ?, ?)
+            ON CONFLICT DO NOTHING""",
+            (chat_id, kind, digest_period(kind).key),
+        )
+    else:
+        await db.execute("DELETE FROM digest_subscriptions WHERE chat_id = ? AND kind = ?", (chat_id, kind))
+    await db.commit()
+
+
+async def due_chats(period: DigestPeriod) -> list[int]:
+    """Opted-in chats that have not been sent this period's digest yet."""
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT chat_id FROM digest_subscriptions
+        WHERE kind = ? AND (last_period IS NULL OR last_period < ?) ORDER BY chat_id""",
+        (period.kind, period.key),
+    )
+    return [row["chat_id"] for row in await cursor.fetchall()]
+
+
+async def claim_digest(chat_id: int, period: DigestPeriod) -> bool:
+    """Mark the chat's digest for this period as sent; False if it already was (another replica got there first)."""
+    db = await get_db()
+    cursor = await db.execute(
+        """UPDATE digest_subscriptions SET last_period = ?
+        WHERE chat_id = ? AND kind = ? AND (last_period IS NULL OR last_period < ?)""",
+        (period.key, chat_id, period.kind, period.key),
+    )
+    await db.commit()
+    return cursor.rowcount > 0
+
+
+async def release_digest(chat_id: int, period: DigestPeriod) -> bool:
+    """Undo a claim whose digest could not be delivered, so the next run retries it.
+
+    After digest_max_attempts failures in one period the claim is kept and False returned: the chat gets its next
+    digest next period instead of a failing send every check until then.
+    """
+    db = await get_db()
+    await db.execute("DELETE FROM digest_failures WHERE kind = ? AND period < ?", (period.kind, period.key))
+    cursor = await db.execute(
+        """INSERT INTO digest_failures (chat_id, kind, period, failures) VALUES (?, ?, ?, 1)
+        ON CONFLICT (chat_id, kind, period) DO UPDATE SET failures = failures + 1
+        RETURNING failures""",
+        (chat_id, period.kind, period.key),
+    )
+    row = await cursor.fetchone()
+    released = row["failures"] < settings.digest_max_attempts
+    if released:
+        await db.execute(
+            "UPDATE digest_subscriptions SET last_period = NULL WHERE chat_id = ? AND kind = ? AND last_period = ?",
+            (chat_id, period.kind, period.key),
+        )
+    await db.commit()
+    return released
+
+
+async def build_digests(chat_ids: list[int], period: DigestPeriod) -> dict[int, Digest]:
+    """Digests for many chats at once: one grouped query for the spending, one for budgets, one for currencies."""
+    db = await get_db()
+    placeholders = ", ".join("?" * len(chat_ids))
+    cursor = await db.execute(
+        f"""SELECT chat_id, category, expense_date >= ? AS current,
+            SUM(amount_base) AS total, COUNT(*) AS count
+        FROM expenses
+        WHERE chat_id IN ({placeholders}) AND expense_date >= ? AND expense_date <= ?
+        GROUP BY chat_id, current, category
+        ORDER BY chat_id, total DESC""",
+        (period.start.isoformat(), *chat_ids, period.previous_start.isoformat(), period.end.isoformat()),
+    )
+    rows = await cursor.fetchall()
+    budgets = await month_budget_status(chat_ids, period.end.strftime("%Y-%m"))
+    currencies = await get_base_currencies(chat_ids)
+
+    digests = {chat_id: Digest(chat_id, currencies[chat_id], budgets=budgets.get(chat_id, [])) for chat_id in chat_ids}
+    for row in rows:
+        digest = digests[row["chat_id"]]
+        if row["current"]:
+            digest.categories.append({"category": row["category"], "total": row["total"], "count": row["count"]})
+        else:
+            digest.previous_total += row["total"]
+    return digests
+
+
+def digest_text(digest: Digest, period: DigestPeriod) -> str:
+    base = digest.base
+    title = "Weekly" if period.kind == "weekly" else "Monthly"
+    lines = [f"📬 {title} digest — {period.label}", ""]
+
+    total = f"Total: {format_amount(digest.total, base)} ({digest.count} expenses)"
+    if digest.previous_total:
+        change = (digest.total - digest.previous_total) / digest.previous_total * 100
+        arrow = "↑" if change > 0 else "↓"
+        total += f", {arrow} {abs(change):.0f}% vs the {'week' if period.kind == 'weekly' else 'month'} before"
+    lines.append(total)
+    for c in digest.categories[:DIGEST_TOP_CATEGORIES]:
+        lines.append(f"  • {c['category'] or 'uncategorized'}: {format_amount(c['total'], base)} ({c['count']})")
+    if len(digest.categories) > DIGEST_TOP_CATEGORIES:
+        lines.append(f"  … and {len(digest.categories) - DIGEST_TOP_CATEGORIES} more")
+
+    if digest.budgets:
+        lines.append(f"\n💰 Budget — {period.end:%B}:")
+        for b in digest.budgets:
+            filled = min(int(b["pct"] / 100 * 10), 10)
+            bar = "█" * filled + "░" * (10 - filled)
+            lines.append(
+                f"  {b['category'] or 'Total'}: {bar} {b['pct']:.0f}% ({format_amount(b['remaining'], base)} left)"
+            )
+    return "\n".join(lines)
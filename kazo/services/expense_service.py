@@ -2,11 +2,11 @@ import json
 from datetime import date, timedelta
 
 from kazo.db.database import get_db
-from kazo.db.models import Expense
+from kazo.db.models import Expense, ReceiptFingerprint
+from kazo.services.fingerprint_service import insert_fingerprint
 
 
-async def save_expense(expense: Expense) -> int:
-    db = await get_db()
+async def _insert_expense(db, expense: Expense) -> int:
     cursor = await db.execute(
         """INSERT INTO expenses
         (chat_id, user_id, store, amount, original_currency, amount_base,
@@ -27,7 +27,6 @@ async def save_expense(expense: Expense) -> int:
             expense.note,
         ),
     )
-    await db.commit()
     assert cursor.lastrowid is not None
     expense_id = cursor.lastrowid
     if expense.items_json:
@@ -35,6 +34,32 @@ async def save_expense(expense: Expense) -> int:
     return expense_id
 
 
+async def save_expense(expense: Expense, fingerprint: ReceiptFingerprint | None = None) -> int:
+    db = await get_db()
+    expense_id = await _insert_expense(db, expense)
+    if fingerprint is not None:
+        await insert_fingerprint(db, expense_id, expense.chat_id, fingerprint)
+    await db.commit()
+    return expense_id
+
+
+async def save_expenses(
+    expenses: list[Expense], fingerprints: list[ReceiptFingerprint | None] | None = None
+) -> list[int]:
+    """Save several expenses in one transaction: either all of them are stored or none."""
+    db = await get_db()
+    try:
+        ids = [await _insert_expense(db, expense) for expense in expenses]
+        for expense, expense_id, fp in zip(expenses, ids, fingerprints or [], strict=False):
+            if fp is not None:
+                await insert_fingerprint(db, expense_id, expense.chat_id, fp)
+    except Exception:
+        await db.rollback()
+        raise
+    await db.commit()
+    return ids
+
+
 async def get_expenses(
     chat_id: int,
     start_date: date | None = None,
@@ -95,6 +120,30 @@ async def link_bot_message(chat_id: int, bot_message_id: int, expense_id: int):
     await db.commit()
 
 
+async def link_group_message(chat_id: int, bot_message_id: int, expense_ids: dict[int, int]) -> None:
+    """Record the expenses saved from a group confirmation, keyed by their 1-based number in it."""
+    db = await get_db()
+    await db.executemany(
+        """INSERT OR REPLACE INTO bot_message_group_expenses (chat_id, bot_message_id, position, expense_id)
+        VALUES (?, ?, ?, ?)""",
+        [(chat_id, bot_message_id, position, expense_id) for position, expense_id in expense_ids.items()],
+    )
+    await db.commit()
+
+
+async def get_group_expenses_by_bot_message(chat_id: int, bot_message_id: int) -> dict[int, dict]:
+    """Expenses saved from a group confirmation, by their number in it."""
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT g.position, e.* FROM expenses e
+           JOIN bot_message_group_expenses g ON e.id = g.expense_id
+           WHERE g.chat_id = ? AND g.bot_message_id = ?
+           ORDER BY g.position""",
+        (chat_id, bot_message_id),
+    )
+    return {row["position"]: dict(row) for row in await cursor.fetchall()}
+
+
 async def get_expense_by_bot_message(chat_id: int, bot_message_id: int) -> dict | None:
     db = await get_db()
     cursor = await db.execute(
@@ -158,7 +207,6 @@ async def _save_items_from_json(db, expense_id: int, items_json: str, currency:
             "INSERT INTO expense_items (expense_id, name, price, currency, quantity) VALUES (?, ?, ?, ?, ?)",
             (expense_id, str(name), price, item_currency, quantity),
         )
-    await db.commit()
 
 
 async def save_expense_items(expense_id: int, items: list[dict], currency: str):
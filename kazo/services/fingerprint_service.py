@@ -0,0 +1,115 @@
+import hashlib
+import io
+import logging
+
+from kazo.config import settings
+from kazo.db.database import get_db
+from kazo.db.models import ReceiptFingerprint
+from kazo.media import Media
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8  # 8x8 difference hash -> 64 bits
+BANDS = 8  # 8-bit bands: hashes within distance BANDS - 1 always share one band
+BAND_BITS = 64 // BANDS
+MAX_DISTANCE = BANDS - 1
+
+
+def perceptual_hash(data: bytes | memoryview) -> int | None:
+    """64-bit difference hash of an image (brightness gradients of a 9x8 grayscale thumbnail); None if unreadable."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            thumb = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, OSError, ValueError):
+        logger.debug("Could not decode image for perceptual hash", exc_info=True)
+        return None
+    pixels = thumb.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def fingerprint(media: Media) -> ReceiptFingerprint:
+    """SHA-256 of the bytes, plus a perceptual hash for images (PDFs match on the exact hash only)."""
+    sha = hashlib.sha256(media.data).hexdigest()
+    if not media.media_type.startswith("image/"):
+        return ReceiptFingerprint(sha)
+    return ReceiptFingerprint(sha, perceptual_hash(media.data))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _bands(phash: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(phash >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+async def insert_fingerprint(db, expense_id: int, chat_id: int, fp: ReceiptFingerprint) -> None:
+    """Store a receipt's fingerprint alongside its expense; the caller commits."""
+    bands = _bands(fp.phash) if fp.phash is not None else [None] * BANDS
+    await db.execute(
+        """INSERT OR REPLACE INTO receipt_fingerprints
+        (expense_id, chat_id, sha256, phash, band0, band1, band2, band3, band4, band5, band6, band7)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (expense_id, chat_id, fp.sha256, _to_signed(fp.phash) if fp.phash is not None else None, *bands),
+    )
+
+
+async def find_duplicate(chat_id: int, fp: ReceiptFingerprint) -> dict | None:
+    """The saved expense whose receipt had exactly these bytes, if any."""
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT e.* FROM receipt_fingerprints f JOIN expenses e ON e.id = f.expense_id
+        WHERE f.chat_id = ? AND f.sha256 = ? ORDER BY e.id LIMIT 1""",
+        (chat_id, fp.sha256),
+    )
+    row = await cursor.fetchone()
+    return dict(row) if row else None
+
+
+async def find_similar(chat_id: int, fp: ReceiptFingerprint, max_distance: int | None = None) -> dict | None:
+    """The saved expense whose receipt image is closest to this one within max_distance bits, if any.
+
+    A receipt photo's hash mostly captures its layout, so different receipts from the same store can match:
+    callers should treat the result as a hint, not proof. Candidates are found through the band indexes
+    (pigeonhole: within MAX_DISTANCE bits at least one of the eight bands is identical), so only a handful
+    are compared, however many receipts are stored.
+    """
+    if fp.phash is None:
+        return None
+    limit = min(settings.duplicate_max_distance if max_distance is None else max_distance, MAX_DISTANCE)
+    if limit < 0:
+        return None
+    db = await get_db()
+    bands = _bands(fp.phash)
+    union = " UNION ".join(
+        f"SELECT expense_id, phash FROM receipt_fingerprints WHERE chat_id = ? AND band{i} = ?" for i in range(BANDS)
+    )
+    params: list[int] = []
+    for band in bands:
+        params += [chat_id, band]
+    cursor = await db.execute(union, params)
+    candidates = [(hamming(fp.phash, _to_unsigned(r["phash"])), r["expense_id"]) for r in await cursor.fetchall()]
+    matches = sorted(c for c in candidates if c[0] <= limit)
+    if not matches:
+        return None
+    cursor = await db.execute("SELECT * FROM expenses WHERE id = ?", (matches[0][1],))
+    row = await cursor.fetchone()
+    return dict(row) if row else None
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import calendar
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any
+
+from kazo.db.database import get_db
+from kazo.services.budget_service import get_all_budgets
+from kazo.services.stats_service import data_version
+from kazo.services.subscription_service import get_subscriptions
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Days of history the daily trend of each category is fitted to.
+FIT_DAYS = 90
+# Age in days at which a day's weight in the fit halves, so recent weeks count most.
+FIT_HALF_LIFE = 30
+# Below this much history only the recent level is used; a slope fitted to a few days extrapolates wildly.
+MIN_TREND_DAYS = 28
+# Chats whose fitted models are kept in memory, least recently used evicted first.
+MAX_CACHED_MODELS = 256
+
+
+@dataclass(slots=True)
+class ForecastModel:
+    """Per-category daily spending trends of one chat, fitted at a data version on a given day.
+
+    Day t after fitted_on is expected to cost level + slope * t (never below zero) in each category. Expenses
+    matching an active subscription are left out of the fit; those charges are added from their schedule.
+    """
+
+    version: int
+    fitted_on: date
+    categories: list[str | None]
+    level: np.ndarray
+    slope: np.ndarray
+
+    def project(self, days: int) -> np.ndarray:
+        """Expected spending per category over the next `days` days."""
+        import numpy as np
+
+        t = np.arange(1, days + 1)
+        return np.maximum(self.level[:, None] + self.slope[:, None] * t, 0).sum(axis=1)
+
+
+_models: OrderedDict[int, ForecastModel] = OrderedDict()
+
+
+def fit_trends(day_offsets: np.ndarray, codes: np.ndarray, totals: np.ndarray, n_days: int, n_categories: int):
+    """Weighted least-squares line through each category's daily totals at once; returns (level, slope).
+
+    day_offsets count back from the last day (0), so level is the fitted rate on that day.
+    """
+    import numpy as np
+
+    daily = np.zeros((n_categories, n_days))
+    np.add.at(daily, (codes, n_days - 1 - day_offsets), totals)
+    weights = 0.5 ** (np.arange(n_days)[::-1] / FIT_HALF_LIFE)
+    if n_days < MIN_TREND_DAYS:
+        level = daily @ weights / weights.sum()
+        return level, np.zeros(n_categories)
+    x = np.arange(n_days) - (n_days - 1)
+    # polyfit weights multiply the residuals, so the square root gives weighted least squares.
+    slope, level = np.polyfit(x, daily.T, 1, w=np.sqrt(weights))
+    return np.atleast_1d(level), np.atleast_1d(slope)
+
+
+async def _fit_model(chat_id: int, version: int, today: date) -> ForecastModel:
+    import numpy as np
+
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT expense_date, category, SUM(amount_base) AS total FROM expenses e
+        WHERE chat_id = ? AND expense_date > ? AND expense_date <= ?
+        AND NOT EXISTS (
+            SELECT 1 FROM subscriptions s
+            WHERE s.chat_id = e.chat_id AND s.active = 1 AND LOWER(s.name) = LOWER(e.store)
+        )
+        GROUP BY expense_date, category""",
+        (chat_id, (today - timedelta(days=FIT_DAYS)).isoformat(), today.isoformat()),
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        return ForecastModel(version, today, [], np.zeros(0), np.zeros(0))
+
+    dates, category_names, totals = zip(*rows, strict=True)
+    categories = list(dict.fromkeys(category_names))
+    codes = {name: i for i, name in enumerate(categories)}
+    offsets = (np.datetime64(today, "D") - np.array([str(d)[:10] for d in dates], dtype="datetime64[D]")).astype(
+        np.int64
+    )
+    # Fit only the span since the first expense, so a new chat's empty past doesn't drag its rate down.
+    n_days = int(offsets.max()) + 1
+    level, slope = fit_trends(
+        offsets,
+        np.array([codes[name] for name in category_names], dtype=np.intp),
+        np.array(totals, dtype=np.float64),
+        n_days,
+        len(categories),
+    )
+    return ForecastModel(version, today, categories, level, slope)
+
+
+async def get_model(chat_id: int, today: date | None = None) -> ForecastModel:
+    """The chat's fitted model, reused until its data version or the day changes."""
+    today = today or date.today()
+    version = await data_version(chat_id)
+    model = _models.get(chat_id)
+    if model is not None and model.version == version and model.fitted_on == today:
+        _models.move_to_end(chat_id)
+        return model
+    model = await _fit_model(chat_id, version, today)
+    _models[chat_id] = model
+    _models.move_to_end(chat_id)
+    while len(_models) > MAX_CACHED_MODELS:
+        _models.popitem(last=False)
+    return model
+
+
+def _add_months(d: date, months: int) -> date:
+    month = d.month - 1 + months
+    year = d.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def subscription_charges(sub: dict, start: date, end: date) -> float:
+    """What a subscription is expected to charge after start, up to and including end.
+
+    Monthly and yearly subscriptions charge on their billing day, or else the day of the month they were added
+    (yearly ones in the month they were added); daily and weekly ones are prorated over the days.
+    """
+    days = (end - start).days
+    if days <= 0:
+        return 0.0
+    amount = sub["amount_base"]
+    if sub["frequency"] == "daily":
+        return amount * days
+    if sub["frequency"] == "weekly":
+        return amount * days / 7
+
+    added = date.fromisoformat(str(sub.get("created_at") or start)[:10])
+    day = sub.get("billing_day") or added.day
+    charges = 0
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        charge = month.replace(day=min(day, calendar.monthrange(month.year, month.month)[1]))
+        if start < charge <= end and (sub["frequency"] == "monthly" or month.month == added.month):
+            charges += 1
+        month = _add_months(month, 1)
+    return amount * charges
+
+
+def _quarter_bounds(today: date) -> tuple[date, date]:
+    first_month = (today.month - 1) // 3 * 3 + 1
+    start = date(today.year, first_month, 1)
+    end = _add_months(start, 3) - timedelta(days=1)
+    return start, end
+
+
+async def _spent_by_month(chat_id: int, months: list[str]) -> dict[str, dict[str | None, float]]:
+    db = await get_db()
+    placeholders = ", ".join("?" * len(months))
+    cursor = await db.execute(
+        f"""SELECT month, NULLIF(category, '') AS category, total FROM chat_month_category_stats
+        WHERE chat_id = ? AND month IN ({placeholders})""",
+        (chat_id, *months),
+    )
+    spent: dict[str, dict[str | None, float]] = {month: {} for month in months}
+    for row in await cursor.fetchall():
+        spent[row["month"]][row["category"]] = row["total"]
+    return spent
+
+
+def _period(
+    label: str,
+    end: date,
+    today: date,
+    spent: dict[str | None, float],
+    trend: dict[str | None, float],
+    subscriptions: list[dict],
+    budgets: dict[str | None, float],
+    budget_months: int,
+) -> dict[str, Any]:
+    upcoming: dict[str | None, float] = {}
+    for sub in subscriptions:
+        upcoming[sub["category"]] = upcoming.get(sub["category"], 0.0) + subscription_charges(sub, today, end)
+
+    rows = []
+    for category in dict.fromkeys([*spent, *trend, *upcoming, *(c for c in budgets if c is not None)]):
+        projected = spent.get(category, 0.0) + trend.get(category, 0.0) + upcoming.get(category, 0.0)
+        rows.append(_forecast_row(category, spent.get(category, 0.0), projected, budgets.get(category), budget_months))
+    rows.sort(key=lambda r: -r["projected"])
+    total = _forecast_row(
+        None,
+        sum(r["spent"] for r in rows),
+        sum(r["projected"] for r in rows),
+        budgets.get(None),
+        budget_months,
+    )
+    return {"label": label, "end": end, "days_left": (end - today).days, "categories": rows, "total": total}
+
+
+def _forecast_row(
+    category: str | None, spent: float, projected: float, monthly_budget: float | None, months: int
+) -> dict[str, Any]:
+    budget = monthly_budget * months if monthly_budget is not None else None
+    return {
+        "category": category,
+        "spent": spent,
+        "projected": projected,
+        "budget": budget,
+        "pct": projected / budget * 100 if budget else None,
+    }
+
+
+async def forecast(chat_id: int, today: date | None = None) -> dict[str, Any]:
+    """Projected spending per category at the end of this month and this quarter, against the budgets.
+
+    Each projection is what was spent so far, plus the fitted daily trend over the days left, plus the
+    subscription charges due before the period ends. Monthly budgets are tripled for the quarter.
+    """
+    today = today or date.today()
+    model = await get_model(chat_id, today)
+    month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    quarter_start, quarter_end = _quarter_bounds(today)
+
+    quarter_months = [_add_months(quarter_start, i).strftime("%Y-%m") for i in range(3)]
+    spent = await _spent_by_month(chat_id, quarter_months)
+    month_spent = spent[today.strftime("%Y-%m")]
+    quarter_spent: dict[str | None, float] = {}
+    for by_category in spent.values():
+        for category, total in by_category.items():
+            quarter_spent[category] = quarter_spent.get(category, 0.0) + total
+
+    subscriptions = await get_subscriptions(chat_id)
+    budgets = {b.category: b.amount_base for b in await get_all_budgets(chat_id)}
+
+    periods = []
+    for label, end, period_spent, budget_months in (
+        (today.strftime("%B %Y"), month_end, month_spent, 1),
+        (f"Q{(today.month - 1) // 3 + 1} {today.year}", quarter_end, quarter_spent, 3),
+    ):
+        trend = dict(zip(model.categories, model.project((end - today).days).tolist(), strict=True))
+        periods.append(_period(label, end, today, period_spent, trend, subscriptions, budgets, budget_months))
+    return {"month": periods[0], "quarter": periods[1]}
@@ -0,0 +1,248 @@
+import csv
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from pathlib import Path
+from typing import TextIO
+
+import httpx
+
+from kazo.categories import get_categories
+from kazo.config import settings
+from kazo.currency import get_base_currency
+from kazo.db.database import get_db
+from kazo.services.currency_service import InvalidCurrencyError, get_rate, validate_currency
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ImportPreset:
+    """Which CSV columns hold what. Column names are matched case-insensitively."""
+
+    date: str
+    amount: str
+    description: str | None = None
+    currency: str | None = None
+    category: str | None = None
+    date_format: str = "%Y-%m-%d"
+    delimiter: str = ","
+    decimal: str = "."
+    # Bank exports list spending as negative amounts; positive rows (income, refunds) are skipped.
+    negative_expenses: bool = False
+    # Used when there is no currency column; defaults to the chat's base currency.
+    default_currency: str | None = None
+
+
+PRESETS: dict[str, ImportPreset] = {
+    "kazo": ImportPreset(date="Date", amount="Amount", description="Store", currency="Currency", category="Category"),
+    "generic": ImportPreset(
+        date="date", amount="amount", description="description", currency="currency", category="category"
+    ),
+    "revolut": ImportPreset(
+        date="Started Date",
+        amount="Amount",
+        description="Description",
+        currency="Currency",
+        date_format="%Y-%m-%d %H:%M:%S",
+        negative_expenses=True,
+    ),
+    "n26": ImportPreset(
+        date="Booking Date",
+        amount="Amount (EUR)",
+        description="Partner Name",
+        negative_expenses=True,
+        default_currency="EUR",
+    ),
+}
+
+DEFAULT_PRESET = "kazo"
+
+
+@dataclass(slots=True)
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    errors: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[ImportResult], Awaitable[None]]
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportInterruptedError(RuntimeError):
+    """The import stopped partway; the `result.imported` rows before the failure are already committed."""
+
+    def __init__(self, reason: str, result: ImportResult):
+        self.result = result
+        super().__init__(reason)
+
+
+def load_presets() -> dict[str, ImportPreset]:
+    """Built-in presets plus any defined in settings.import_presets_file (a JSON object of name -> columns)."""
+    presets = dict(PRESETS)
+    if not settings.import_presets_file:
+        return presets
+    try:
+        raw = json.loads(Path(settings.import_presets_file).read_text())
+        known = {f.name for f in fields(ImportPreset)}
+        for name, spec in raw.items():
+            presets[name.lower()] = ImportPreset(**{k: v for k, v in spec.items() if k in known})
+    except (OSError, ValueError, TypeError):
+        logger.warning("Could not load import presets from %s", settings.import_presets_file, exc_info=True)
+    return presets
+
+
+def parse_amount(raw: str, decimal: str = ".") -> float:
+    text = "".join(raw.split())
+    thousands = "." if decimal == "," else ","
+    return float(text.replace(thousands, "").replace(decimal, "."))
+
+
+def _column_index(header: list[str], name: str | None, required: bool = False) -> int | None:
+    if name is None:
+        return None
+    lowered = [h.strip().lower() for h in header]
+    try:
+        return lowered.index(name.lower())
+    except ValueError:
+        if required:
+            raise ImportFormatError(f"Column '{name}' not found in CSV header") from None
+        return None
+
+
+def iter_rows(stream: TextIO, preset: ImportPreset) -> Iterator[list[str]]:
+    """Yield non-blank rows as they are read, header first."""
+    for row in csv.reader(stream, delimiter=preset.delimiter):
+        if any(cell.strip() for cell in row):
+            yield row
+
+
+async def _insert_batch(batch: list[tuple]) -> None:
+    db = await get_db()
+    await db.executemany(
+        """INSERT INTO expenses
+        (chat_id, user_id, store, amount, original_currency, amount_base,
+         exchange_rate, category, items_json, source, expense_date, note)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, 'import', ?, NULL)""",
+        batch,
+    )
+    await db.commit()
+
+
+async def import_csv(
+    stream: TextIO,
+    chat_id: int,
+    user_id: int,
+    preset: ImportPreset,
+    progress: ProgressCallback | None = None,
+    batch_size: int | None = None,
+) -> ImportResult:
+    """Stream expenses from a CSV into the database, one transaction per batch.
+
+    Rows are parsed as they are read, so memory stays flat however long the file is. Each currency is
+    converted with a single rate looked up on first use and reused for the rest of the import.
+    """
+    batch_size = batch_size or settings.import_batch_size
+    result = ImportResult()
+    start = time.perf_counter()
+
+    rows = iter_rows(stream, preset)
+    header_row = next(rows, None)
+    if header_row is None:
+        raise ImportFormatError("The CSV file is empty")
+    date_col = _column_index(header_row, preset.date, required=True)
+    amount_col = _column_index(header_row, preset.amount, required=True)
+    desc_col = _column_index(header_row, preset.description)
+    currency_col = _column_index(header_row, preset.currency)
+    category_col = _column_index(header_row, preset.category)
+
+    base = await get_base_currency(chat_id)
+    default_currency = preset.default_currency or base
+    categories = set(await get_categories(chat_id))
+    rates: dict[str, float] = {}
+    batch: list[tuple] = []
+
+    def skip(reason: str) -> None:
+        result.skipped += 1
+        result.errors[reason] = result.errors.get(reason, 0) + 1
+
+    for row in rows:
+        result.rows += 1
+        try:
+            amount = parse_amount(row[amount_col], preset.decimal)
+            expense_date = datetime.strptime(row[date_col].strip(), preset.date_format).date().isoformat()
+        except (ValueError, IndexError):
+            skip("unparseable")
+            continue
+        if preset.negative_expenses:
+            if amount >= 0:
+                skip("income")
+                continue
+            amount = -amount
+        if amount <= 0:
+            skip("zero or negative")
+            continue
+
+        raw_currency = row[currency_col] if currency_col is not None and currency_col < len(row) else ""
+        try:
+            currency = validate_currency(raw_currency or default_currency)
+        except InvalidCurrencyError:
+            skip("unknown currency")
+            continue
+        if currency not in rates:
+            try:
+                rates[currency] = await get_rate(currency, base)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                result.elapsed = time.perf_counter() - start
+                raise ImportInterruptedError(f"couldn't get the {currency} exchange rate", result) from e
+        rate = rates[currency]
+
+        store = row[desc_col].strip() or None if desc_col is not None and desc_col < len(row) else None
+        category = row[category_col].strip().lower() if category_col is not None and category_col < len(row) else ""
+        batch.append(
+            (
+                chat_id,
+                user_id,
+                store,
+                amount,
+                currency,
+                round(amount * rate, 2),
+                rate,
+                category if category in categories else "other",
+                expense_date,
+            )
+        )
+
+        if len(batch) >= batch_size:
+            await _insert_batch(batch)
+            result.imported += len(batch)
+            batch = []
+            result.elapsed = time.perf_counter() - start
+            if progress is not None:
+                await progress(result)
+
+    if batch:
+        await _insert_batch(batch)
+        result.imported += len(batch)
+    result.elapsed = time.perf_counter() - start
+    logger.info(
+        "Imported %d of %d CSV rows (%.0f rows/s)",
+        result.imported,
+        result.rows,
+        result.rows_per_second,
+        extra={"chat_id": chat_id, "handler": "import", "latency_ms": round(result.elapsed * 1000)},
+    )
+    return result
@@ -0,0 +1,100 @@
+import json
+
+from kazo.db.database import get_db
+
+
+async def create_job(chat_id: int, user_id: int, file_id: str, suffix: str, status_message_id: int | None) -> int:
+    db = await get_db()
+    cursor = await db.execute(
+        """INSERT INTO receipt_jobs (chat_id, user_id, file_id, suffix, status_message_id)
+        VALUES (?, ?, ?, ?, ?)""",
+        (chat_id, user_id, file_id, suffix, status_message_id),
+    )
+    await db.commit()
+    assert cursor.lastrowid is not None
+    return cursor.lastrowid
+
+
+async def get_job(job_id: int) -> dict | None:
+    db = await get_db()
+    cursor = await db.execute("SELECT * FROM receipt_jobs WHERE id = ?", (job_id,))
+    row = await cursor.fetchone()
+    return dict(row) if row else None
+
+
+async def get_active_jobs(chat_id: int) -> list[dict]:
+    db = await get_db()
+    cursor = await db.execute(
+        "SELECT * FROM receipt_jobs WHERE chat_id = ? AND status IN ('queued', 'running') ORDER BY id",
+        (chat_id,),
+    )
+    return [dict(row) for row in await cursor.fetchall()]
+
+
+async def start_job(job_id: int) -> bool:
+    """Move a queued job to running; False if it was cancelled (or already taken) meanwhile."""
+    db = await get_db()
+    cursor = await db.execute(
+        "UPDATE receipt_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'queued'",
+        (job_id,),
+    )
+    await db.commit()
+    return cursor.rowcount == 1
+
+
+async def set_job_stage(job_id: int, stage: str, timings: dict[str, float]) -> None:
+    db = await get_db()
+    await db.execute(
+        "UPDATE receipt_jobs SET stage = ?, timings_json = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (stage, json.dumps(timings), job_id),
+    )
+    await db.commit()
+
+
+async def requeue_job(job_id: int, timings: dict[str, float]) -> bool:
+    """Put a running job back to queued, to run again later; False if it was cancelled meanwhile."""
+    db = await get_db()
+    cursor = await db.execute(
+        """UPDATE receipt_jobs SET status = 'queued', stage = NULL, timings_json = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running'""",
+        (json.dumps(timings), job_id),
+    )
+    await db.commit()
+    return cursor.rowcount == 1
+
+
+async def finish_job(job_id: int, status: str, timings: dict[str, float], error: str | None = None) -> None:
+    db = await get_db()
+    await db.execute(
+        """UPDATE receipt_jobs SET status = ?, timings_json = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'running'""",
+        (status, json.dumps(timings), error, job_id),
+    )
+    await db.commit()
+
+
+async def cancel_job(chat_id: int, job_id: int) -> dict | None:
+    """Cancel an in-flight job of this chat, returning it as it was; None if there is nothing to cancel."""
+    db = await get_db()
+    cursor = await db.execute(
+        """UPDATE receipt_jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND chat_id = ? AND status IN ('queued', 'running')
+        RETURNING id, status_message_id, stage""",
+        (job_id, chat_id),
+    )
+    row = await cursor.fetchone()
+    await db.commit()
+    return dict(row) if row else None
+
+
+async def fail_interrupted_jobs() -> list[dict]:
+    """Mark jobs left in flight by a previous process as failed and return them."""
+    db = await get_db()
+    cursor = await db.execute(
+        """UPDATE receipt_jobs SET status = 'failed', error = 'interrupted', updated_at = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'running')
+        RETURNING id, chat_id, status_message_id"""
+    )
+    rows = await cursor.fetchall()
+    await db.commit()
+    return [dict(row) for row in rows]
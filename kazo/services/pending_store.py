@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import logging
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from kazo.state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+ExpireCallback = Callable[[Any, Hashable, Any], Awaitable[None]]
+
+
+class PendingStore:
+    """Short-lived state kept in the state backend, read through an in-memory write-through cache.
+
+    Entries survive restarts until `expires_at` (with the SQLite backend); keys are namespaced so several
+    stores share one backend. Deadlines sit in a min-heap so expiry only touches entries that are due,
+    and at most `max_entries` are live at once — past the cap the entries closest to expiry are evicted
+    early. With a shared backend the cache is bypassed for reads and pops, so replicas stay consistent.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        dump: Callable[[Any], str],
+        load: Callable[[str], Any],
+        on_expire: ExpireCallback | None = None,
+        parse_key: Callable[[str], Hashable] = str,
+        max_entries: int | None = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._dump = dump
+        self._load = load
+        self._on_expire = on_expire
+        self._parse_key = parse_key
+        self.cache: dict[Any, Any] = {}
+        self._deadlines: dict[Hashable, float] = {}
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._evicted: list[tuple[Hashable, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _track(self, key: Hashable, expires_at: float) -> None:
+        self._deadlines[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, next(self._seq), key))
+
+    def _untrack(self, key: Hashable) -> None:
+        # Heap entries are removed lazily; compact once stale ones dominate.
+        self._deadlines.pop(key, None)
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(exp, seq, k) for exp, seq, k in self._heap if self._deadlines.get(k) == exp]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float | None) -> list[Hashable]:
+        """Pop keys in deadline order: all due ones, or (with now=None) just enough to get under the cap."""
+        due = []
+        while self._heap:
+            expires_at, _, key = self._heap[0]
+            if now is not None and expires_at > now:
+                break
+            if now is None and (self.max_entries is None or len(self._deadlines) <= self.max_entries):
+                break
+            heapq.heappop(self._heap)
+            if self._deadlines.get(key) != expires_at:
+                continue
+            del self._deadlines[key]
+            due.append(key)
+        return due
+
+    async def load(self) -> int:
+        """Register deadlines of entries persisted by a previous process (payloads load lazily)."""
+        entries = await get_state_backend().live(self.namespace, time.time())
+        for key, expires_at in entries:
+            self._track(self._parse_key(key), expires_at)
+        return len(entries)
+
+    async def put(self, key: Hashable, value: Any, created_at: float | None = None) -> None:
+        expires_at = (created_at or time.time()) + self.ttl
+        self.cache[key] = value
+        self._track(key, expires_at)
+        backend = get_state_backend()
+        await backend.put(self.namespace, str(key), self._dump(value), expires_at)
+        evicted = self._pop_due(None)
+        for old_key in evicted:
+            payload = await backend.pop(self.namespace, str(old_key), time.time())
+            old_value = self.cache.pop(old_key, None)
+            if old_value is None and payload is not None:
+                old_value = self._load(payload)
+            self._evicted.append((old_key, old_value))
+        if evicted:
+            logger.warning("Pending %s store over capacity, evicted %d entries", self.namespace, len(evicted))
+
+    async def get(self, key: Hashable) -> Any | None:
+        backend = get_state_backend()
+        if key in self.cache and not backend.shared:
+            return self.cache[key]
+        entry = await backend.get(self.namespace, str(key), time.time())
+        if entry is None:
+            self.cache.pop(key, None)
+            return None
+        payload, expires_at = entry
+        value = self._load(payload)
+        self.cache[key] = value
+        if key not in self._deadlines:
+            self._track(key, expires_at)
+        return value
+
+    async def update(self, key: Hashable, change: Callable[[Any], bool]) -> Any | None:
+        """Apply `change` to the live entry in place and write it back if it returns True; None if there is no entry.
+
+        With a shared backend the write is a compare-and-swap against the payload `change` saw: if another
+        replica wrote the entry in between, `change` runs again on the fresh copy, so two replicas can't both
+        act on the same state. Without one, this process is the only writer and the cached value is changed.
+        """
+        backend = get_state_backend()
+        if not backend.shared:
+            value = await self.get(key)
+            if value is not None and change(value):
+                expires_at = self._deadlines.get(key) or time.time() + self.ttl
+                await backend.put(self.namespace, str(key), self._dump(value), expires_at)
+            return value
+        while True:
+            entry = await backend.get(self.namespace, str(key), time.time())
+            if entry is None:
+                self.cache.pop(key, None)
+                return None
+            payload, expires_at = entry
+            value = self._load(payload)
+            if not change(value):
+                return value
+            if await backend.replace(self.namespace, str(key), payload, self._dump(value), time.time()):
+                self.cache[key] = value
+                if key not in self._deadlines:
+                    self._track(key, expires_at)
+                return value
+
+    async def pop(self, key: Hashable) -> Any | None:
+        """Remove and return the entry; the backend decides the winner if two callbacks race."""
+        cached = self.cache.pop(key, None)
+        self._untrack(key)
+        backend = get_state_backend()
+        payload = await backend.pop(self.namespace, str(key), time.time())
+        if cached is not None and not backend.shared:
+            return cached
+        return self._load(payload) if payload is not None else None
+
+    async def sweep(self, bot: Any = None, now: float | None = None) -> int:
+        """Drop due entries and report each one (and any cap evictions) to on_expire.
+
+        Notifications follow what the backend actually deleted, so an entry popped by another
+        replica in the meantime is never reported as expired.
+        """
+        now = time.time() if now is None else now
+        due = {key: self.cache.pop(key, None) for key in self._pop_due(now)}
+        by_str = {str(key): key for key in due}
+        expired = []
+        for raw_key, payload in await get_state_backend().delete_expired(self.namespace, now):
+            key = by_str.get(raw_key, self._parse_key(raw_key))
+            value = due.get(key)
+            expired.append((key, value if value is not None else self._load(payload)))
+
+        expired = self._evicted + expired
+        self._evicted = []
+        if self._on_expire is not None:
+            for key, value in expired:
+                try:
+                    await self._on_expire(bot, key, value)
+                except Exception:
+                    logger.warning("Failed to notify expiry of pending %s %s", self.namespace, key, exc_info=True)
+        return len(expired)
@@ -0,0 +1,111 @@
+import logging
+
+from kazo.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# How far a running total may drift (float accumulation) before verification treats it as wrong.
+TOTAL_TOLERANCE = 0.005
+
+_FRESH_QUERIES = {
+    "chat_stats": """SELECT chat_id, COUNT(*) AS count, SUM(amount_base) AS total, MAX(amount_base) AS max_expense,
+                     MIN(expense_date) AS first_date, MAX(expense_date) AS last_date
+                     FROM expenses {where} GROUP BY chat_id""",
+    "chat_category_stats": """SELECT chat_id, IFNULL(category, '') AS category, COUNT(*) AS count,
+                              SUM(amount_base) AS total
+                              FROM expenses {where} GROUP BY chat_id, IFNULL(category, '')""",
+    "chat_store_stats": """SELECT chat_id, store, COUNT(*) AS count, SUM(amount_base) AS total
+                           FROM expenses {where} {and_or_where} store IS NOT NULL GROUP BY chat_id, store""",
+    "chat_month_stats": """SELECT chat_id, strftime('%Y-%m', expense_date) AS month, COUNT(*) AS count,
+                           SUM(amount_base) AS total
+                           FROM expenses {where} GROUP BY chat_id, month""",
+    "chat_month_category_stats": """SELECT chat_id, strftime('%Y-%m', expense_date) AS month,
+                                    IFNULL(category, '') AS category, COUNT(*) AS count, SUM(amount_base) AS total
+                                    FROM expenses {where} GROUP BY chat_id, month, IFNULL(category, '')""",
+}
+
+_KEYS = {
+    "chat_stats": ("chat_id",),
+    "chat_category_stats": ("chat_id", "category"),
+    "chat_store_stats": ("chat_id", "store"),
+    "chat_month_stats": ("chat_id", "month"),
+    "chat_month_category_stats": ("chat_id", "month", "category"),
+}
+
+
+def _fresh_query(table: str, chat_id: int | None) -> tuple[str, tuple]:
+    if chat_id is None:
+        return _FRESH_QUERIES[table].format(where="", and_or_where="WHERE"), ()
+    return _FRESH_QUERIES[table].format(where="WHERE chat_id = ?", and_or_where="AND"), (chat_id,)
+
+
+async def rebuild_stats(chat_id: int | None = None) -> None:
+    """Recompute the running statistics from the expenses table, for one chat or all of them."""
+    db = await get_db()
+    try:
+        for table in _FRESH_QUERIES:
+            if chat_id is None:
+                await db.execute(f"DELETE FROM {table}")
+            else:
+                await db.execute(f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,))
+            query, params = _fresh_query(table, chat_id)
+            await db.execute(f"INSERT INTO {table} {query}", params)
+    except Exception:
+        await db.rollback()
+        raise
+    await db.commit()
+
+
+def _rows_match(stored: dict, fresh: dict) -> bool:
+    for column, value in fresh.items():
+        if isinstance(value, float):
+            if abs((stored.get(column) or 0) - value) > TOTAL_TOLERANCE:
+                return False
+        elif stored.get(column) != value:
+            return False
+    return True
+
+
+async def verify_stats() -> list[int]:
+    """Compare every chat's running statistics with a fresh recompute and rebuild the chats that drifted.
+
+    Returns the ids of the chats that were repaired.
+    """
+    db = await get_db()
+    drifted: set[int] = set()
+    for table, keys in _KEYS.items():
+        query, params = _fresh_query(table, None)
+        cursor = await db.execute(query, params)
+        fresh = {tuple(row[k] for k in keys): dict(row) for row in await cursor.fetchall()}
+        cursor = await db.execute(f"SELECT * FROM {table}")
+        stored = {tuple(row[k] for k in keys): dict(row) for row in await cursor.fetchall()}
+        for key in fresh.keys() | stored.keys():
+            if key not in fresh or key not in stored or not _rows_match(stored[key], fresh[key]):
+                drifted.add(key[0])
+
+    for chat_id in sorted(drifted):
+        logger.warning("Statistics drifted, rebuilding", extra={"chat_id": chat_id, "handler": "stats"})
+        await rebuild_stats(chat_id)
+    return sorted(drifted)
+
+
+async def ensure_stats() -> None:
+    """Backfill the statistics of a database created before they (or a newer statistics table) were tracked."""
+    db = await get_db()
+    cursor = await db.execute(
+        """SELECT EXISTS(SELECT 1 FROM expenses)
+           AND (NOT EXISTS(SELECT 1 FROM chat_stats) OR NOT EXISTS(SELECT 1 FROM chat_month_category_stats))
+           AS missing"""
+    )
+    row = await cursor.fetchone()
+    if row["missing"]:
+        logger.info("Building expense statistics for existing data")
+        await rebuild_stats()
+
+
+async def data_version(chat_id: int) -> int:
+    """The chat's data version, bumped by every change to its expenses or subscriptions; 0 before any."""
+    db = await get_db()
+    cursor = await db.execute("SELECT version FROM chat_data_version WHERE chat_id = ?", (chat_id,))
+    row = await cursor.fetchone()
+    return row["version"] if row else 0
@@ -44,13 +44,11 @@ async def daily_spending(chat_id: int, start_date: date, end_date: date) -> list
 
 
 async def all_time_stats(chat_id: int) -> dict | None:
+    """All-time figures from the running per-chat statistics; a few indexed reads however long the history."""
     db = await get_db()
     cursor = await db.execute(
-        """SELECT COUNT(*) as count, COALESCE(SUM(amount_base), 0) as total,
-                  COALESCE(AVG(amount_base), 0) as avg_expense,
-                  COALESCE(MAX(amount_base), 0) as max_expense,
-                  MIN(expense_date) as first_date, MAX(expense_date) as last_date
-        FROM expenses WHERE chat_id = ?""",
+        """SELECT count, total, total / count AS avg_expense, max_expense, first_date, last_date
+        FROM chat_stats WHERE chat_id = ?""",
         (chat_id,),
     )
     row = await cursor.fetchone()
@@ -59,25 +57,25 @@ async def all_time_stats(chat_id: int) -> dict | None:
     stats = dict(row)
 
     cursor = await db.execute(
-        """SELECT category, SUM(amount_base) as total
-        FROM expenses WHERE chat_id = ?
-        GROUP BY category ORDER BY total DESC LIMIT 5""",
+        """SELECT NULLIF(category, '') AS category, total
+        FROM chat_category_stats WHERE chat_id = ?
+        ORDER BY total DESC LIMIT 5""",
         (chat_id,),
     )
     stats["top_categories"] = [dict(r) for r in await cursor.fetchall()]
 
     cursor = await db.execute(
-        """SELECT store, SUM(amount_base) as total, COUNT(*) as count
-        FROM expenses WHERE chat_id = ? AND store IS NOT NULL
-        GROUP BY store ORDER BY total DESC LIMIT 5""",
+        """SELECT store, total, count
+        FROM chat_store_stats WHERE chat_id = ?
+        ORDER BY total DESC LIMIT 5""",
         (chat_id,),
     )
     stats["top_stores"] = [dict(r) for r in await cursor.fetchall()]
 
     cursor = await db.execute(
-        """SELECT strftime('%Y-%m', expense_date) as month, SUM(amount_base) as total
-        FROM expenses WHERE chat_id = ?
-        GROUP BY month ORDER BY month DESC LIMIT 2""",
+        """SELECT month, total
+        FROM chat_month_stats WHERE chat_id = ?
+        ORDER BY month DESC LIMIT 2""",
         (chat_id,),
     )
     stats["monthly_comparison"] = [dict(r) for r in await cursor.fetchall()]
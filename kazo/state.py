@@ -0,0 +1,229 @@
+"""Backends for state that has to be shared between bot instances: pending entries and rate-limit hits.
+
+Every mutating operation is atomic within its backend, so two replicas on one SQLite file can't both
+pop the same pending confirmation or both take the last rate-limit slot.
+"""
+
+import heapq
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+import aiosqlite
+
+from kazo.config import settings
+from kazo.db.database import STATE_SCHEMA, get_db
+
+
+class StateBackend(ABC):
+    # True when other processes may write the same state, so local caches can't be trusted for reads.
+    shared: bool = False
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float, cost: int = 1, now: float | None = None) -> bool:
+        """Record `cost` hits for `key` if that keeps it within `limit` per `window` seconds."""
+
+    @abstractmethod
+    async def put(self, namespace: str, key: str, payload: str, expires_at: float) -> None: ...
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str, now: float) -> tuple[str, float] | None:
+        """Payload and expiry of a live entry."""
+
+    @abstractmethod
+    async def replace(self, namespace: str, key: str, expected: str, payload: str, now: float) -> bool:
+        """Swap a live entry's payload for `payload` only if it is still `expected`; False if it changed or is gone."""
+
+    @abstractmethod
+    async def pop(self, namespace: str, key: str, now: float) -> str | None:
+        """Remove the entry, returning its payload only to the caller that removed it while live."""
+
+    @abstractmethod
+    async def delete_expired(self, namespace: str, now: float) -> list[tuple[str, str]]:
+        """Remove and return (key, payload) of every entry due at `now`."""
+
+    @abstractmethod
+    async def live(self, namespace: str, now: float) -> list[tuple[str, float]]:
+        """(key, expires_at) of every live entry."""
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local state for single-instance deployments; nothing survives a restart."""
+
+    def __init__(self) -> None:
+        self._hits: dict[str, deque[tuple[float, int]]] = {}
+        self._entries: dict[str, dict[str, tuple[str, float]]] = {}
+        self._expiry: dict[str, list[tuple[float, str]]] = {}
+
+    async def hit(self, key: str, limit: int, window: float, cost: int = 1, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0][0] <= now - window:
+            hits.popleft()
+        if sum(weight for _, weight in hits) + cost > limit:
+            return False
+        hits.append((now, cost))
+        return True
+
+    async def put(self, namespace: str, key: str, payload: str, expires_at: float) -> None:
+        self._entries.setdefault(namespace, {})[key] = (payload, expires_at)
+        heapq.heappush(self._expiry.setdefault(namespace, []), (expires_at, key))
+
+    async def get(self, namespace: str, key: str, now: float) -> tuple[str, float] | None:
+        entry = self._entries.get(namespace, {}).get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry
+
+    async def replace(self, namespace: str, key: str, expected: str, payload: str, now: float) -> bool:
+        entries = self._entries.get(namespace, {})
+        entry = entries.get(key)
+        if entry is None or entry[1] <= now or entry[0] != expected:
+            return False
+        entries[key] = (payload, entry[1])
+        return True
+
+    async def pop(self, namespace: str, key: str, now: float) -> str | None:
+        entry = self._entries.get(namespace, {}).pop(key, None)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    async def delete_expired(self, namespace: str, now: float) -> list[tuple[str, str]]:
+        entries = self._entries.get(namespace, {})
+        heap = self._expiry.get(namespace, [])
+        expired = []
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = entries.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del entries[key]
+                expired.append((key, entry[0]))
+        return expired
+
+    async def live(self, namespace: str, now: float) -> list[tuple[str, float]]:
+        return [(key, exp) for key, (_, exp) in self._entries.get(namespace, {}).items() if exp > now]
+
+
+class SQLiteStateBackend(StateBackend):
+    """State in SQLite: the main database by default, or a separate file on a volume shared by replicas."""
+
+    def __init__(self, path: str | None = None, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._db: aiosqlite.Connection | None = None
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self.path is None:
+            return await get_db()
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.path, timeout=10)
+            self._db.row_factory = aiosqlite.Row
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.executescript(STATE_SCHEMA)
+            await self._db.commit()
+        return self._db
+
+    async def hit(self, key: str, limit: int, window: float, cost: int = 1, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        db = await self._conn()
+        # One INSERT ... SELECT, so the check and the increment can't interleave with another writer.
+        cursor = await db.execute(
+            """INSERT INTO rate_limit_hits (key, ts, weight)
+            SELECT ?, ?, ?
+            WHERE (SELECT COALESCE(SUM(weight), 0) FROM rate_limit_hits WHERE key = ? AND ts > ?) + ? <= ?""",
+            (key, now, cost, key, now - window, cost, limit),
+        )
+        allowed = cursor.rowcount == 1
+        await db.execute("DELETE FROM rate_limit_hits WHERE key = ? AND ts <= ?", (key, now - window))
+        await db.commit()
+        return allowed
+
+    async def put(self, namespace: str, key: str, payload: str, expires_at: float) -> None:
+        db = await self._conn()
+        await db.execute(
+            "INSERT OR REPLACE INTO pending_state (namespace, key, payload, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, payload, expires_at),
+        )
+        await db.commit()
+
+    async def get(self, namespace: str, key: str, now: float) -> tuple[str, float] | None:
+        db = await self._conn()
+        cursor = await db.execute(
+            "SELECT payload, expires_at FROM pending_state WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, now),
+        )
+        row = await cursor.fetchone()
+        return (row["payload"], row["expires_at"]) if row else None
+
+    async def replace(self, namespace: str, key: str, expected: str, payload: str, now: float) -> bool:
+        db = await self._conn()
+        # Compare-and-swap on the payload itself: a writer that read an older version matches no row.
+        cursor = await db.execute(
+            """UPDATE pending_state SET payload = ?
+            WHERE namespace = ? AND key = ? AND payload = ? AND expires_at > ?""",
+            (payload, namespace, key, expected, now),
+        )
+        await db.commit()
+        return cursor.rowcount == 1
+
+    async def pop(self, namespace: str, key: str, now: float) -> str | None:
+        db = await self._conn()
+        cursor = await db.execute(
+            "DELETE FROM pending_state WHERE namespace = ? AND key = ? RETURNING payload, expires_at",
+            (namespace, key),
+        )
+        row = await cursor.fetchone()
+        await db.commit()
+        if row is None or row["expires_at"] <= now:
+            return None
+        return row["payload"]
+
+    async def delete_expired(self, namespace: str, now: float) -> list[tuple[str, str]]:
+        db = await self._conn()
+        cursor = await db.execute(
+            "DELETE FROM pending_state WHERE namespace = ? AND expires_at <= ? RETURNING key, payload",
+            (namespace, now),
+        )
+        rows = await cursor.fetchall()
+        await db.commit()
+        return [(row["key"], row["payload"]) for row in rows]
+
+    async def live(self, namespace: str, now: float) -> list[tuple[str, float]]:
+        db = await self._conn()
+        cursor = await db.execute(
+            "SELECT key, expires_at FROM pending_state WHERE namespace = ? AND expires_at > ?",
+            (namespace, now),
+        )
+        return [(row["key"], row["expires_at"]) for row in await cursor.fetchall()]
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+_backend: StateBackend | None = None
+
+
+def get_state_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        if settings.state_backend == "memory":
+            _backend = MemoryStateBackend()
+        else:
+            _backend = SQLiteStateBackend(settings.state_db_path, shared=settings.state_shared)
+    return _backend
+
+
+def set_state_backend(backend: StateBackend | None) -> None:
+    global _backend
+    _backend = backend
+
+
+async def close_state_backend() -> None:
+    if _backend is not None:
+        await _backend.close()
@@ -0,0 +1,174 @@
+import asyncio
+import hmac
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+HealthCheck = Callable[[], Awaitable[tuple[bool, dict]]]
+
+
+def _chat_key(update: Update) -> int | None:
+    """The chat whose updates run one at a time; None for chatless updates and album parts, which run freely."""
+    event = update.event
+    if getattr(event, "media_group_id", None):
+        return None
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    return chat.id if chat else None
+
+
+class UpdatePool:
+    """Bounded queue of updates drained by a fixed number of workers.
+
+    The webhook handler only enqueues, so Telegram gets its 200 before any handler runs; a full
+    queue is reported back so Telegram retries later instead of us buffering without limit.
+
+    A chat is handled by at most one worker at a time: a worker that picks up an update for a chat
+    another worker is busy with hands it to that worker and moves on, so one chat's backlog never
+    holds more than one worker while other chats wait. That backlog is capped at chat_queue_size, as
+    in the polling path; past it the chat's updates are dropped rather than crowding out other chats.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int, queue_size: int, chat_queue_size: int = 0):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self.queue: asyncio.Queue[tuple[Update, float]] = asyncio.Queue(maxsize=queue_size)
+        self.chat_queue_size = chat_queue_size
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._tasks: list[asyncio.Task] = []
+        self._busy: dict[int, deque[tuple[Update, float]]] = {}  # chat -> updates waiting for its worker
+        self._held = 0
+        self._closing = False
+
+    def submit(self, update: Update) -> bool:
+        if self._closing:
+            return False
+        if self.queue.qsize() + self._held >= self.queue.maxsize > 0:
+            return False
+        try:
+            self.queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _process(self, update: Update, enqueued: float) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+            self.processed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Webhook update %s failed", update.update_id)
+        finally:
+            self.queue.task_done()
+            logger.debug(
+                "Webhook update %s done",
+                update.update_id,
+                extra={"handler": "webhook", "latency_ms": round((time.monotonic() - enqueued) * 1000)},
+            )
+
+    async def _worker(self) -> None:
+        while True:
+            update, enqueued = await self.queue.get()
+            chat_id = _chat_key(update)
+            if chat_id is None:
+                await self._process(update, enqueued)
+                continue
+            waiting = self._busy.get(chat_id)
+            if waiting is not None:
+                if len(waiting) >= self.chat_queue_size > 0:
+                    self.dropped += 1
+                    self.queue.task_done()
+                    logger.warning(
+                        "Chat backlog full, dropping webhook update %s",
+                        update.update_id,
+                        extra={"chat_id": chat_id, "handler": "webhook"},
+                    )
+                    continue
+                waiting.append((update, enqueued))
+                self._held += 1
+                continue
+            waiting = self._busy[chat_id] = deque()
+            try:
+                await self._process(update, enqueued)
+                while waiting:
+                    self._held -= 1
+                    await self._process(*waiting.popleft())
+            finally:
+                del self._busy[chat_id]
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Refuse new updates, let queued ones finish (up to drain_timeout), then stop the workers."""
+        self._closing = True
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except TimeoutError:
+            logger.warning("Dropping %d queued webhook updates on shutdown", self.queue.qsize() + self._held)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() + self._held,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def build_webhook_app(
+    pool: UpdatePool,
+    path: str,
+    secret: str | None = None,
+    health: HealthCheck | None = None,
+) -> web.Application:
+    """aiohttp app serving the Telegram webhook at `path` and, when given, the health check at /health."""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret is not None and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            logger.warning("Webhook request with bad secret token from %s", request.remote)
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": pool.bot})
+        except Exception:
+            return web.Response(status=400)
+        if not pool.submit(update):
+            logger.warning("Webhook queue full, asking Telegram to retry update %s", update.update_id)
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        assert health is not None
+        healthy, body = await health()
+        body["checks"]["webhook"] = pool.stats()
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def on_startup(app: web.Application) -> None:
+        pool.start()
+
+    async def on_cleanup(app: web.Application) -> None:
+        await pool.stop()
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    if health is not None:
+        app.router.add_get("/health", handle_health)
+        app.router.add_get("/", handle_health)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
@@ -0,0 +1,106 @@
+"""Time /anomalies end to end on a synthetic chat: loading its expenses from SQLite, then the detection.
+
+Seeds a throwaway database with --years of history (a few expenses a day across five categories) and runs
+find_anomalies --runs times. Fails when the median exceeds --max-ms.
+
+Usage: uv run python scripts/anomaly_bench.py [--years 10] [--runs 20] [--max-ms 0]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from kazo.config import settings
+from kazo.db import database
+from kazo.db.models import Expense
+from kazo.services.anomaly_service import detect_anomalies, find_anomalies, load_series
+from kazo.services.expense_service import save_expenses
+
+CHAT = 1
+CATEGORIES = ("groceries", "dining", "transport", "shopping", "other")
+
+
+def synthetic_expenses(years: int, seed: int = 1) -> list[Expense]:
+    rng = random.Random(seed)
+    today = date.today()
+    expenses = []
+    for days_ago in range(years * 365):
+        day = (today - timedelta(days=days_ago)).isoformat()
+        for _ in range(rng.randint(1, 5)):
+            amount = round(rng.lognormvariate(3, 0.6), 2)
+            expenses.append(
+                Expense(
+                    id=None,
+                    chat_id=CHAT,
+                    user_id=1,
+                    store=f"store {rng.randint(1, 40)}",
+                    amount=amount,
+                    original_currency="EUR",
+                    amount_base=amount,
+                    exchange_rate=1.0,
+                    category=rng.choice(CATEGORIES),
+                    items_json=None,
+                    source="text",
+                    expense_date=day,
+                )
+            )
+    return expenses
+
+
+async def run(years: int, runs: int, days: int) -> list[float]:
+    expenses = synthetic_expenses(years)
+    await database.init_db()
+    await save_expenses(expenses)
+    await find_anomalies(CHAT, days)  # warm up: first numpy import, SQLite page cache
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await find_anomalies(CHAT, days)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    series = await load_series(CHAT)
+    loaded = time.perf_counter()
+    detect_anomalies(series, date.today() - timedelta(days=days - 1))
+    detected = time.perf_counter()
+
+    print(f"expenses:     {len(expenses)} over {years} years")
+    print(f"end to end:   median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms over {runs} runs")
+    print(f"  load:       {(loaded - started) * 1000:.1f} ms")
+    print(f"  detect:     {(detected - loaded) * 1000:.1f} ms")
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90, help="the /anomalies window")
+    parser.add_argument("--max-ms", type=float, default=0, help="fail when the median exceeds this (0: off)")
+    args = parser.parse_args()
+
+    async def bench() -> list[float]:
+        try:
+            return await run(args.years, args.runs, args.days)
+        finally:
+            await database.close_db()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.db_path = os.path.join(tmp, "bench.db")
+        timings = asyncio.run(bench())
+
+    median_ms = statistics.median(timings)
+    if args.max_ms and median_ms > args.max_ms:
+        print(f"\nMedian {median_ms:.0f} ms exceeds the {args.max_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Score the local intent classifier against the held-out labelled examples in kazo/intent/eval.tsv.
+
+Usage: uv run python scripts/eval_intent.py [--threshold 0.8]
+"""
+
+import argparse
+import time
+
+from kazo.config import settings
+from kazo.intent import classify_local, predict
+from kazo.intent.classifier import EVAL_PATH, load_training_examples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=settings.intent_local_threshold)
+    args = parser.parse_args()
+
+    examples = load_training_examples(EVAL_PATH)
+    handled = correct = top1 = 0
+    start = time.perf_counter()
+    for expected, text in examples:
+        prediction = predict(text)
+        if prediction and prediction.intent == expected:
+            top1 += 1
+        result = classify_local(text, threshold=args.threshold)
+        status = "claude"
+        if result is not None:
+            handled += 1
+            ok = result["intent"] == expected
+            correct += ok
+            status = "ok" if ok else f"WRONG ({result['intent']})"
+        conf = f"{prediction.intent}@{prediction.confidence:.2f}" if prediction else "-"
+        print(f"{status:<20} {expected:<14} {conf:<22} {text}")
+    elapsed_us = (time.perf_counter() - start) / len(examples) * 1e6
+
+    total = len(examples)
+    print()
+    print(f"Examples:         {total}")
+    print(f"Top-1 accuracy:   {top1 / total:.1%}")
+    print(f"Handled locally:  {handled / total:.1%} ({handled}) at threshold {args.threshold}")
+    print(f"Local precision:  {correct / handled:.1%}" if handled else "Local precision:  n/a")
+    print(f"Avg latency:      {elapsed_us:.0f} us/message")
+
+
+if __name__ == "__main__":
+    main()
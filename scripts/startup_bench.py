@@ -0,0 +1,78 @@
+"""Measure the cold import of the bot with `python -X importtime` and guard what startup loads.
+
+Each run imports kazo.main in a fresh interpreter. Fails when a module that should load lazily (charting,
+numpy, the Claude SDK, PDF and image libraries) is imported at startup, or when the median exceeds --max-ms.
+
+Usage: uv run python scripts/startup_bench.py [--runs 5] [--max-ms 0] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+
+ENTRY_MODULE = "kazo.main"
+LAZY_MODULES = ("plotly", "numpy", "kaleido", "anthropic", "pypdf", "PIL")
+
+
+@dataclass(slots=True)
+class ImportProfile:
+    total_us: int
+    cumulative_us: dict[str, int]  # module -> cumulative import time in microseconds
+
+
+def profile_import(module: str = ENTRY_MODULE) -> ImportProfile:
+    env = {**os.environ, "TELEGRAM_BOT_TOKEN": os.environ.get("TELEGRAM_BOT_TOKEN", "bench-token")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line.removeprefix("import time:").split("|")
+        cumulative[name.strip()] = int(cum)
+    return ImportProfile(cumulative.get(module, 0), cumulative)
+
+
+def lazy_violations(profile: ImportProfile) -> list[str]:
+    """Modules that should load on first use but were imported at startup."""
+    return sorted(name for name in profile.cumulative_us if name.split(".")[0] in LAZY_MODULES)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=0, help="fail when the median import exceeds this (0: off)")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profiles = [profile_import() for _ in range(args.runs)]
+    median_ms = statistics.median(p.total_us for p in profiles) / 1000
+    last = profiles[-1]
+
+    print(f"import {ENTRY_MODULE}: median {median_ms:.0f} ms over {args.runs} runs")
+    print()
+    top_level = {name: us for name, us in last.cumulative_us.items() if "." not in name}
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{us / 1000:>9.1f} ms  {name}")
+
+    failed = False
+    violations = lazy_violations(last)
+    if violations:
+        print(f"\nLoaded at startup but should be lazy: {', '.join(violations)}")
+        failed = True
+    if args.max_ms and median_ms > args.max_ms:
+        print(f"\nMedian {median_ms:.0f} ms exceeds the {args.max_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
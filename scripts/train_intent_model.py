@@ -0,0 +1,19 @@
+"""Rebuild kazo/intent/model.json from kazo/intent/training.tsv.
+
+Usage: uv run python scripts/train_intent_model.py
+"""
+
+import json
+
+from kazo.intent.classifier import MODEL_PATH, load_training_examples, train
+
+
+def main() -> None:
+    examples = load_training_examples()
+    model = train(examples)
+    MODEL_PATH.write_text(json.dumps(model, sort_keys=True, separators=(",", ":")) + "\n")
+    print(f"Trained on {len(examples)} examples, {len(model['classes'])} intents -> {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Replay recorded Telegram updates against a local webhook server and report throughput.
+
+Runs fully offline: handlers are replaced by a simulated workload so only the webhook
+ingestion path, the bounded worker pool and per-chat ordering are measured.
+
+Usage: uv run python scripts/webhook_bench.py [--updates FILE] [--repeat 200] [--work-ms 20]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from aiogram import Bot, Dispatcher
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+from kazo.config import settings
+from kazo.main import chat_order_middleware
+from kazo.webhook import SECRET_HEADER, UpdatePool, build_webhook_app
+
+DEFAULT_UPDATES = Path(__file__).parent / "fixtures" / "telegram_updates.jsonl"
+SECRET = "bench-secret"
+
+
+def load_updates(path: Path, repeat: int) -> list[dict]:
+    recorded = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    updates = []
+    for i in range(repeat):
+        for n, update in enumerate(recorded):
+            updates.append({**update, "update_id": i * len(recorded) + n + 1})
+    return updates
+
+
+def build_bench_dispatcher(work_ms: float) -> Dispatcher:
+    dp = Dispatcher()
+    dp.message.middleware(chat_order_middleware)
+    dp.callback_query.middleware(chat_order_middleware)
+
+    async def simulated_handler(event) -> None:
+        await asyncio.sleep(work_ms / 1000)
+
+    dp.message.register(simulated_handler)
+    dp.callback_query.register(simulated_handler)
+    return dp
+
+
+async def run(updates: list[dict], work_ms: float, workers: int, concurrency: int) -> None:
+    bot = Bot(token="123456:bench")
+    pool = UpdatePool(build_bench_dispatcher(work_ms), bot, workers, settings.webhook_queue_size)
+    app = build_webhook_app(pool, settings.webhook_path, SECRET)
+
+    ack_ms: list[float] = []
+    rejected = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with TestServer(app) as server, ClientSession() as session:
+        url = str(server.make_url(settings.webhook_path))
+
+        async def post(update: dict) -> None:
+            nonlocal rejected
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url, json=update, headers={SECRET_HEADER: SECRET}) as resp:
+                    ack_ms.append((time.perf_counter() - start) * 1000)
+                    rejected += resp.status != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(u) for u in updates))
+        acked = time.perf_counter() - start
+        await pool.queue.join()
+        total = time.perf_counter() - start
+
+    await bot.session.close()
+    ack_ms.sort()
+    print(f"updates:      {len(updates)} ({rejected} rejected)")
+    print(f"acked in:     {acked:.2f}s ({len(updates) / acked:.0f} updates/s)")
+    print(f"processed in: {total:.2f}s ({pool.processed / total:.0f} updates/s)")
+    print(f"ack latency:  p50 {statistics.median(ack_ms):.1f}ms, p95 {ack_ms[int(len(ack_ms) * 0.95) - 1]:.1f}ms")
+
+
+def main() -> None:
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=Path, default=DEFAULT_UPDATES)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=settings.webhook_workers)
+    parser.add_argument("--concurrency", type=int, default=50, help="parallel HTTP posts")
+    args = parser.parse_args()
+    asyncio.run(run(load_updates(args.updates, args.repeat), args.work_ms, args.workers, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
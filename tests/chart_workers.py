@@ -0,0 +1,28 @@
+"""Render worker stand-ins, kept in a module with no heavy imports so spawned processes start quickly."""
+
+import json
+import os
+import subprocess
+import time
+
+
+def echo_worker(conn):
+    """Stand-in for the kaleido worker: returns the spec and its pid as the 'image'.
+
+    With "spawn" in the spec it starts a long-lived child first, like kaleido's browser, and returns its pid too.
+    """
+    conn.send(("ready", None, 10.0))
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        spec, scale = message
+        if spec.get("sleep"):
+            time.sleep(spec["sleep"])
+        if spec.get("fail"):
+            conn.send(("error", "bad figure", 10.0))
+            continue
+        result = {"pid": os.getpid(), "scale": scale}
+        if spec.get("spawn"):
+            result["child"] = subprocess.Popen(["sleep", "60"]).pid
+        conn.send(("ok", json.dumps(result).encode(), spec.get("rss", 10.0)))
@@ -6,6 +6,7 @@ import aiosqlite
 import pytest
 
 import kazo.db.database as db_mod
+from kazo.claude.resilience import reset_breakers
 
 
 @pytest.fixture(autouse=True)
@@ -25,3 +26,10 @@ async def test_db(monkeypatch):
     yield conn
 
     await conn.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_breakers():
+    reset_breakers()
+    yield
+    reset_breakers()
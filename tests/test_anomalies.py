@@ -0,0 +1,165 @@
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+
+from kazo.db.models import Expense
+from kazo.handlers.summary import cmd_anomalies
+from kazo.services.anomaly_service import (
+    _group_median,
+    find_anomalies,
+    load_series,
+    robust_z,
+    rolling_median,
+)
+from kazo.services.expense_service import save_expenses
+
+CHAT = 1
+TODAY = date.today()
+
+
+def _exp(amount, category="groceries", days_ago=0, store="shop") -> Expense:
+    return Expense(
+        id=None,
+        chat_id=CHAT,
+        user_id=1,
+        store=store,
+        amount=amount,
+        original_currency="EUR",
+        amount_base=amount,
+        exchange_rate=1.0,
+        category=category,
+        items_json=None,
+        source="text",
+        expense_date=(TODAY - timedelta(days=days_ago)).isoformat(),
+    )
+
+
+def _history(days: int) -> list[Expense]:
+    """A steady 20-30 of groceries every day, a little more on Saturdays."""
+    expenses = []
+    for ago in range(days, 0, -1):
+        day = TODAY - timedelta(days=ago)
+        amount = 20 + (ago * 7) % 11 + (15 if day.weekday() == 5 else 0)
+        expenses.append(_exp(float(amount), days_ago=ago))
+    return expenses
+
+
+def test_group_median():
+    values = np.array([5.0, 1.0, 3.0, 10.0, 20.0, 7.0])
+    groups = np.array([0, 0, 0, 1, 1, 2])
+
+    assert _group_median(values, groups, 3).tolist() == [3.0, 15.0, 7.0]
+
+
+def test_rolling_median_excludes_the_day_itself():
+    values = np.array([1.0, 1.0, 1.0, 100.0, 1.0])
+
+    assert rolling_median(values, 3).tolist() == [1.0, 1.0, 1.0, 1.0, 1.0]
+
+
+def test_robust_z_ignores_outlier_in_scale():
+    z = robust_z(np.array([10.0, 11.0, 9.0, 10.0, 12.0, 8.0, 500.0]))
+
+    assert z[-1] > 100
+    assert np.all(np.abs(z[:-1]) < 2)
+
+
+def test_robust_z_with_mostly_equal_values():
+    z = robust_z(np.array([0.0, 0.0, 0.0, 0.0, 0.0, 50.0]))
+
+    assert z[-1] > 3.5
+    assert z[0] == 0
+
+
+async def test_load_series_one_row_per_expense():
+    await save_expenses([_exp(10.0, days_ago=2), _exp(5.0, "dining", days_ago=1), _exp(7.0, None)])
+
+    series = await load_series(CHAT)
+
+    assert series.amounts.tolist() == [10.0, 5.0, 7.0]
+    assert [series.categories[c] for c in series.category_codes] == ["groceries", "dining", None]
+    assert series.days[-1] == np.datetime64(TODAY, "D")
+
+
+async def test_load_series_empty():
+    assert await load_series(CHAT) is None
+
+
+async def test_finds_outlier_day_and_expense():
+    await save_expenses([*_history(120), _exp(400.0, store="furniture")])
+
+    result = await find_anomalies(CHAT, days=30)
+
+    assert [d["date"] for d in result["days"]] == [TODAY.isoformat()]
+    assert result["days"][0]["baseline"] < 60
+    [expense] = result["expenses"]
+    assert expense["store"] == "furniture"
+    assert 20 <= expense["typical"] <= 35
+
+
+async def test_weekly_pattern_is_not_anomalous():
+    await save_expenses(_history(120))
+
+    result = await find_anomalies(CHAT, days=90)
+
+    assert result == {"days": [], "expenses": []}
+
+
+async def test_outliers_before_window_are_not_listed():
+    await save_expenses([*_history(120), _exp(400.0, days_ago=60)])
+
+    result = await find_anomalies(CHAT, days=30)
+
+    assert result == {"days": [], "expenses": []}
+
+
+async def test_small_category_is_not_judged():
+    await save_expenses([*_history(60), _exp(5.0, "dining", days_ago=3), _exp(300.0, "dining")])
+
+    result = await find_anomalies(CHAT, days=30)
+
+    assert all(e["category"] != "dining" for e in result["expenses"])
+
+
+@patch("kazo.handlers.summary.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.summary.find_anomalies", new_callable=AsyncMock)
+async def test_cmd_anomalies(mock_find, mock_base):
+    mock_find.return_value = {
+        "days": [{"date": "2025-03-01", "total": 400.0, "baseline": 30.0, "z": 40.0}],
+        "expenses": [
+            {
+                "id": 7,
+                "expense_date": "2025-03-01",
+                "store": "IKEA",
+                "category": "household",
+                "amount_base": 380.0,
+                "typical": 40.0,
+                "z": 9.0,
+            }
+        ],
+    }
+    msg = AsyncMock()
+    msg.text = "/anomalies 30"
+    msg.chat.id = CHAT
+    msg.from_user = MagicMock()
+
+    await cmd_anomalies(msg)
+
+    mock_find.assert_awaited_once_with(CHAT, 30)
+    text = msg.answer.call_args.args[0]
+    assert "last 30 days" in text
+    assert "2025-03-01 (Sat)" in text
+    assert "at IKEA (household)" in text
+
+
+@patch("kazo.handlers.summary.find_anomalies", new_callable=AsyncMock, return_value={"days": [], "expenses": []})
+async def test_cmd_anomalies_nothing_unusual(mock_find):
+    msg = AsyncMock()
+    msg.text = "/anomalies"
+    msg.chat.id = CHAT
+
+    await cmd_anomalies(msg)
+
+    mock_find.assert_awaited_once_with(CHAT, 90)
+    assert msg.answer.call_args.args[0] == "Nothing unusual in the last 90 days."
@@ -1,13 +1,18 @@
 from datetime import date
+from unittest.mock import AsyncMock, patch
 
 from kazo.db.database import get_db
+from kazo.db.models import Expense
+from kazo.handlers.budget import notify_budget_alerts
 from kazo.services.budget_service import (
     budget_vs_actual,
+    check_budget_alerts,
     get_all_budgets,
     get_budget,
     remove_budget,
     set_budget,
 )
+from kazo.services.expense_service import save_expense
 
 CHAT = 100
 
@@ -89,3 +94,97 @@ async def test_budget_vs_actual():
 async def test_budget_vs_actual_empty():
     result = await budget_vs_actual(CHAT, date.today(), date.today())
     assert result == []
+
+
+def _expense(amount_base, category, expense_date=None):
+    return Expense(
+        id=None,
+        chat_id=CHAT,
+        user_id=1,
+        store="test",
+        amount=amount_base,
+        original_currency="EUR",
+        amount_base=amount_base,
+        exchange_rate=1.0,
+        category=category,
+        items_json=None,
+        source="text",
+        expense_date=expense_date or date.today(),
+    )
+
+
+async def test_budget_vs_actual_counts_only_range():
+    await set_budget(CHAT, 500.0, "groceries")
+    await set_budget(CHAT, 300.0, "dining")
+    today = date.today()
+    await _add_expense(CHAT, 100.0, "groceries", today.isoformat())
+    await _add_expense(CHAT, 900.0, "groceries", "2000-01-15")
+    await _add_expense(CHAT, 50.0, "groceries", today.isoformat())
+    await _add_expense(CHAT + 1, 70.0, "groceries", today.isoformat())
+
+    data = await budget_vs_actual(CHAT, today.replace(day=1), today)
+
+    assert [d["category"] for d in data] == ["dining", "groceries"]
+    assert data[0]["spent"] == 0
+    assert data[1]["spent"] == 150.0
+    assert data[1]["pct"] == 30.0
+
+
+async def test_budget_alert_fires_once_per_threshold():
+    await set_budget(CHAT, 100.0, "groceries")
+
+    first = _expense(50.0, "groceries")
+    await save_expense(first)
+    assert await check_budget_alerts(CHAT, [first]) == []
+
+    second = _expense(35.0, "groceries")
+    await save_expense(second)
+    alerts = await check_budget_alerts(CHAT, [second])
+    assert [(a["category"], a["threshold"], a["spent"]) for a in alerts] == [("groceries", 80, 85.0)]
+
+    third = _expense(5.0, "groceries")
+    await save_expense(third)
+    assert await check_budget_alerts(CHAT, [third]) == []
+
+
+async def test_budget_alert_reports_highest_threshold_crossed():
+    await set_budget(CHAT, 100.0)
+    await set_budget(CHAT, 1000.0, "dining")
+
+    expense = _expense(120.0, "dining")
+    await save_expense(expense)
+    alerts = await check_budget_alerts(CHAT, [expense])
+
+    assert [(a["category"], a["threshold"]) for a in alerts] == [(None, 100)]
+    assert alerts[0]["remaining"] == -20.0
+
+
+async def test_budget_alert_rearmed_by_new_budget():
+    await set_budget(CHAT, 100.0, "groceries")
+    expense = _expense(90.0, "groceries")
+    await save_expense(expense)
+    assert await check_budget_alerts(CHAT, [expense])
+
+    await set_budget(CHAT, 110.0, "groceries")
+    assert [a["threshold"] for a in await check_budget_alerts(CHAT, [expense])] == [80]
+
+
+async def test_budget_alert_ignores_past_months():
+    await set_budget(CHAT, 100.0, "groceries")
+    expense = _expense(500.0, "groceries", "2000-01-15")
+    await save_expense(expense)
+
+    assert await check_budget_alerts(CHAT, [expense]) == []
+
+
+@patch("kazo.handlers.budget.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+async def test_notify_budget_alerts_sends_message(mock_base):
+    await set_budget(CHAT, 100.0, "groceries")
+    expense = _expense(100.0, "groceries")
+    await save_expense(expense)
+    msg = AsyncMock()
+
+    await notify_budget_alerts(msg, CHAT, [expense])
+
+    text = msg.answer.call_args.args[0]
+    assert "groceries budget exceeded" in text
@@ -0,0 +1,106 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+from kazo.charts import templates
+from kazo.charts.cache import ChartCache, chart_key
+from kazo.handlers.summary import cmd_monthly
+
+MONTHLY = [{"month": "2025-01", "total": 100.0, "count": 3}, {"month": "2025-02", "total": 80.0, "count": 2}]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ChartCache(max_bytes=1000)
+    monkeypatch.setattr(templates, "chart_cache", cache)
+    monkeypatch.setattr("kazo.handlers.summary.chart_cache", cache)
+    return cache
+
+
+def test_chart_key_depends_on_inputs():
+    assert chart_key("monthly", MONTHLY, "EUR") == chart_key("monthly", list(MONTHLY), "EUR")
+    assert chart_key("monthly", MONTHLY, "EUR") != chart_key("monthly", MONTHLY, "USD")
+    assert chart_key("monthly", MONTHLY, "EUR") != chart_key("monthly", MONTHLY[:1], "EUR")
+
+
+def test_put_get_and_file_id(cache):
+    assert cache.get("a") is None
+    cache.put("a", b"png")
+    cache.remember_file_id("a", "AgAD")
+
+    chart = cache.get("a")
+    assert chart.png == b"png"
+    assert chart.file_id == "AgAD"
+
+    cache.forget_file_id("a")
+    assert cache.get("a").file_id is None
+
+
+def test_evicts_least_recently_used(cache):
+    cache.put("used", b"x" * 400)
+    cache.put("old", b"x" * 400)
+    cache.get("used")  # refreshes recency
+
+    cache.put("new", b"x" * 400)
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+    assert cache.stats()["bytes"] == 800
+
+
+@patch("kazo.charts.templates.chart_renderer")
+async def test_identical_inputs_render_once(mock_renderer, cache):
+    mock_renderer.render = AsyncMock(return_value=b"png")
+
+    first = await templates.monthly_trend_chart(MONTHLY, "EUR")
+    second = await templates.monthly_trend_chart(MONTHLY, "EUR")
+    await templates.monthly_trend_chart(MONTHLY, "USD")
+
+    assert first.key == second.key
+    assert mock_renderer.render.await_count == 2
+
+
+def _monthly_message():
+    msg = AsyncMock()
+    msg.chat.id = 1
+    msg.answer_photo.return_value = MagicMock(photo=[MagicMock(file_id="small"), MagicMock(file_id="AgAD")])
+    return msg
+
+
+@patch("kazo.handlers.summary.monthly_trend_chart", new_callable=AsyncMock)
+@patch("kazo.handlers.summary.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.summary.monthly_totals", new_callable=AsyncMock, return_value=MONTHLY)
+async def test_repeat_report_reuses_file_id(mock_totals, mock_base, mock_chart, cache):
+    mock_chart.side_effect = lambda *args: cache.get("k") or cache.put("k", b"png")
+
+    first = _monthly_message()
+    await cmd_monthly(first)
+    msg = _monthly_message()
+    await cmd_monthly(msg)
+
+    uploaded = first.answer_photo.call_args.args[0]
+    assert isinstance(uploaded, BufferedInputFile)
+    assert uploaded.data == b"png"
+    assert msg.answer_photo.call_args.args[0] == "AgAD"
+
+
+@patch("kazo.handlers.summary.monthly_trend_chart", new_callable=AsyncMock)
+@patch("kazo.handlers.summary.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.summary.monthly_totals", new_callable=AsyncMock, return_value=MONTHLY)
+async def test_rejected_file_id_uploads_again(mock_totals, mock_base, mock_chart, cache):
+    cache.put("k", b"png")
+    cache.remember_file_id("k", "stale")
+    mock_chart.return_value = cache.get("k")
+    msg = _monthly_message()
+    msg.answer_photo.side_effect = [
+        TelegramBadRequest(method=MagicMock(), message="wrong file"),
+        msg.answer_photo.return_value,
+    ]
+
+    await cmd_monthly(msg)
+
+    assert msg.answer_photo.await_count == 2
+    assert cache.get("k").file_id == "AgAD"
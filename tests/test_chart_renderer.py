@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from kazo.charts.renderer import RenderError, RenderPool, RenderTimeout, _tree_rss_mb
+from kazo.handlers.summary import cmd_monthly
+from tests.chart_workers import echo_worker
+
+
+async def _pid(pool: RenderPool, **spec) -> int:
+    return json.loads(await pool.render(spec))["pid"]
+
+
+@pytest.fixture
+async def pool():
+    pool = RenderPool(workers=1, timeout=5, max_renders=3, max_memory_mb=100, target=echo_worker)
+    yield pool
+    await pool.stop()
+
+
+async def test_render_returns_worker_output(pool):
+    result = json.loads(await pool.render({}, scale=2))
+
+    assert result["scale"] == 2
+    assert result["pid"] != os.getpid()
+    assert pool.stats()["rendered"] == 1
+
+
+async def test_worker_reused_then_recycled(pool):
+    first = [await _pid(pool) for _ in range(3)]
+    after = await _pid(pool)
+
+    assert len(set(first)) == 1
+    assert after != first[0]
+    assert pool.stats()["recycled"] == 1
+
+
+async def test_worker_recycled_over_memory_cap(pool):
+    before = await _pid(pool, rss=500)
+
+    assert await _pid(pool) != before
+
+
+async def test_timeout_replaces_worker(pool):
+    pool.timeout = 0.2
+    with pytest.raises(RenderTimeout):
+        await pool.render({"sleep": 5})
+
+    pool.timeout = 5
+    assert await _pid(pool)
+    stats = pool.stats()
+    assert stats["failed"] == 1
+    assert stats["workers"] == 1
+
+
+def _running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")  # exited but not reaped yet
+    except FileNotFoundError:
+        return False
+
+
+async def _wait_gone(pid: int) -> bool:
+    for _ in range(50):
+        if not _running(pid):
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def test_timeout_kills_worker_children(pool):
+    child = json.loads(await pool.render({"spawn": True}))["child"]
+    assert _running(child)
+
+    pool.timeout = 0.2
+    with pytest.raises(RenderTimeout):
+        await pool.render({"sleep": 5})
+
+    assert await _wait_gone(child)
+
+
+async def test_recycle_kills_worker_children(pool):
+    child = json.loads(await pool.render({"spawn": True, "rss": 500}))["child"]
+
+    assert await _wait_gone(child)
+
+
+def test_tree_rss_includes_children():
+    before = _tree_rss_mb()
+    child = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time; x = bytearray(80 * 2**20); x[::4096] = b'1' * len(x[::4096]); "
+            "print(flush=True); time.sleep(30)",
+        ],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        child.stdout.readline()
+        assert _tree_rss_mb() - before > 60
+    finally:
+        child.kill()
+        child.wait()
+
+
+async def test_render_error_keeps_worker(pool):
+    before = await _pid(pool)
+    with pytest.raises(RenderError, match="bad figure"):
+        await pool.render({"fail": True})
+
+    assert await _pid(pool) == before
+
+
+@patch("kazo.handlers.summary.monthly_trend_chart", new_callable=AsyncMock, side_effect=RenderError("boom"))
+@patch("kazo.handlers.summary.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.summary.monthly_totals", new_callable=AsyncMock)
+async def test_monthly_falls_back_to_text(mock_totals, mock_base, mock_chart):
+    mock_totals.return_value = [{"month": "2025-01", "total": 100.0, "count": 3}]
+    msg = AsyncMock()
+    msg.chat.id = 1
+    msg.from_user = MagicMock()
+
+    await cmd_monthly(msg)
+
+    msg.answer_photo.assert_not_called()
+    assert "Monthly spending" in msg.answer.call_args.args[0]
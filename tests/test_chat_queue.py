@@ -0,0 +1,89 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import Message
+
+from kazo.main import _chat_lanes, chat_order_middleware, chat_queue_stats
+
+
+def _event(chat_id=1, media_group_id=None):
+    event = AsyncMock(spec=Message)
+    event.chat = MagicMock(id=chat_id)
+    event.media_group_id = media_group_id
+    event.answer = AsyncMock()
+    return event
+
+
+async def test_same_chat_runs_in_arrival_order():
+    order = []
+
+    async def handler(event, data):
+        order.append(("start", data["n"]))
+        await asyncio.sleep(0.01 if data["n"] == 0 else 0)
+        order.append(("end", data["n"]))
+
+    await asyncio.gather(*(chat_order_middleware(handler, _event(), {"n": n}) for n in range(3)))
+
+    assert order == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert _chat_lanes == {}
+
+
+async def test_different_chats_run_in_parallel():
+    running = set()
+    overlap = []
+
+    async def handler(event, data):
+        running.add(event.chat.id)
+        overlap.append(len(running))
+        await asyncio.sleep(0.01)
+        running.discard(event.chat.id)
+
+    await asyncio.gather(chat_order_middleware(handler, _event(1), {}), chat_order_middleware(handler, _event(2), {}))
+
+    assert max(overlap) == 2
+
+
+async def test_full_queue_drops_update():
+    release = asyncio.Event()
+
+    async def handler(event, data):
+        await release.wait()
+
+    from kazo.config import settings
+
+    with patch.object(settings, "chat_queue_size", 2):
+        tasks = [asyncio.create_task(chat_order_middleware(handler, _event(), {})) for _ in range(2)]
+        await asyncio.sleep(0)
+        dropped = _event()
+        await chat_order_middleware(handler, dropped, {})
+        dropped.answer.assert_awaited_once()
+        assert chat_queue_stats()["queued"] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+
+
+async def test_album_parts_bypass_lane():
+    release = asyncio.Event()
+
+    async def blocking(event, data):
+        await release.wait()
+
+    blocker = asyncio.create_task(chat_order_middleware(blocking, _event(), {}))
+    await asyncio.sleep(0)
+
+    album_handler = AsyncMock(return_value="ok")
+    assert await chat_order_middleware(album_handler, _event(media_group_id="a1"), {}) == "ok"
+
+    release.set()
+    await blocker
+
+
+async def test_handler_errors_release_lane():
+    async def failing(event, data):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await chat_order_middleware(failing, _event(), {})
+
+    assert _chat_lanes == {}
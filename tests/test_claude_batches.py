@@ -0,0 +1,104 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from kazo.claude.client import BatchRequest, run_structured_batch, set_batch_backend
+from kazo.claude.local_batches import LocalBatchServer
+
+SCHEMA = {"type": "object", "properties": {"category": {"type": "string"}}}
+
+
+async def _categorize(params: dict) -> dict:
+    text = params["messages"][0]["content"][-1]["text"]
+    if text == "boom":
+        raise RuntimeError("model error")
+    return {"category": "dining" if "coffee" in text else "groceries"}
+
+
+@pytest.fixture
+def server():
+    srv = LocalBatchServer(_categorize, polls_until_ended=2)
+    set_batch_backend(srv)
+    yield srv
+    set_batch_backend(None)
+
+
+async def test_batch_maps_results_to_callbacks(server):
+    seen: dict[str, dict] = {}
+
+    def _collect(custom_id):
+        async def _cb(data):
+            seen[custom_id] = data
+
+        return _cb
+
+    requests = [
+        BatchRequest(custom_id="e1", prompt="coffee 4", json_schema=SCHEMA, on_result=_collect("e1")),
+        BatchRequest(custom_id="e2", prompt="milk 2", json_schema=SCHEMA, on_result=_collect("e2")),
+    ]
+    results = await run_structured_batch(requests, poll_interval=0)
+
+    assert results == {"e1": {"category": "dining"}, "e2": {"category": "groceries"}}
+    assert seen == results
+    assert len(server.submitted) == 1
+    params = server.submitted[0][0]["params"]
+    assert params["tool_choice"]["name"] == "structured_output"
+
+
+async def test_batch_errored_request_calls_on_error(server):
+    errors: list[str] = []
+
+    async def _on_error(msg):
+        errors.append(msg)
+
+    requests = [
+        BatchRequest(custom_id="ok", prompt="coffee", json_schema=SCHEMA),
+        BatchRequest(custom_id="bad", prompt="boom", json_schema=SCHEMA, on_error=_on_error),
+    ]
+    results = await run_structured_batch(requests, poll_interval=0)
+
+    assert results["ok"] == {"category": "dining"}
+    assert results["bad"] is None
+    assert errors and "model error" in errors[0]
+
+
+async def test_batch_callback_failure_does_not_abort(server):
+    async def _explode(data):
+        raise ValueError("callback bug")
+
+    requests = [
+        BatchRequest(custom_id="a", prompt="coffee", json_schema=SCHEMA, on_result=_explode),
+        BatchRequest(custom_id="b", prompt="milk", json_schema=SCHEMA),
+    ]
+    results = await run_structured_batch(requests, poll_interval=0)
+    assert results["b"] == {"category": "groceries"}
+
+
+async def test_batch_rejects_duplicate_ids(server):
+    requests = [
+        BatchRequest(custom_id="x", prompt="a", json_schema=SCHEMA),
+        BatchRequest(custom_id="x", prompt="b", json_schema=SCHEMA),
+    ]
+    with pytest.raises(ValueError, match="unique"):
+        await run_structured_batch(requests)
+
+
+async def test_batch_chunks_large_submissions(server):
+    requests = [BatchRequest(custom_id=str(i), prompt="milk", json_schema=SCHEMA) for i in range(5)]
+    with patch("kazo.claude.client.BATCH_MAX_REQUESTS", 2):
+        results = await run_structured_batch(requests, poll_interval=0)
+    assert len(results) == 5
+    assert [len(chunk) for chunk in server.submitted] == [2, 2, 1]
+
+
+@patch("kazo.claude.client._use_sdk", return_value=False)
+@patch("kazo.claude.client._ask_cli_structured", new_callable=AsyncMock)
+async def test_batch_falls_back_to_cli_without_api_key(mock_cli, _):
+    mock_cli.side_effect = [{"category": "dining"}, RuntimeError("cli down")]
+    requests = [
+        BatchRequest(custom_id="a", prompt="coffee", json_schema=SCHEMA),
+        BatchRequest(custom_id="b", prompt="milk", json_schema=SCHEMA),
+    ]
+    results = await run_structured_batch(requests)
+    assert results == {"a": {"category": "dining"}, "b": None}
+    assert mock_cli.call_count == 2
@@ -1,16 +1,23 @@
+import base64
 import json
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from kazo.claude.client import (
+    SDK_MODEL_MAP,
+    _ask_cli_structured,
     _ask_sdk,
     _ask_sdk_structured,
     _run_claude_once,
     _run_cli,
     ask_claude,
     ask_claude_structured,
+    model_for_task,
 )
+from kazo.config import settings
+from kazo.media import Media
 
 
 def _mock_proc(stdout: bytes, returncode: int = 0, stderr: bytes = b""):
@@ -91,7 +98,7 @@ async def test_retry_exhausted_raises(mock_exec, mock_sleep):
     mock_exec.return_value = fail_proc
 
     with pytest.raises(RuntimeError, match="persistent"):
-        await _run_cli(["-p", "test"])
+        await _run_cli(["-p", "test"], retries=1)
     assert mock_exec.call_count == 2
 
 
@@ -154,22 +161,46 @@ async def test_ask_sdk_structured_with_image(mock_get_client):
     mock_client.messages.create.return_value = _mock_tool_use_response({"total": 10.0})
     mock_get_client.return_value = mock_client
 
-    import tempfile
-    from pathlib import Path
+    media = Media(memoryview(b"\xff\xd8\xff\xe0fake jpeg"), "image/jpeg")
+    result = await _ask_sdk_structured("parse receipt", {"type": "object"}, media=media)
+    assert result == {"total": 10.0}
+    call_kwargs = mock_client.messages.create.call_args[1]
+    content = call_kwargs["messages"][0]["content"]
+    assert content[0]["type"] == "image"
+    assert base64.b64decode(content[0]["source"]["data"]) == b"\xff\xd8\xff\xe0fake jpeg"
+    assert content[1]["type"] == "text"
+
+
+@patch("kazo.claude.client._get_api_client")
+async def test_ask_sdk_structured_sends_pdf_as_document(mock_get_client):
+    mock_client = AsyncMock()
+    mock_client.messages.create.return_value = _mock_tool_use_response({"total": 10.0})
+    mock_get_client.return_value = mock_client
+
+    await _ask_sdk_structured("parse receipt", {"type": "object"}, media=Media(b"%PDF-1.4 fake", "application/pdf"))
+    content = mock_client.messages.create.call_args[1]["messages"][0]["content"]
+    assert content[0]["type"] == "document"
+    assert content[0]["source"]["media_type"] == "application/pdf"
+
+
+@patch("kazo.claude.client._run_cli", new_callable=AsyncMock)
+async def test_cli_structured_materializes_media_only_for_the_call(mock_run):
+    seen = {}
+
+    async def run(args, timeout=None):
+        path = args[1].removeprefix("Read the file at ").split(" and then:")[0]
+        seen["path"] = path
+        seen["data"] = Path(path).read_bytes()
+        return {"structured_output": {"total": 1.0}}
 
-    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
-        f.write(b"\xff\xd8\xff\xe0fake jpeg")
-        tmp_path = f.name
+    mock_run.side_effect = run
 
-    try:
-        result = await _ask_sdk_structured("parse receipt", {"type": "object"}, image_path=tmp_path)
-        assert result == {"total": 10.0}
-        call_kwargs = mock_client.messages.create.call_args[1]
-        content = call_kwargs["messages"][0]["content"]
-        assert content[0]["type"] == "image"
-        assert content[1]["type"] == "text"
-    finally:
-        Path(tmp_path).unlink(missing_ok=True)
+    result = await _ask_cli_structured("parse receipt", {"type": "object"}, media=Media(b"png bytes", "image/png"))
+
+    assert result == {"total": 1.0}
+    assert seen["path"].endswith(".png")
+    assert seen["data"] == b"png bytes"
+    assert not Path(seen["path"]).exists()
 
 
 @patch("kazo.claude.client._get_api_client")
@@ -190,7 +221,7 @@ async def test_ask_sdk_structured_no_tool_use_raises(mock_get_client):
 async def test_ask_claude_routes_to_sdk(mock_sdk, _):
     result = await ask_claude("hi")
     assert result == "sdk result"
-    mock_sdk.assert_called_once_with("hi", "")
+    mock_sdk.assert_called_once_with("hi", "", task=None)
 
 
 @patch("kazo.claude.client._use_sdk", return_value=False)
@@ -198,4 +229,30 @@ async def test_ask_claude_routes_to_sdk(mock_sdk, _):
 async def test_ask_claude_routes_to_cli(mock_cli, _):
     result = await ask_claude("hi")
     assert result == "cli result"
-    mock_cli.assert_called_once_with("hi", "")
+    mock_cli.assert_called_once_with("hi", "", task=None)
+
+
+# --- Model routing tests ---
+
+
+def test_model_for_task_uses_override():
+    with (
+        patch.object(settings, "claude_model", "sonnet"),
+        patch.object(settings, "claude_model_intent", "haiku"),
+        patch.object(settings, "claude_model_receipt", None),
+    ):
+        assert model_for_task("intent") == "haiku"
+        assert model_for_task("receipt") == "sonnet"
+        assert model_for_task("unknown") == "sonnet"
+        assert model_for_task() == "sonnet"
+
+
+@patch("kazo.claude.client._get_api_client")
+async def test_sdk_structured_uses_task_model(mock_get_client):
+    mock_client = AsyncMock()
+    mock_client.messages.create.return_value = _mock_tool_use_response({"intent": "undo"})
+    mock_get_client.return_value = mock_client
+
+    with patch.object(settings, "claude_model_intent", "haiku"):
+        await _ask_sdk_structured("undo", {"type": "object"}, task="intent")
+    assert mock_client.messages.create.call_args[1]["model"] == SDK_MODEL_MAP["haiku"]
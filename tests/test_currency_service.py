@@ -5,6 +5,7 @@ from kazo.services.currency_service import (
     _cache_rate,
     _get_cached_rate,
     get_rate,
+    get_rates,
     validate_currency,
 )
 
@@ -38,3 +39,9 @@ async def test_cache_roundtrip():
 async def test_cache_miss():
     cached = await _get_cached_rate("GBP", "EUR")
     assert cached is None
+
+
+async def test_get_rates_dedupes_currencies():
+    await _cache_rate("USD", "EUR", 0.92)
+    rates = await get_rates(["usd", "EUR", "USD"], "EUR")
+    assert rates == {"EUR": 1.0, "USD": 0.92}
@@ -0,0 +1,256 @@
+import asyncio
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from kazo.charts import Chart
+from kazo.currency import set_base_currency
+from kazo.db.database import get_db
+from kazo.db.models import Expense
+from kazo.handlers.digest import cmd_digest, send_digests
+from kazo.services.budget_service import set_budget
+from kazo.services.digest_service import (
+    build_digests,
+    digest_period,
+    digest_text,
+    due_chats,
+    get_digest_kinds,
+    set_digest,
+)
+from kazo.services.expense_service import save_expenses
+
+# A Monday: the last week is 24 Feb - 2 Mar 2025, the last month February 2025.
+TODAY = date(2025, 3, 3)
+
+
+def _exp(chat_id, amount, category="groceries", day=date(2025, 2, 26)) -> Expense:
+    return Expense(
+        id=None,
+        chat_id=chat_id,
+        user_id=1,
+        store="shop",
+        amount=amount,
+        original_currency="EUR",
+        amount_base=amount,
+        exchange_rate=1.0,
+        category=category,
+        items_json=None,
+        source="text",
+        expense_date=day.isoformat(),
+    )
+
+
+async def _subscribe(*chat_ids, kind="weekly"):
+    db = await get_db()
+    await db.executemany(
+        "INSERT INTO digest_subscriptions (chat_id, kind, last_period) VALUES (?, ?, NULL)",
+        [(chat_id, kind) for chat_id in chat_ids],
+    )
+    await db.commit()
+
+
+def _bot():
+    bot = AsyncMock()
+    bot.send_photo.return_value = MagicMock(photo=[MagicMock(file_id="file-1")])
+    return bot
+
+
+def test_weekly_period():
+    period = digest_period("weekly", TODAY)
+
+    assert (period.start, period.end) == (date(2025, 2, 24), date(2025, 3, 2))
+    assert period.previous_start == date(2025, 2, 17)
+    assert period.key == "2025-W09"
+    assert period.label == "24 Feb - 2 Mar 2025"
+    assert digest_period("weekly", TODAY + timedelta(days=6)).key == "2025-W09"
+
+
+def test_monthly_period_across_year():
+    period = digest_period("monthly", date(2025, 1, 15))
+
+    assert (period.start, period.end, period.previous_start) == (
+        date(2024, 12, 1),
+        date(2024, 12, 31),
+        date(2024, 11, 1),
+    )
+    assert period.key == "2024-12"
+    assert period.label == "December 2024"
+
+
+async def test_opt_in_starts_with_next_period():
+    await set_digest(1, "weekly", True)
+
+    assert await get_digest_kinds(1) == ["weekly"]
+    assert await due_chats(digest_period("weekly")) == []
+    assert await due_chats(digest_period("weekly", date.today() + timedelta(days=7))) == [1]
+
+    await set_digest(1, "weekly", False)
+    assert await get_digest_kinds(1) == []
+
+
+async def test_build_digests_for_many_chats():
+    await save_expenses(
+        [
+            _exp(1, 30.0),
+            _exp(1, 20.0),
+            _exp(1, 15.0, "dining", date(2025, 3, 2)),
+            _exp(1, 40.0, day=date(2025, 2, 20)),  # the week before
+            _exp(1, 99.0, day=date(2025, 3, 3)),  # after the period
+            _exp(2, 12.0, "transport"),
+        ]
+    )
+    await set_budget(1, 100.0, "groceries")
+    await set_base_currency(2, "USD")
+
+    digests = await build_digests([1, 2, 3], digest_period("weekly", TODAY))
+
+    first = digests[1]
+    assert [(c["category"], c["total"], c["count"]) for c in first.categories] == [
+        ("groceries", 50.0, 2),
+        ("dining", 15.0, 1),
+    ]
+    assert first.total == 65.0
+    assert first.previous_total == 40.0
+    assert [(b["category"], b["spent"]) for b in first.budgets] == [("groceries", 99.0)]  # March, the week ends in it
+    assert first.base == "EUR"
+    assert digests[2].base == "USD"
+    assert digests[2].total == 12.0
+    assert digests[3].categories == []
+
+
+async def test_digest_text():
+    await save_expenses([_exp(1, 60.0), _exp(1, 40.0, day=date(2025, 2, 20))])
+    await set_budget(1, 100.0, "groceries")
+    period = digest_period("weekly", TODAY)
+
+    text = digest_text((await build_digests([1], period))[1], period)
+
+    assert text.startswith("📬 Weekly digest — 24 Feb - 2 Mar 2025")
+    assert "Total: €60.00 (1 expenses), ↑ 50% vs the week before" in text
+    assert "groceries: €60.00 (1)" in text
+    assert "💰 Budget — March:" in text
+
+
+@patch("kazo.handlers.digest.settings.digest_send_interval", 0)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock)
+async def test_send_digests_batches_and_claims(mock_chart):
+    mock_chart.side_effect = lambda data, cur: Chart(f"key-{data[0]['total']}", b"png")
+    await save_expenses([_exp(1, 30.0), _exp(2, 20.0)])
+    await _subscribe(1, 2, 3)
+    bot = _bot()
+
+    with patch("kazo.handlers.digest.settings.digest_batch_size", 2):
+        assert await send_digests(bot, "weekly", TODAY) == 2
+
+    assert [c.args[0] for c in bot.send_photo.call_args_list] == [1, 2]
+    assert "Weekly digest" in bot.send_photo.call_args.kwargs["caption"]
+    assert await due_chats(digest_period("weekly", TODAY)) == []
+    assert await send_digests(bot, "weekly", TODAY) == 0
+    assert bot.send_photo.await_count == 2
+
+
+@patch("kazo.handlers.digest.settings.digest_send_interval", 0)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock, return_value=None)
+async def test_send_digests_unsubscribes_blocked_chat(mock_chart):
+    await save_expenses([_exp(1, 30.0)])
+    await _subscribe(1)
+    await _subscribe(1, kind="monthly")
+    bot = _bot()
+    bot.send_message.side_effect = TelegramForbiddenError(method=MagicMock(), message="bot was blocked")
+
+    assert await send_digests(bot, "weekly", TODAY) == 0
+    assert await get_digest_kinds(1) == []
+
+
+@patch("kazo.handlers.digest.asyncio.sleep", new_callable=AsyncMock)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock, return_value=None)
+async def test_send_digests_waits_out_flood_control(mock_chart, mock_sleep):
+    await save_expenses([_exp(1, 30.0)])
+    await _subscribe(1)
+    bot = _bot()
+    bot.send_message.side_effect = [TelegramRetryAfter(method=MagicMock(), message="flood", retry_after=3), None]
+
+    assert await send_digests(bot, "weekly", TODAY) == 1
+    assert bot.send_message.await_count == 2
+    mock_sleep.assert_any_await(3)
+
+
+@patch("kazo.handlers.digest.settings.digest_send_interval", 0)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock, return_value=None)
+async def test_failed_send_is_retried_next_run(mock_chart):
+    await save_expenses([_exp(1, 30.0)])
+    await _subscribe(1)
+    bot = _bot()
+    bot.send_message.side_effect = RuntimeError("network down")
+
+    assert await send_digests(bot, "weekly", TODAY) == 0
+    assert await due_chats(digest_period("weekly", TODAY)) == [1]
+
+    bot.send_message.side_effect = None
+    assert await send_digests(bot, "weekly", TODAY) == 1
+
+
+@patch("kazo.handlers.digest.settings.digest_send_interval", 0)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock, return_value=None)
+async def test_failing_chat_is_retried_only_a_few_times(mock_chart):
+    await save_expenses([_exp(1, 30.0)])
+    await _subscribe(1)
+    bot = _bot()
+    bot.send_message.side_effect = RuntimeError("chat gone")
+
+    with patch("kazo.services.digest_service.settings.digest_max_attempts", 2):
+        assert await send_digests(bot, "weekly", TODAY) == 0
+        assert await due_chats(digest_period("weekly", TODAY)) == [1]
+        assert await send_digests(bot, "weekly", TODAY) == 0
+        assert await due_chats(digest_period("weekly", TODAY)) == []  # given up until next week
+
+    assert bot.send_message.await_count == 2
+
+
+@patch("kazo.handlers.digest.claim_digest", new_callable=AsyncMock, return_value=False)
+@patch("kazo.handlers.digest.spending_by_category_chart", new_callable=AsyncMock)
+async def test_started_renders_are_not_cancelled(mock_chart, mock_claim):
+    finished = []
+
+    async def render(data, currency):
+        await asyncio.sleep(0.02)
+        finished.append(data[0]["total"])
+        return Chart("key", b"png")
+
+    mock_chart.side_effect = render
+    await save_expenses([_exp(1, 30.0), _exp(2, 20.0)])
+    await _subscribe(1, 2)
+
+    assert await send_digests(_bot(), "weekly", TODAY) == 0  # another replica claimed both
+
+    assert sorted(finished) == [20.0, 30.0]
+
+
+async def test_cmd_digest_toggles():
+    msg = AsyncMock()
+    msg.chat.id = 5
+
+    msg.text = "/digest both"
+    await cmd_digest(msg)
+    assert await get_digest_kinds(5) == ["weekly", "monthly"]
+
+    msg.text = "/digest weekly off"
+    await cmd_digest(msg)
+    assert await get_digest_kinds(5) == ["monthly"]
+    assert msg.answer.call_args.args[0].startswith("📬 Digests on: monthly")
+
+    msg.text = "/digest off"
+    await cmd_digest(msg)
+    assert await get_digest_kinds(5) == []
+    assert msg.answer.call_args.args[0] == "📬 Digests off."
+
+
+async def test_cmd_digest_rejects_unknown_kind():
+    msg = AsyncMock()
+    msg.chat.id = 5
+    msg.text = "/digest daily"
+
+    await cmd_digest(msg)
+
+    assert msg.answer.call_args.args[0].startswith("Usage: /digest")
@@ -1,12 +1,17 @@
 from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from kazo.db.models import Expense
+from kazo.handlers.common import handle_edit_reply
 from kazo.services.expense_service import (
     get_expense_by_bot_message,
     get_expense_by_id,
+    get_group_expenses_by_bot_message,
     get_last_expense,
     link_bot_message,
+    link_group_message,
     save_expense,
+    save_expenses,
     update_expense,
 )
 
@@ -80,6 +85,15 @@ async def test_link_and_get_bot_message():
     assert result["id"] == exp_id
 
 
+async def test_link_and_get_group_message():
+    first, second = await save_expenses([_make_expense(amount=10.0), _make_expense(amount=20.0)])
+    await link_group_message(chat_id=1, bot_message_id=600, expense_ids={1: first, 3: second})
+
+    result = await get_group_expenses_by_bot_message(chat_id=1, bot_message_id=600)
+    assert {n: e["id"] for n, e in result.items()} == {1: first, 3: second}
+    assert await get_group_expenses_by_bot_message(chat_id=2, bot_message_id=600) == {}
+
+
 async def test_get_bot_message_not_found():
     result = await get_expense_by_bot_message(chat_id=1, bot_message_id=9999)
     assert result is None
@@ -96,3 +110,38 @@ async def test_get_last_expense():
 async def test_get_last_expense_empty():
     result = await get_last_expense(chat_id=9999)
     assert result is None
+
+
+def _reply(text: str, bot_message_id: int = 600):
+    msg = AsyncMock()
+    msg.chat.id = 1
+    msg.text = text
+    msg.reply_to_message = MagicMock(message_id=bot_message_id)
+    msg.reply_to_message.from_user.is_bot = True
+    return msg
+
+
+@patch("kazo.handlers.common.get_categories_str", new_callable=AsyncMock, return_value="groceries, dining")
+@patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock, return_value={"category": "dining"})
+async def test_reply_edits_numbered_group_entry(mock_claude, mock_base, mock_cats):
+    first, second = await save_expenses([_make_expense(), _make_expense()])
+    await link_group_message(chat_id=1, bot_message_id=600, expense_ids={1: first, 2: second})
+
+    await handle_edit_reply(_reply("#2 that was dinner"))
+
+    assert mock_claude.call_args.kwargs["prompt"] == "that was dinner"
+    assert (await get_expense_by_id(second))["category"] == "dining"
+    assert (await get_expense_by_id(first))["category"] == "groceries"
+
+
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock)
+async def test_reply_to_group_asks_which_entry(mock_claude):
+    first, second = await save_expenses([_make_expense(), _make_expense()])
+    await link_group_message(chat_id=1, bot_message_id=600, expense_ids={1: first, 2: second})
+    msg = _reply("that was dinner")
+
+    await handle_edit_reply(msg)
+
+    mock_claude.assert_not_called()
+    assert msg.answer.call_args.args[0].startswith("Which one? Start your reply with its number (#1, #2)")
@@ -1,7 +1,18 @@
+import json
+import sqlite3
 from datetime import date
 
+import pytest
+
 from kazo.db.models import Expense
-from kazo.services.expense_service import delete_last_expense, detect_recurring, get_expenses, save_expense
+from kazo.services.expense_service import (
+    delete_last_expense,
+    detect_recurring,
+    get_expense_items,
+    get_expenses,
+    save_expense,
+    save_expenses,
+)
 
 
 def _make_expense(**overrides) -> Expense:
@@ -90,3 +101,17 @@ async def test_detect_recurring_not_enough():
 async def test_detect_recurring_no_store():
     assert await detect_recurring(1, "", 10.0) is False
     assert await detect_recurring(1, None, 10.0) is False
+
+
+async def test_save_expenses_in_one_transaction():
+    items = json.dumps([{"name": "Milk", "price": 1.2}])
+    ids = await save_expenses([_make_expense(store="A", items_json=items), _make_expense(store="B")])
+    assert len(ids) == 2
+    assert sorted(r["store"] for r in await get_expenses(chat_id=1)) == ["A", "B"]
+    assert len(await get_expense_items(ids[0])) == 1
+
+
+async def test_save_expenses_rolls_back_on_failure():
+    with pytest.raises(sqlite3.IntegrityError):
+        await save_expenses([_make_expense(store="A"), _make_expense(store="B", source=None)])
+    assert await get_expenses(chat_id=1) == []
@@ -0,0 +1,200 @@
+import io
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from kazo.db.database import get_db
+from kazo.db.models import Expense, ReceiptFingerprint
+from kazo.handlers.pending import PendingExpense, _dump_pending, _load_pending
+from kazo.handlers.receipts import handle_receipt_photo, receipt_jobs
+from kazo.media import Media
+from kazo.services.expense_service import delete_last_expense, save_expense
+from kazo.services.fingerprint_service import (
+    find_duplicate,
+    find_similar,
+    fingerprint,
+    hamming,
+    perceptual_hash,
+)
+
+
+@pytest.fixture(autouse=True)
+async def stop_receipt_jobs():
+    yield
+    await receipt_jobs.stop()
+
+
+def _draw_receipt(lines: list[str]) -> Image.Image:
+    image = Image.new("RGB", (300, 600), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.rectangle((20, 40 + i * 60, 20 + len(line) * 12, 70 + i * 60), fill="black")
+    return image
+
+
+def _encode(image: Image.Image, fmt="PNG") -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, fmt)
+    return buf.getvalue()
+
+
+def _receipt_image(lines: list[str]) -> bytes:
+    return _encode(_draw_receipt(lines))
+
+
+def _expense(chat_id=1, store="Lidl") -> Expense:
+    return Expense(
+        id=None,
+        chat_id=chat_id,
+        user_id=1,
+        store=store,
+        amount=12.5,
+        original_currency="EUR",
+        amount_base=12.5,
+        exchange_rate=1.0,
+        category="groceries",
+        items_json=None,
+        source="receipt",
+        expense_date="2025-01-15",
+    )
+
+
+def test_perceptual_hash_survives_recompression():
+    image = _draw_receipt(["milk", "bread and butter", "total"])
+    original = _encode(image)
+    resized = _encode(image.resize((150, 300)), "JPEG")
+    other = _receipt_image(["a very long first line here", "x", "", "y", "total 99"])
+
+    assert hamming(perceptual_hash(original), perceptual_hash(resized)) <= 4
+    assert hamming(perceptual_hash(original), perceptual_hash(other)) > 7
+
+
+def test_fingerprint_pdf_has_no_perceptual_hash():
+    fp = fingerprint(Media(b"%PDF-1.4", "application/pdf"))
+
+    assert fp.phash is None
+    assert len(fp.sha256) == 64
+
+
+def test_perceptual_hash_unreadable_image():
+    assert perceptual_hash(b"not an image") is None
+
+
+async def test_find_duplicate_exact_only():
+    fp = fingerprint(Media(_receipt_image(["milk", "total"]), "image/png"))
+    expense_id = await save_expense(_expense(), fp)
+
+    assert (await find_duplicate(1, ReceiptFingerprint(fp.sha256)))["id"] == expense_id
+    assert await find_duplicate(1, ReceiptFingerprint("other", fp.phash)) is None
+    assert await find_duplicate(2, fp) is None  # other chat
+
+
+async def test_find_similar():
+    fp = fingerprint(Media(_receipt_image(["milk", "total"]), "image/png"))
+    expense_id = await save_expense(_expense(), fp)
+
+    near = ReceiptFingerprint("other", fp.phash ^ 0b1011)  # 3 bits off
+    assert (await find_similar(1, near))["id"] == expense_id
+    assert await find_similar(1, near, max_distance=2) is None
+    assert await find_similar(2, near) is None  # other chat
+    assert await find_similar(1, ReceiptFingerprint("other", fp.phash ^ 0xFF00FF)) is None
+
+
+async def test_fingerprint_high_bit_roundtrip():
+    fp = ReceiptFingerprint("abc", (1 << 63) | 5)
+    expense_id = await save_expense(_expense(), fp)
+
+    assert (await find_similar(1, ReceiptFingerprint("x", (1 << 63) | 4)))["id"] == expense_id
+
+
+async def test_fingerprint_removed_with_expense():
+    await save_expense(_expense(), ReceiptFingerprint("abc", 42))
+    await delete_last_expense(1)
+
+    db = await get_db()
+    cursor = await db.execute("SELECT COUNT(*) FROM receipt_fingerprints")
+    assert (await cursor.fetchone())[0] == 0
+
+
+def test_pending_keeps_fingerprint():
+    pending = PendingExpense(expense=_expense(), display_text="x", fingerprint=ReceiptFingerprint("abc", 7))
+
+    assert _load_pending(_dump_pending(pending)).fingerprint == ReceiptFingerprint("abc", 7)
+
+
+def _make_photo_message():
+    msg = AsyncMock()
+    msg.chat.id = 1
+    msg.from_user = MagicMock()
+    msg.from_user.id = 1
+    msg.media_group_id = None
+    msg.answer.return_value = MagicMock(message_id=500)
+    msg.photo = [MagicMock(file_id="photo123")]
+    return msg
+
+
+def _make_bot(data: bytes):
+    bot = AsyncMock()
+    bot.get_file.return_value = MagicMock(file_path="photos/file.jpg")
+
+    async def download(path, destination):
+        destination.write(data)
+
+    bot.download_file.side_effect = download
+    return bot
+
+
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+async def test_duplicate_receipt_skips_extraction(mock_claude, mock_base):
+    data = _receipt_image(["milk", "bread", "total"])
+    expense_id = await save_expense(_expense(), fingerprint(Media(data, "image/jpeg")))
+    bot = _make_bot(data)
+
+    await handle_receipt_photo(_make_photo_message(), bot)
+    await receipt_jobs.join()
+
+    mock_claude.assert_not_called()
+    final = bot.edit_message_text.call_args.args[0]
+    assert "Already logged: Lidl" in final
+    assert f"expense #{expense_id}" in final
+
+
+def _store_receipt(total: str, day: str) -> bytes:
+    """The same store's receipt layout with different contents."""
+    image = Image.new("RGB", (300, 600), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.rectangle((20, 20, 280, 60), fill="black")
+    for i, line in enumerate(["LIDL", day, "milk        1.29", "bread       2.10", f"TOTAL  {total}"]):
+        draw.text((30, 90 + i * 40), line, fill="black", font=font)
+    return _encode(image, "JPEG")
+
+
+@patch("kazo.handlers.pending.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(31.4, 1.0))
+@patch("kazo.handlers.receipts._classify_image", new_callable=AsyncMock, return_value="receipt")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+async def test_same_layout_receipt_is_extracted(mock_claude, mock_classify, mock_convert, mock_base, mock_pbase):
+    first = _store_receipt("12.50", "2025-01-15")
+    second = _store_receipt("31.40", "2025-01-22")
+    assert hamming(perceptual_hash(first), perceptual_hash(second)) <= 4  # the layout is all the hash sees
+    expense_id = await save_expense(_expense(), fingerprint(Media(first, "image/jpeg")))
+    mock_claude.return_value = {
+        "store": "Lidl",
+        "total": 31.4,
+        "currency": "EUR",
+        "category": "groceries",
+        "expense_date": "2025-01-22",
+    }
+    msg = _make_photo_message()
+
+    await handle_receipt_photo(msg, _make_bot(second))
+    await receipt_jobs.join()
+
+    mock_claude.assert_awaited_once()
+    confirmation = msg.answer.call_args_list[-1].args[0]
+    assert "31.40" in confirmation
+    assert f"Looks like expense #{expense_id}" in confirmation
@@ -0,0 +1,195 @@
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from kazo.db.models import Expense
+from kazo.handlers.summary import cmd_forecast
+from kazo.services import forecast_service
+from kazo.services.budget_service import set_budget
+from kazo.services.expense_service import save_expenses
+from kazo.services.forecast_service import fit_trends, forecast, get_model, subscription_charges
+from kazo.services.stats_service import data_version
+from kazo.services.subscription_service import add_subscription, remove_subscription
+
+CHAT = 1
+# Mid-quarter, mid-month: 15 days left in May, 45 in Q2.
+TODAY = date(2025, 5, 16)
+
+
+@pytest.fixture(autouse=True)
+def clear_models():
+    forecast_service._models.clear()
+    yield
+    forecast_service._models.clear()
+
+
+def _exp(amount, category="groceries", day=TODAY, store="shop") -> Expense:
+    return Expense(
+        id=None,
+        chat_id=CHAT,
+        user_id=1,
+        store=store,
+        amount=amount,
+        original_currency="EUR",
+        amount_base=amount,
+        exchange_rate=1.0,
+        category=category,
+        items_json=None,
+        source="text",
+        expense_date=day.isoformat(),
+    )
+
+
+def _daily(amount, days, category="groceries", store="shop") -> list[Expense]:
+    return [_exp(amount, category, TODAY - timedelta(days=ago), store) for ago in range(days)]
+
+
+def _sub(frequency="monthly", billing_day=None, created_at="2025-01-10 09:00:00", amount=10.0) -> dict:
+    return {
+        "frequency": frequency,
+        "billing_day": billing_day,
+        "created_at": created_at,
+        "amount_base": amount,
+        "category": "subscriptions",
+    }
+
+
+def test_fit_trends_recovers_level_and_slope():
+    n_days = 60
+    offsets = np.arange(n_days)
+    totals = 10 + 0.5 * (n_days - 1 - offsets)  # rising half a unit a day, 39.5 on the last day
+
+    level, slope = fit_trends(offsets, np.zeros(n_days, dtype=np.intp), totals, n_days, 1)
+
+    assert level[0] == pytest.approx(39.5)
+    assert slope[0] == pytest.approx(0.5)
+
+
+def test_fit_trends_short_history_has_no_slope():
+    offsets = np.arange(5)
+    level, slope = fit_trends(offsets, np.zeros(5, dtype=np.intp), np.full(5, 8.0), 5, 1)
+
+    assert level[0] == pytest.approx(8.0)
+    assert slope[0] == 0
+
+
+def test_monthly_subscription_charges_on_billing_day():
+    assert subscription_charges(_sub(billing_day=20), TODAY, date(2025, 5, 31)) == 10.0
+    assert subscription_charges(_sub(billing_day=3), TODAY, date(2025, 5, 31)) == 0.0
+    assert subscription_charges(_sub(billing_day=3), TODAY, date(2025, 6, 30)) == 10.0
+
+
+def test_monthly_subscription_defaults_to_day_added_and_clamps():
+    assert subscription_charges(_sub(), TODAY, date(2025, 6, 30)) == 10.0  # 10 June
+    assert subscription_charges(_sub(billing_day=31), TODAY, date(2025, 6, 30)) == 20.0  # 31 May, 30 June
+
+
+def test_yearly_and_weekly_subscription_charges():
+    assert subscription_charges(_sub("yearly", created_at="2024-06-01"), TODAY, date(2025, 6, 30)) == 10.0
+    assert subscription_charges(_sub("yearly", created_at="2024-09-01"), TODAY, date(2025, 6, 30)) == 0.0
+    assert subscription_charges(_sub("weekly", amount=7.0), TODAY, date(2025, 5, 30)) == 14.0
+
+
+async def test_forecast_projects_month_and_quarter():
+    await save_expenses(_daily(10.0, 60))
+    await set_budget(CHAT, 400.0, "groceries")
+
+    result = await forecast(CHAT, TODAY)
+
+    month = result["month"]
+    assert month["label"] == "May 2025"
+    assert month["days_left"] == 15
+    [groceries] = month["categories"]
+    assert groceries["spent"] == 160.0
+    assert groceries["projected"] == pytest.approx(310.0)
+    assert groceries["pct"] == pytest.approx(77.5)
+
+    quarter = result["quarter"]
+    assert quarter["label"] == "Q2 2025"
+    assert quarter["days_left"] == 45
+    assert quarter["categories"][0]["projected"] == pytest.approx(910.0)
+    assert quarter["categories"][0]["budget"] == 1200.0
+
+
+async def test_forecast_adds_subscriptions_without_double_counting():
+    await save_expenses([*_daily(10.0, 60), _exp(15.0, "subscriptions", date(2025, 5, 1), store="Netflix")])
+    await add_subscription(CHAT, "Netflix", 15.0, "EUR", 15.0, category="subscriptions", billing_day=1)
+
+    result = await forecast(CHAT, TODAY)
+
+    month_subs = next(r for r in result["month"]["categories"] if r["category"] == "subscriptions")
+    assert month_subs["projected"] == pytest.approx(15.0)
+    quarter_subs = next(r for r in result["quarter"]["categories"] if r["category"] == "subscriptions")
+    assert quarter_subs["projected"] == pytest.approx(30.0)
+    assert result["month"]["total"]["projected"] == pytest.approx(325.0)
+
+
+async def test_forecast_lists_budgeted_category_without_spending():
+    await save_expenses(_daily(10.0, 30))
+    await set_budget(CHAT, 100.0, "dining")
+    await set_budget(CHAT, 500.0)
+
+    result = await forecast(CHAT, TODAY)
+
+    dining = next(r for r in result["month"]["categories"] if r["category"] == "dining")
+    assert dining["projected"] == 0
+    assert result["month"]["total"]["budget"] == 500.0
+
+
+async def test_data_version_bumped_by_changes():
+    assert await data_version(CHAT) == 0
+
+    await save_expenses([_exp(5.0)])
+    after_expense = await data_version(CHAT)
+    await add_subscription(CHAT, "Gym", 30.0, "EUR", 30.0)
+    after_sub = await data_version(CHAT)
+    await remove_subscription(CHAT, "Gym")
+
+    assert 0 < after_expense < after_sub < await data_version(CHAT)
+    assert await data_version(CHAT + 1) == 0
+
+
+async def test_model_cached_until_data_changes():
+    await save_expenses(_daily(10.0, 30))
+
+    with patch.object(forecast_service, "_fit_model", wraps=forecast_service._fit_model) as fit:
+        first = await get_model(CHAT, TODAY)
+        assert await get_model(CHAT, TODAY) is first
+        assert fit.await_count == 1
+
+        await save_expenses([_exp(50.0)])
+        refitted = await get_model(CHAT, TODAY)
+        assert refitted is not first
+        assert fit.await_count == 2
+
+        await get_model(CHAT, TODAY + timedelta(days=1))
+        assert fit.await_count == 3
+
+
+@patch("kazo.handlers.summary.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+async def test_cmd_forecast(mock_base):
+    today = date.today()
+    await save_expenses([_exp(10.0, day=today - timedelta(days=ago)) for ago in range(30)])
+    await set_budget(CHAT, 200.0, "groceries")
+    msg = AsyncMock()
+    msg.chat.id = CHAT
+    msg.from_user = MagicMock()
+
+    await cmd_forecast(msg)
+
+    text = msg.answer.call_args.args[0]
+    assert text.startswith("🔮 Forecast")
+    assert "groceries" in text
+    assert "⚠️" in text
+
+
+async def test_cmd_forecast_without_data():
+    await set_budget(CHAT, 200.0, "groceries")
+    msg = AsyncMock()
+    msg.chat.id = CHAT
+
+    await cmd_forecast(msg)
+
+    assert msg.answer.call_args.args[0] == "Not enough data to forecast yet."
@@ -0,0 +1,171 @@
+import io
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from kazo.db.database import get_db
+from kazo.handlers.export import cmd_import
+from kazo.services.import_service import PRESETS, ImportFormatError, import_csv, parse_amount
+
+CHAT = 100
+
+KAZO_CSV = """Date,Store,Category,Amount,Currency,Amount EUR,Source,Note
+2025-01-15,Lidl,groceries,50.00,EUR,50.00,text,
+2025-01-16,Diner,dining,20.00,USD,18.00,text,
+2025-01-17,Cafe,coffee,4.50,USD,4.05,text,
+not-a-date,Broken,other,1,EUR,1,text,
+2025-01-18,Shop,shopping,9.99,XYZ,9.99,text,
+"""
+
+REVOLUT_CSV = """Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance
+CARD_PAYMENT,Current,2025-02-01 10:00:00,2025-02-01 10:01:00,Tesco,-12.40,0,GBP,COMPLETED,100
+TOPUP,Current,2025-02-02 09:00:00,2025-02-02 09:00:00,Top-up,200.00,0,GBP,COMPLETED,300
+"""
+
+
+async def _rows(chat_id=CHAT):
+    db = await get_db()
+    cursor = await db.execute(
+        "SELECT store, amount, original_currency, amount_base, category, source, expense_date "
+        "FROM expenses WHERE chat_id = ? ORDER BY expense_date",
+        (chat_id,),
+    )
+    return [dict(r) for r in await cursor.fetchall()]
+
+
+def test_parse_amount_formats():
+    assert parse_amount("1,234.50") == 1234.5
+    assert parse_amount("1.234,50", decimal=",") == 1234.5
+    assert parse_amount(" -12.40 ") == -12.4
+
+
+@patch("kazo.services.import_service.get_rate", new_callable=AsyncMock, return_value=0.9)
+async def test_import_kazo_preset(mock_rate):
+    result = await import_csv(io.StringIO(KAZO_CSV), CHAT, 1, PRESETS["kazo"])
+
+    assert result.rows == 5
+    assert result.imported == 3
+    assert result.errors == {"unknown currency": 1, "unparseable": 1}
+    rows = await _rows()
+    assert [r["store"] for r in rows] == ["Lidl", "Diner", "Cafe"]
+    assert rows[1]["amount_base"] == 18.0
+    # Unknown categories fall back to "other"; every row is tagged as imported.
+    assert rows[2]["category"] == "other"
+    assert {r["source"] for r in rows} == {"import"}
+
+
+@patch("kazo.services.import_service.get_rate", new_callable=AsyncMock, return_value=0.9)
+async def test_import_fetches_each_rate_once(mock_rate):
+    await import_csv(io.StringIO(KAZO_CSV), CHAT, 1, PRESETS["kazo"])
+
+    # EUR->EUR and USD->EUR, each looked up once despite two USD rows.
+    assert mock_rate.await_count == 2
+
+
+@patch("kazo.services.import_service.get_rate", new_callable=AsyncMock, return_value=1.15)
+async def test_import_revolut_skips_income(mock_rate):
+    result = await import_csv(io.StringIO(REVOLUT_CSV), CHAT, 1, PRESETS["revolut"])
+
+    assert result.imported == 1
+    assert result.errors == {"income": 1}
+    rows = await _rows()
+    assert rows[0]["amount"] == 12.4
+    assert rows[0]["expense_date"] == "2025-02-01"
+    assert rows[0]["amount_base"] == 14.26
+
+
+async def test_import_commits_in_batches():
+    lines = ["date,amount,description"] + [f"2025-03-{d:02d},{d}.00,Item {d}" for d in range(1, 8)]
+    seen = []
+
+    async def progress(result):
+        seen.append(result.imported)
+
+    result = await import_csv(io.StringIO("\n".join(lines)), CHAT, 1, PRESETS["generic"], progress, batch_size=3)
+
+    assert result.imported == 7
+    assert seen == [3, 6]
+    assert len(await _rows()) == 7
+
+
+async def test_import_missing_column():
+    with pytest.raises(ImportFormatError):
+        await import_csv(io.StringIO("when,how much\n2025-01-01,5\n"), CHAT, 1, PRESETS["kazo"])
+
+
+def _make_import_message(caption="/import", file_name="history.csv"):
+    msg = AsyncMock()
+    msg.chat.id = CHAT
+    msg.from_user = MagicMock()
+    msg.from_user.id = 1
+    msg.text = None
+    msg.caption = caption
+    msg.document = MagicMock()
+    msg.document.file_name = file_name
+    msg.document.mime_type = "text/csv"
+    msg.document.file_id = "doc1"
+    return msg
+
+
+def _make_csv_bot(content: str):
+    bot = AsyncMock()
+    bot.get_file.return_value = MagicMock(file_path="documents/history.csv")
+
+    async def download_file(path, destination):
+        destination.write(content.encode("utf-8-sig"))
+
+    bot.download_file.side_effect = download_file
+    return bot
+
+
+async def test_cmd_import_reports_rate():
+    msg = _make_import_message("/import generic")
+    status = AsyncMock()
+    msg.answer.return_value = status
+    bot = _make_csv_bot("date,amount,description\n2025-04-01,3.20,Bakery\n2025-04-02,7.00,Pharmacy\n")
+
+    await cmd_import(msg, bot)
+
+    final = status.edit_text.await_args.args[0]
+    assert "Imported 2 of 2 rows" in final
+    assert "rows/s" in final
+    assert len(await _rows()) == 2
+
+
+@patch("kazo.services.import_service.settings.import_batch_size", 1)
+@patch("kazo.services.import_service.get_rate", new_callable=AsyncMock)
+async def test_cmd_import_reports_rows_saved_before_rate_failure(mock_rate):
+    mock_rate.side_effect = [1.0, httpx.ConnectError("offline")]
+    msg = _make_import_message("/import generic")
+    status = AsyncMock()
+    msg.answer.return_value = status
+    bot = _make_csv_bot(
+        "date,amount,description,currency\n2025-04-01,3.20,Bakery,EUR\n2025-04-02,7.00,Pharmacy,EUR\n"
+        "2025-04-03,9.00,Duty free,USD\n"
+    )
+
+    await cmd_import(msg, bot)
+
+    final = status.edit_text.await_args.args[0]
+    assert "Import stopped after 2 of 3 rows: couldn't get the USD exchange rate" in final
+    assert len(await _rows()) == 2
+
+
+async def test_cmd_import_unknown_preset():
+    msg = _make_import_message("/import mybank")
+
+    await cmd_import(msg, _make_csv_bot(""))
+
+    assert "Unknown preset" in msg.answer.call_args.args[0]
+
+
+async def test_cmd_import_without_document():
+    msg = _make_import_message()
+    msg.document = None
+    msg.reply_to_message = None
+    msg.text = "/import"
+
+    await cmd_import(msg, _make_csv_bot(""))
+
+    assert "Send a CSV file" in msg.answer.call_args.args[0]
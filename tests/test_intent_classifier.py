@@ -1,6 +1,8 @@
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from kazo.handlers.common import _classify_intent, _handle_conversational_intent, handle_text_expense
+from kazo.intent import classify_local, predict
+from kazo.intent.classifier import EVAL_PATH, LOCAL_INTENTS, load_training_examples, train
 
 
 def _make_message(text, has_user=True):
@@ -53,7 +55,7 @@ async def test_conversational_chat(mock_claude):
 @patch("kazo.handlers.common._classify_intent")
 async def test_no_number_triggers_classifier(mock_classify):
     mock_classify.return_value = {"intent": "chat"}
-    msg = _make_message("hello there")
+    msg = _make_message("hmm, what about the thing from last tuesday")
     with patch("kazo.handlers.common.ask_claude", return_value="Hi!"):
         await handle_text_expense(msg)
     mock_classify.assert_called_once()
@@ -62,16 +64,20 @@ async def test_no_number_triggers_classifier(mock_classify):
 @patch("kazo.handlers.common.ask_claude_structured")
 async def test_number_skips_classifier(mock_structured):
     mock_structured.return_value = {
-        "amount": 50,
-        "currency": "EUR",
-        "category": "groceries",
-        "description": "Groceries",
-        "expense_date": "2025-03-15",
+        "expenses": [
+            {
+                "amount": 50,
+                "currency": "EUR",
+                "category": "groceries",
+                "description": "Groceries",
+                "expense_date": "2025-03-15",
+            }
+        ]
     }
     msg = _make_message("spent 50 on groceries")
     with (
         patch("kazo.handlers.common.store_pending", new_callable=AsyncMock),
-        patch("kazo.handlers.common.convert_to_base", new_callable=AsyncMock, return_value=(50.0, 1.0)),
+        patch("kazo.handlers.common.get_rates", new_callable=AsyncMock, return_value={"EUR": 1.0}),
         patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR"),
         patch("kazo.handlers.common.get_categories", return_value=["groceries"]),
     ):
@@ -85,6 +91,69 @@ async def test_number_skips_classifier(mock_structured):
 @patch("kazo.handlers.common._classify_intent")
 async def test_classifier_error_silently_ignored(mock_classify):
     mock_classify.side_effect = RuntimeError("Claude error")
-    msg = _make_message("hello")
+    msg = _make_message("hmm, not sure about that")
     await handle_text_expense(msg)
     msg.answer.assert_not_called()
+
+
+@patch("kazo.handlers.common.cmd_undo", new_callable=AsyncMock)
+@patch("kazo.handlers.common._classify_intent")
+async def test_confident_local_intent_skips_claude(mock_classify, mock_undo):
+    msg = _make_message("undo that")
+    await handle_text_expense(msg)
+    mock_classify.assert_not_called()
+    mock_undo.assert_called_once_with(msg)
+
+
+def test_local_classifier_rules():
+    assert classify_local("Undo that!") == {"intent": "undo"}
+    assert classify_local("show my subs") == {"intent": "subscriptions"}
+    assert classify_local("categories") == {"intent": "categories"}
+
+
+def test_local_classifier_defers_intents_needing_args():
+    assert predict("how much were tomatoes last time?").intent == "price"
+    assert classify_local("how much were tomatoes last time?") is None
+
+
+def test_local_classifier_defers_unknown_text():
+    assert classify_local("zxqv blorp") is None
+
+
+def test_local_classifier_defers_negated_text():
+    assert classify_local("dont undo that") is None
+    assert classify_local("don't delete it") is None
+    assert classify_local("no, not the categories") is None
+
+
+def test_undo_only_from_exact_rule():
+    assert predict("please undo that one").source == "model"
+    assert classify_local("please undo that one") is None
+    assert classify_local("undo the last expense") == {"intent": "undo"}
+
+
+def test_local_classifier_defers_mostly_unknown_text():
+    assert classify_local("summary of zxqv blorp frobnicate") is None
+
+
+@patch("kazo.handlers.common.cmd_undo", new_callable=AsyncMock)
+@patch("kazo.handlers.common._classify_intent", new_callable=AsyncMock, return_value={"intent": "help"})
+async def test_negated_undo_goes_to_claude(mock_classify, mock_undo):
+    msg = _make_message("dont undo that")
+    await handle_text_expense(msg)
+    mock_classify.assert_called_once()
+    mock_undo.assert_not_called()
+
+
+def test_local_classifier_precision_on_examples():
+    for expected, text in load_training_examples(EVAL_PATH):
+        result = classify_local(text)
+        if result is not None:
+            assert result["intent"] == expected, text
+
+
+def test_shipped_model_matches_training_data():
+    from kazo.intent.classifier import load_model
+
+    assert train(load_training_examples()) == load_model()
+    assert set(load_model()["classes"]) >= LOCAL_INTENTS
@@ -0,0 +1,267 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from kazo.claude.resilience import get_breaker
+from kazo.config import settings
+from kazo.handlers.receipts import cmd_jobs, handle_receipt_photo, on_job_cancel, receipt_jobs
+from kazo.jobs import JobQueue
+from kazo.services.job_service import cancel_job, create_job, fail_interrupted_jobs, get_job, start_job
+
+
+@pytest.fixture(autouse=True)
+async def stop_receipt_jobs():
+    yield
+    await receipt_jobs.stop()
+
+
+async def test_queue_runs_jobs_and_counts():
+    queue = JobQueue("test", workers=2, queue_size=10)
+    done = []
+
+    async def job(i):
+        done.append(i)
+
+    for i in range(5):
+        assert queue.submit(i, lambda i=i: job(i))
+    await queue.join()
+
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert queue.stats()["completed"] == 5
+    await queue.stop()
+
+
+async def test_queue_rejects_when_full():
+    queue = JobQueue("test", workers=1, queue_size=1)
+    gate = asyncio.Event()
+    assert queue.submit(1, gate.wait)
+    await asyncio.sleep(0)  # worker picks up job 1
+    assert queue.submit(2, gate.wait)
+    assert queue.full()
+    assert not queue.submit(3, gate.wait)
+    gate.set()
+    await queue.join()
+    await queue.stop()
+
+
+async def test_cancel_running_job_keeps_worker():
+    queue = JobQueue("test", workers=1, queue_size=10)
+    started = asyncio.Event()
+    ran = []
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(60)
+
+    async def quick():
+        ran.append("quick")
+
+    queue.submit(1, slow)
+    queue.submit(2, quick)
+    await started.wait()
+    assert queue.cancel(1) is True
+    await queue.join()
+
+    assert ran == ["quick"]
+    await queue.stop()
+
+
+async def test_cancel_queued_job_is_skipped():
+    queue = JobQueue("test", workers=1, queue_size=10)
+    gate = asyncio.Event()
+    ran = []
+
+    async def record():
+        ran.append(2)
+
+    queue.submit(1, gate.wait)
+    queue.submit(2, record)
+    assert queue.cancel(2) is False
+    gate.set()
+    await queue.join()
+
+    assert ran == []
+    await queue.stop()
+
+
+async def test_job_table_lifecycle():
+    job_id = await create_job(1, 1, "file", ".jpg", 500)
+    assert (await get_job(job_id))["status"] == "queued"
+
+    assert await cancel_job(2, job_id) is None  # other chat
+    cancelled = await cancel_job(1, job_id)
+    assert cancelled["status_message_id"] == 500
+    assert await start_job(job_id) is False
+    assert await cancel_job(1, job_id) is None
+
+
+async def test_fail_interrupted_jobs():
+    running = await create_job(1, 1, "a", ".jpg", 10)
+    await start_job(running)
+    queued = await create_job(1, 1, "b", ".jpg", 11)
+
+    interrupted = await fail_interrupted_jobs()
+
+    assert {job["id"] for job in interrupted} == {running, queued}
+    assert (await get_job(running))["error"] == "interrupted"
+
+
+def _make_photo_message():
+    msg = AsyncMock()
+    msg.chat.id = 1
+    msg.from_user = MagicMock()
+    msg.from_user.id = 1
+    msg.media_group_id = None
+    msg.answer.return_value = MagicMock(message_id=500)
+    photo = MagicMock()
+    photo.file_id = "photo123"
+    msg.photo = [photo]
+    return msg
+
+
+def _make_bot():
+    bot = AsyncMock()
+    bot.get_file.return_value = MagicMock(file_path="photos/file.jpg")
+    return bot
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(2.5, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_handler_returns_before_job_runs(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
+    mock_claude.side_effect = [
+        {"type": "receipt"},
+        {"store": "Shop", "items": [], "total": 2.5, "currency": "EUR", "category": "groceries"},
+    ]
+    msg = _make_photo_message()
+    bot = _make_bot()
+
+    await handle_receipt_photo(msg, bot)
+
+    mock_claude.assert_not_called()
+    msg.answer.assert_awaited_once_with("⏳ Queued...")
+
+    await receipt_jobs.join()
+
+    mock_pending.assert_awaited_once()
+    texts = [call.args[0] for call in bot.edit_message_text.call_args_list]
+    assert texts[:4] == ["⏳ Downloading...", "⏳ Preparing...", "⏳ Looking at it...", "⏳ Reading..."]
+    assert texts[-1].startswith("✓ Done in")
+    assert all(call.kwargs["message_id"] == 500 for call in bot.edit_message_text.call_args_list)
+
+    job = await get_job(1)
+    assert job["status"] == "done"
+    assert set(json.loads(job["timings_json"])) == {"download", "preprocess", "classify", "extract"}
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(2.5, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_job_requeued_while_breaker_is_open(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
+    replies = iter([{"type": "receipt"}, {"store": "Shop", "items": [], "total": 2.5, "currency": "EUR"}])
+
+    async def respond(prompt, **kwargs):
+        breaker = get_breaker("cli")
+        if mock_claude.await_count == 1:  # Claude goes down during the first job run
+            for _ in range(settings.claude_breaker_threshold):
+                breaker.record_failure()
+        breaker.check()
+        return {**next(replies), "category": "groceries"}
+
+    mock_claude.side_effect = respond
+    bot = _make_bot()
+    with patch.object(settings, "claude_breaker_reset_seconds", 0.05):
+        await handle_receipt_photo(_make_photo_message(), bot)
+        await receipt_jobs.join()
+
+        assert bot.edit_message_text.call_args.args[0].startswith("Claude is unavailable right now, message queued")
+        assert (await get_job(1))["status"] == "queued"
+        mock_pending.assert_not_awaited()
+
+        for _ in range(100):
+            if (await get_job(1))["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+
+    assert (await get_job(1))["status"] == "done"
+    mock_pending.assert_awaited_once()
+    assert bot.edit_message_text.call_args.args[0].startswith("✓ Done in")
+
+
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+async def test_jobs_command_lists_and_cancels(mock_claude):
+    started = asyncio.Event()
+
+    async def slow_classify(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(60)
+
+    mock_claude.side_effect = slow_classify
+    bot = _make_bot()
+    await handle_receipt_photo(_make_photo_message(), bot)
+    await started.wait()
+
+    listing = AsyncMock()
+    listing.chat.id = 1
+    await cmd_jobs(listing)
+    assert "#1 — Looking at it" in listing.answer.call_args.args[0]
+
+    callback = AsyncMock()
+    callback.data = "job:cancel:1"
+    callback.message.chat.id = 1
+    await on_job_cancel(callback, bot)
+    await receipt_jobs.join()
+
+    assert (await get_job(1))["status"] == "cancelled"
+    assert bot.edit_message_text.call_args.args[0] == "✖ Cancelled."
+    callback.message.edit_text.assert_awaited_once_with("No receipts in progress.")
+
+
+@patch("kazo.handlers.receipts.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.reserve_claude_calls", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_album_is_one_cancellable_job(mock_cats, mock_claude, mock_base, mock_reserve, mock_group):
+    started = asyncio.Event()
+
+    async def slow_extract(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(60)
+
+    mock_claude.side_effect = slow_extract
+    messages = []
+    for i in range(2):
+        msg = _make_photo_message()
+        msg.media_group_id = "album1"
+        msg.photo[0].file_id = f"photo{i}"
+        messages.append(msg)
+    bot = _make_bot()
+
+    with patch.object(settings, "album_window_seconds", 0.05):
+        await asyncio.gather(*(handle_receipt_photo(m, bot) for m in messages))
+    await started.wait()
+
+    listing = AsyncMock()
+    listing.chat.id = 1
+    await cmd_jobs(listing)
+    listed = listing.answer.call_args.args[0]
+    assert "#1 — Reading" in listed
+    assert "#2" not in listed  # one job for the whole album
+    assert (await get_job(1))["file_id"] == "photo0"
+
+    callback = AsyncMock()
+    callback.data = "job:cancel:1"
+    callback.message.chat.id = 1
+    await on_job_cancel(callback, bot)
+    await receipt_jobs.join()
+
+    assert (await get_job(1))["status"] == "cancelled"
+    mock_group.assert_not_awaited()
+    messages[0].answer.assert_awaited_once_with("Processing 2 receipts...")
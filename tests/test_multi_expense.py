@@ -0,0 +1,91 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from kazo.handlers.common import handle_text_expense
+from kazo.services.currency_service import _cache_rate
+
+
+def _make_message(text):
+    msg = AsyncMock()
+    msg.text = text
+    msg.chat.id = 1
+    msg.from_user = MagicMock()
+    msg.from_user.id = 1
+    return msg
+
+
+def _expense(amount, description, currency="EUR", category="dining"):
+    return {
+        "amount": amount,
+        "currency": currency,
+        "category": category,
+        "description": description,
+        "expense_date": "2025-03-15",
+    }
+
+
+@patch("kazo.handlers.common.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.common.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.common.get_rates", new_callable=AsyncMock, return_value={"EUR": 1.0, "USD": 0.9})
+@patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock)
+async def test_several_expenses_in_one_message(mock_claude, mock_base, mock_rates, mock_group, mock_single):
+    mock_claude.return_value = {
+        "expenses": [
+            _expense(4, "Coffee"),
+            _expense(12.5, "Lunch"),
+            _expense(18, "Taxi", currency="USD", category="transport"),
+        ]
+    }
+    msg = _make_message("coffee 4, lunch 12.50, taxi 18 usd")
+
+    await handle_text_expense(msg)
+
+    assert mock_claude.await_count == 1
+    # Every currency converted in one lookup pass.
+    mock_rates.assert_awaited_once()
+    assert sorted(mock_rates.call_args.args[0]) == ["EUR", "EUR", "USD"]
+    mock_single.assert_not_called()
+    entries = mock_group.call_args.args[1]
+    assert [e.amount_base for e, _ in entries] == [4.0, 12.5, 16.2]
+    assert "Taxi" in entries[2][1]
+    assert mock_group.call_args.kwargs["kind"] == "expense"
+
+
+@patch("kazo.handlers.common.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.common.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock)
+async def test_padded_currency_matches_rate_key(mock_claude, mock_base, mock_group, mock_single):
+    await _cache_rate("USD", "EUR", 0.9)
+    mock_claude.return_value = {"expenses": [_expense(4, "Coffee"), _expense(18, "Taxi", currency=" usd ")]}
+
+    await handle_text_expense(_make_message("coffee 4, taxi 18 usd"))
+
+    entries = mock_group.call_args.args[1]
+    assert [(e.original_currency, e.amount_base) for e, _ in entries] == [("EUR", 4.0), ("USD", 16.2)]
+
+
+@patch("kazo.handlers.common.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.common.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.common.get_rates", new_callable=AsyncMock, return_value={"EUR": 1.0})
+@patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock)
+async def test_malformed_entries_are_dropped(mock_claude, mock_base, mock_rates, mock_group, mock_single):
+    mock_claude.return_value = {"expenses": [_expense(4, "Coffee"), {"description": "?"}, _expense(0, "Free")]}
+
+    await handle_text_expense(_make_message("coffee 4 and something"))
+
+    mock_group.assert_not_called()
+    expense, display = mock_single.call_args.args[1:]
+    assert expense.amount == 4
+    assert "Coffee" in display
+
+
+@patch("kazo.handlers.common.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.common.ask_claude_structured", new_callable=AsyncMock, return_value={"expenses": []})
+async def test_no_expenses_found(mock_claude, mock_base):
+    msg = _make_message("spent 0")
+
+    await handle_text_expense(msg)
+
+    assert "valid amount" in msg.answer.call_args.args[0]
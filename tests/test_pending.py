@@ -10,10 +10,11 @@ from kazo.handlers.pending import (
     PENDING_TTL,
     PendingExpense,
     _build_receipt_display,
-    _cleanup_expired,
+    _group_store,
     _items_keyboard,
     _make_key,
     _pending,
+    _store,
     confirmation_keyboard,
     on_cancel,
     on_confirm,
@@ -47,6 +48,10 @@ def clear_pending():
     _pending.clear()
     yield
     _pending.clear()
+    _store._deadlines.clear()
+    _store._heap.clear()
+    _store._evicted.clear()
+    _group_store.cache.clear()
 
 
 def test_make_key():
@@ -82,21 +87,6 @@ def test_items_keyboard():
     assert kb.inline_keyboard[2][1].text == "Cancel"
 
 
-def test_cleanup_expired():
-    _pending["old"] = PendingExpense(
-        expense=_make_expense(),
-        display_text="old",
-        created_at=time.monotonic() - PENDING_TTL - 1,
-    )
-    _pending["new"] = PendingExpense(
-        expense=_make_expense(),
-        display_text="new",
-    )
-    _cleanup_expired()
-    assert "old" not in _pending
-    assert "new" in _pending
-
-
 @pytest.mark.asyncio
 async def test_store_pending_no_items():
     msg = AsyncMock()
@@ -150,7 +140,7 @@ async def test_on_confirm_saves():
         patch("kazo.handlers.pending.link_bot_message", new_callable=AsyncMock) as mock_link,
     ):
         await on_confirm(callback)
-        mock_save.assert_awaited_once_with(expense)
+        mock_save.assert_awaited_once_with(expense, None)
         mock_link.assert_awaited_once_with(100, 200, 42)
 
     assert key not in _pending
@@ -314,3 +304,220 @@ async def test_build_receipt_display_foreign_currency():
     # 100 TRY * (50/200) = 25 EUR
     assert "25.00" in display
     assert "100.00 TRY" in display
+
+
+@pytest.mark.asyncio
+async def test_on_confirm_after_restart():
+    msg = AsyncMock()
+    sent = AsyncMock()
+    sent.chat.id = 100
+    sent.message_id = 200
+    msg.answer = AsyncMock(return_value=sent)
+    await store_pending(msg, _make_expense(), "display")
+    _pending.clear()  # process restart drops the cache
+
+    callback = AsyncMock()
+    callback.message.chat.id = 100
+    callback.message.message_id = 200
+
+    with (
+        patch("kazo.handlers.pending.save_expense", new_callable=AsyncMock, return_value=42) as mock_save,
+        patch("kazo.handlers.pending.link_bot_message", new_callable=AsyncMock),
+    ):
+        await on_confirm(callback)
+
+    saved = mock_save.call_args[0][0]
+    assert saved.store == "TestStore"
+    assert saved.amount == 50.0
+    callback.answer.assert_awaited_once_with("Expense saved!")
+
+
+@pytest.mark.asyncio
+async def test_edit_items_after_restart_persists_removal():
+    msg = AsyncMock()
+    sent = AsyncMock()
+    sent.chat.id = 100
+    sent.message_id = 200
+    msg.answer = AsyncMock(return_value=sent)
+    items = [{"name": "Milk", "price": 2.50}, {"name": "Bread", "price": 1.80}]
+    await store_pending(msg, _make_expense(items_json=json.dumps(items)), "display")
+    _pending.clear()
+
+    callback = AsyncMock()
+    callback.message.chat.id = 100
+    callback.message.message_id = 200
+    callback.data = "expense:edit_items"
+    await on_edit_items(callback)
+    callback.message.edit_text.assert_awaited_once()
+
+    callback.data = "expense:remove:0"
+    await on_remove_item(callback)
+    _pending.clear()
+
+    callback.data = "expense:edit_items"
+    await on_edit_items(callback)
+    assert [i["name"] for i in _pending[_make_key(100, 200)].items] == ["Bread"]
+
+
+@pytest.mark.asyncio
+async def test_double_confirm_saves_once():
+    msg = AsyncMock()
+    sent = AsyncMock()
+    sent.chat.id = 100
+    sent.message_id = 200
+    msg.answer = AsyncMock(return_value=sent)
+    await store_pending(msg, _make_expense(), "display")
+
+    callback = AsyncMock()
+    callback.message.chat.id = 100
+    callback.message.message_id = 200
+
+    with (
+        patch("kazo.handlers.pending.save_expense", new_callable=AsyncMock, return_value=42) as mock_save,
+        patch("kazo.handlers.pending.link_bot_message", new_callable=AsyncMock),
+    ):
+        await on_confirm(callback)
+        await on_confirm(callback)
+
+    mock_save.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_not_loaded(test_db):
+    await test_db.execute(
+        "INSERT INTO pending_state (namespace, key, payload, expires_at) VALUES ('expense', '100:200', '{}', ?)",
+        (time.time() - 1,),
+    )
+    await test_db.commit()
+
+    callback = AsyncMock()
+    callback.message.chat.id = 100
+    callback.message.message_id = 200
+    await on_confirm(callback)
+
+    callback.answer.assert_awaited_once_with("This expense has expired or was already handled.")
+
+
+@pytest.mark.asyncio
+async def test_sweep_edits_expired_confirmation():
+    msg = AsyncMock()
+    sent = AsyncMock()
+    sent.chat.id = 100
+    sent.message_id = 200
+    msg.answer = AsyncMock(return_value=sent)
+    await store_pending(msg, _make_expense(), "💰 50.00")
+
+    bot = AsyncMock()
+    assert await _store.sweep(bot, now=time.time() + PENDING_TTL - 5) == 0
+    assert await _store.sweep(bot, now=time.time() + PENDING_TTL + 1) == 1
+
+    bot.edit_message_text.assert_awaited_once()
+    text = bot.edit_message_text.call_args.args[0]
+    assert text.startswith("💰 50.00")
+    assert "Expired" in text
+    assert bot.edit_message_text.call_args.kwargs == {"chat_id": 100, "message_id": 200}
+    assert _make_key(100, 200) not in _pending
+
+
+async def _stored_group(count=2):
+    from kazo.handlers.pending import store_pending_group
+
+    msg = AsyncMock()
+    sent = AsyncMock()
+    sent.chat.id = 100
+    sent.message_id = 300
+    msg.answer = AsyncMock(return_value=sent)
+    entries = [(_make_expense(store=f"Store{i}"), f"receipt {i}") for i in range(count)]
+    await store_pending_group(msg, entries)
+    return msg
+
+
+def _group_callback(data):
+    callback = AsyncMock()
+    callback.message.chat.id = 100
+    callback.message.message_id = 300
+    callback.data = data
+    return callback
+
+
+@pytest.mark.asyncio
+async def test_group_confirmation_keyboard():
+    msg = await _stored_group()
+    kb = msg.answer.call_args.kwargs["reply_markup"]
+    assert [b.callback_data for b in kb.inline_keyboard[0]] == ["expense:group:confirm:0", "expense:group:cancel:0"]
+    assert kb.inline_keyboard[-1][0].text == "Confirm all"
+    assert "#1" in msg.answer.call_args.args[0]
+    assert "receipt 1" in msg.answer.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_group_confirm_one_then_cancel_other():
+    from kazo.handlers.pending import on_group_action
+
+    await _stored_group()
+
+    with (
+        patch("kazo.handlers.pending.save_expenses", new_callable=AsyncMock, return_value=[1]) as mock_save,
+        patch("kazo.handlers.pending.link_group_message", new_callable=AsyncMock) as mock_link,
+    ):
+        callback = _group_callback("expense:group:confirm:1")
+        await on_group_action(callback)
+        await on_group_action(callback)  # double tap
+        mock_save.assert_awaited_once()
+        assert [e.store for e in mock_save.call_args.args[0]] == ["Store1"]
+        mock_link.assert_awaited_once_with(100, 300, {2: 1})
+
+        text = callback.message.edit_text.call_args.args[0]
+        assert "#2 — Saved ✓" in text
+        kb = callback.message.edit_text.call_args.kwargs["reply_markup"]
+        assert len(kb.inline_keyboard) == 1
+
+        _group_store.cache.clear()  # survives restart
+        callback = _group_callback("expense:group:cancel:0")
+        await on_group_action(callback)
+
+    assert "#1 — Cancelled" in callback.message.edit_text.call_args.args[0]
+    assert callback.message.edit_text.call_args.kwargs["reply_markup"] is None
+    assert await _group_store.get(_make_key(100, 300)) is None
+
+
+@pytest.mark.asyncio
+async def test_group_confirm_all():
+    from kazo.handlers.pending import on_group_action
+
+    await _stored_group(3)
+    with (
+        patch("kazo.handlers.pending.save_expenses", new_callable=AsyncMock, return_value=[1, 2, 3]) as mock_save,
+        patch("kazo.handlers.pending.link_group_message", new_callable=AsyncMock),
+    ):
+        callback = _group_callback("expense:group:confirm:all")
+        await on_group_action(callback)
+
+    # One call, so all three are written in a single transaction.
+    mock_save.assert_awaited_once()
+    assert len(mock_save.call_args.args[0]) == 3
+    callback.answer.assert_awaited_once_with("3 receipts saved.")
+
+
+@pytest.mark.asyncio
+async def test_group_save_failure_can_be_retried():
+    from kazo.handlers.pending import on_group_action
+
+    await _stored_group()
+    callback = _group_callback("expense:group:confirm:0")
+    with (
+        patch("kazo.handlers.pending.save_expenses", new_callable=AsyncMock, side_effect=RuntimeError("db locked")),
+        pytest.raises(RuntimeError),
+    ):
+        await on_group_action(callback)
+
+    group = await _group_store.get(_make_key(100, 300))
+    assert group.status == [None, None]
+
+    with (
+        patch("kazo.handlers.pending.save_expenses", new_callable=AsyncMock, return_value=[1]) as mock_save,
+        patch("kazo.handlers.pending.link_group_message", new_callable=AsyncMock),
+    ):
+        await on_group_action(callback)
+    mock_save.assert_awaited_once()
+    assert "#1 — Saved ✓" in callback.message.edit_text.call_args.args[0]
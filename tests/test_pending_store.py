@@ -0,0 +1,80 @@
+import json
+import time
+from unittest.mock import AsyncMock
+
+from kazo.services.pending_store import PendingStore
+
+
+def _store(**kwargs) -> PendingStore:
+    return PendingStore("test", 60, json.dumps, json.loads, **kwargs)
+
+
+async def test_put_get_pop_roundtrip():
+    store = _store()
+    await store.put("a", {"x": 1})
+    assert await store.get("a") == {"x": 1}
+    assert await store.pop("a") == {"x": 1}
+    assert await store.pop("a") is None
+    assert len(store) == 0
+
+
+async def test_get_falls_back_to_table():
+    await _store().put("a", {"x": 1})
+    fresh = _store()
+    assert await fresh.get("a") == {"x": 1}
+    assert fresh.cache == {"a": {"x": 1}}
+
+
+async def test_sweep_expires_in_deadline_order():
+    on_expire = AsyncMock()
+    store = _store(on_expire=on_expire)
+    now = time.time()
+    await store.put("late", {"n": 3}, created_at=now + 20)
+    await store.put("early", {"n": 1}, created_at=now)
+    await store.put("mid", {"n": 2}, created_at=now + 10)
+
+    expired = await store.sweep(now=now + 60 + 15)
+
+    assert expired == 2
+    assert [c.args[1] for c in on_expire.call_args_list] == ["early", "mid"]
+    assert list(store.cache) == ["late"]
+    assert await _store().get("early") is None
+    assert await _store().get("late") == {"n": 3}
+
+
+async def test_popped_entries_are_not_expired():
+    on_expire = AsyncMock()
+    store = _store(on_expire=on_expire)
+    now = time.time()
+    await store.put("a", {}, created_at=now)
+    await store.pop("a")
+
+    assert await store.sweep(now=now + 120) == 0
+    on_expire.assert_not_awaited()
+
+
+async def test_cap_evicts_soonest_expiring():
+    on_expire = AsyncMock()
+    store = _store(on_expire=on_expire, max_entries=2)
+    now = time.time()
+    await store.put("a", {"n": 1}, created_at=now)
+    await store.put("b", {"n": 2}, created_at=now + 1)
+    await store.put("c", {"n": 3}, created_at=now + 2)
+
+    assert len(store) == 2
+    assert "a" not in store.cache
+    assert await _store().get("a") is None
+
+    await store.sweep()
+    on_expire.assert_awaited_once_with(None, "a", {"n": 1})
+
+
+async def test_load_tracks_previous_process_entries():
+    now = time.time()
+    await _store().put("1", {"chat_id": 5}, created_at=now)
+
+    on_expire = AsyncMock()
+    restarted = PendingStore("test", 60, json.dumps, json.loads, on_expire=on_expire, parse_key=int)
+    assert await restarted.load() == 1
+    assert await restarted.sweep(now=now + 61) == 1
+    on_expire.assert_awaited_once_with(None, 1, {"chat_id": 5})
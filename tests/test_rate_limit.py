@@ -2,51 +2,63 @@ import time
 
 import pytest
 
-from kazo.claude.client import RateLimitExceeded, _enforce_rate_limit
-from kazo.main import _rate_limit_windows, check_rate_limit, record_rate_limit
+import kazo.state as state_mod
+from kazo.claude.client import RateLimitExceeded, _enforce_rate_limit, reserve_claude_calls
+from kazo.state import MemoryStateBackend, SQLiteStateBackend
 
 
-@pytest.fixture(autouse=True)
-def clear_windows():
-    _rate_limit_windows.clear()
-    yield
-    _rate_limit_windows.clear()
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, monkeypatch):
+    backend = MemoryStateBackend() if request.param == "memory" else SQLiteStateBackend()
+    monkeypatch.setattr(state_mod, "_backend", backend)
+    return backend
 
 
-def test_allows_under_limit():
-    assert check_rate_limit(1) is True
+async def _fill(backend, chat_id, count, now=None):
+    for _ in range(count):
+        assert await backend.hit(f"claude:{chat_id}", 30, 3600, now=now)
 
 
-def test_blocks_at_limit():
-    now = time.monotonic()
-    _rate_limit_windows[1] = [now - i for i in range(30)]
-    assert check_rate_limit(1) is False
+async def test_allows_under_limit(backend):
+    assert await backend.hit("claude:1", 30, 3600) is True
 
 
-def test_expired_entries_pruned():
-    _rate_limit_windows[1] = [time.monotonic() - 3700 for _ in range(50)]
-    assert check_rate_limit(1) is True
+async def test_blocks_at_limit(backend):
+    await _fill(backend, 1, 30)
+    assert await backend.hit("claude:1", 30, 3600) is False
 
 
-def test_record_increments():
-    record_rate_limit(1)
-    assert len(_rate_limit_windows[1]) == 1
+async def test_expired_entries_pruned(backend):
+    await _fill(backend, 1, 30, now=time.time() - 3700)
+    assert await backend.hit("claude:1", 30, 3600) is True
 
 
-def test_per_chat_isolation():
-    now = time.monotonic()
-    _rate_limit_windows[1] = [now - i for i in range(30)]
-    assert check_rate_limit(1) is False
-    assert check_rate_limit(2) is True
+async def test_per_chat_isolation(backend):
+    await _fill(backend, 1, 30)
+    assert await backend.hit("claude:1", 30, 3600) is False
+    assert await backend.hit("claude:2", 30, 3600) is True
 
 
-def test_enforce_rate_limit_raises():
-    now = time.monotonic()
-    _rate_limit_windows[1] = [now - i for i in range(30)]
+async def test_cost_counts_against_limit(backend):
+    assert await backend.hit("claude:1", 30, 3600, cost=28) is True
+    assert await backend.hit("claude:1", 30, 3600, cost=3) is False
+    assert await backend.hit("claude:1", 30, 3600, cost=2) is True
+
+
+async def test_enforce_rate_limit_raises(backend):
+    await _fill(backend, 1, 30)
     with pytest.raises(RateLimitExceeded):
-        _enforce_rate_limit(1)
+        await _enforce_rate_limit(1)
+
 
+async def test_enforce_rate_limit_records(backend):
+    await _enforce_rate_limit(1)
+    await _fill(backend, 1, 29)
+    assert await backend.hit("claude:1", 30, 3600) is False
 
-def test_enforce_rate_limit_records():
-    _enforce_rate_limit(1)
-    assert len(_rate_limit_windows[1]) == 1
+
+async def test_reserve_blocks_when_cost_exceeds_remaining(backend):
+    await _fill(backend, 1, 28)
+    with pytest.raises(RateLimitExceeded):
+        await reserve_claude_calls(1, 3)
+    await reserve_claude_calls(1, 2)
@@ -1,22 +1,37 @@
+import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from kazo.handlers.receipts import (
+    PDF_PAGE_PROMPT,
     SUPPORTED_DOC_MIMES,
     handle_receipt_document,
     handle_receipt_photo,
+    receipt_jobs,
 )
 
 
+@pytest.fixture(autouse=True)
+async def stop_receipt_jobs():
+    yield
+    await receipt_jobs.stop()
+
+
 def _make_message(chat_id=1, user_id=1):
     msg = AsyncMock()
     msg.chat.id = chat_id
     msg.from_user = MagicMock()
     msg.from_user.id = user_id
+    msg.media_group_id = None
+    msg.answer.return_value = MagicMock(message_id=500)
     return msg
 
 
+def _status_texts(bot):
+    return [call.args[0] for call in bot.edit_message_text.call_args_list]
+
+
 def _make_bot(file_path="photos/file.jpg"):
     bot = AsyncMock()
     file_obj = MagicMock()
@@ -58,6 +73,7 @@ async def test_photo_handler(mock_cats, mock_claude, mock_base, mock_convert, mo
     msg.photo = [photo]
 
     await handle_receipt_photo(msg, bot)
+    await receipt_jobs.join()
 
     assert mock_claude.call_count == 2
     mock_pending.assert_called_once()
@@ -69,7 +85,10 @@ async def test_photo_handler(mock_cats, mock_claude, mock_base, mock_convert, mo
 @patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
 @patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
 async def test_document_handler_pdf(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
-    mock_claude.side_effect = [MOCK_CLASSIFY_RECEIPT, {**MOCK_PARSED, "total": 10.0}]
+    mock_claude.side_effect = [
+        MOCK_CLASSIFY_RECEIPT,
+        {**MOCK_PARSED, "items": [{"name": "Invoice", "price": 10.0}], "total": 10.0},
+    ]
     msg = _make_message()
     bot = _make_bot()
     doc = MagicMock()
@@ -78,6 +97,7 @@ async def test_document_handler_pdf(mock_cats, mock_claude, mock_base, mock_conv
     msg.document = doc
 
     await handle_receipt_document(msg, bot)
+    await receipt_jobs.join()
 
     assert mock_claude.call_count == 2
     mock_pending.assert_called_once()
@@ -91,6 +111,7 @@ async def test_document_handler_unsupported_mime():
     msg.document = doc
 
     await handle_receipt_document(msg, bot)
+    await receipt_jobs.join()
 
     msg.answer.assert_not_called()
 
@@ -101,6 +122,7 @@ async def test_document_handler_no_user():
     bot = _make_bot()
 
     await handle_receipt_document(msg, bot)
+    await receipt_jobs.join()
     msg.answer.assert_not_called()
 
 
@@ -121,8 +143,9 @@ async def test_document_handler_claude_error(mock_cats, mock_claude):
     msg.document = doc
 
     await handle_receipt_document(msg, bot)
+    await receipt_jobs.join()
 
-    assert any("couldn't process" in str(call) for call in msg.answer.call_args_list)
+    assert "couldn't process" in _status_texts(bot)[-1]
 
 
 @patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
@@ -130,12 +153,14 @@ async def test_document_handler_claude_error(mock_cats, mock_claude):
 async def test_photo_classified_as_product(mock_cats, mock_claude):
     mock_claude.side_effect = [MOCK_CLASSIFY_PRODUCT, MOCK_PRODUCTS]
     msg = _make_message()
+    msg.answer.return_value = MagicMock(message_id=321)
     bot = _make_bot()
     photo = MagicMock()
     photo.file_id = "photo123"
     msg.photo = [photo]
 
     await handle_receipt_photo(msg, bot)
+    await receipt_jobs.join()
 
     assert mock_claude.call_count == 2
     # Should show product list, not store_pending
@@ -154,8 +179,9 @@ async def test_photo_classified_as_other(mock_claude):
     msg.photo = [photo]
 
     await handle_receipt_photo(msg, bot)
+    await receipt_jobs.join()
 
-    assert any("not sure" in str(call) for call in msg.answer.call_args_list)
+    assert "not sure" in _status_texts(bot)[-1]
 
 
 @patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
@@ -176,7 +202,7 @@ async def test_product_price_reply(mock_cats, mock_claude, mock_base, mock_conve
         "category": "groceries",
         "description": "Groceries",
         "bot_message_id": bot_msg_id,
-        "created_at": time.monotonic(),
+        "created_at": time.time(),
     }
 
     mock_claude.return_value = {
@@ -212,3 +238,330 @@ async def test_product_price_reply_no_session(mock_claude):
     await handle_product_price_reply(msg)
 
     mock_claude.assert_not_called()
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(4.30, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_receipt_mismatch_escalates_to_larger_model(
+    mock_cats, mock_claude, mock_base, mock_convert, mock_pending
+):
+    mismatched = {**MOCK_PARSED, "items": [{"name": "Milk", "price": 2.50}], "total": 9.99}
+    fixed = {**MOCK_PARSED, "items": [{"name": "Milk", "price": 2.50}, {"name": "Bread", "price": 1.80}], "total": 4.30}
+    mock_claude.side_effect = [MOCK_CLASSIFY_RECEIPT, mismatched, fixed]
+    msg = _make_message()
+    photo = MagicMock()
+    photo.file_id = "photo123"
+    msg.photo = [photo]
+
+    await handle_receipt_photo(msg, _make_bot())
+    await receipt_jobs.join()
+
+    tasks = [call.kwargs.get("task") for call in mock_claude.call_args_list]
+    assert tasks == ["classify", "receipt", "escalation"]
+    assert mock_claude.call_args.kwargs["chat_id"] == msg.chat.id  # the escalation counts against the rate limit
+    expense = mock_pending.call_args.args[1]
+    assert expense.amount == 4.30
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(9.99, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_rate_limited_escalation_keeps_first_extraction(
+    mock_cats, mock_claude, mock_base, mock_convert, mock_pending
+):
+    from kazo.claude.client import RateLimitExceeded
+
+    mismatched = {**MOCK_PARSED, "items": [{"name": "Milk", "price": 2.50}], "total": 9.99}
+    mock_claude.side_effect = [MOCK_CLASSIFY_RECEIPT, mismatched, RateLimitExceeded("limit")]
+    msg = _make_message()
+    photo = MagicMock()
+    photo.file_id = "photo123"
+    msg.photo = [photo]
+
+    await handle_receipt_photo(msg, _make_bot())
+    await receipt_jobs.join()
+
+    assert mock_pending.call_args.args[1].amount == 9.99
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(2.50, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_valid_receipt_does_not_escalate(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
+    mock_claude.side_effect = [MOCK_CLASSIFY_RECEIPT, MOCK_PARSED]
+    msg = _make_message()
+    photo = MagicMock()
+    photo.file_id = "photo123"
+    msg.photo = [photo]
+
+    await handle_receipt_photo(msg, _make_bot())
+    await receipt_jobs.join()
+
+    assert [call.kwargs.get("task") for call in mock_claude.call_args_list] == ["classify", "receipt"]
+
+
+def _make_pdf(pages: int) -> bytes:
+    import io
+
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _make_pdf_bot(pdf: bytes):
+    bot = _make_bot("documents/file.pdf")
+
+    async def download(path, destination):
+        destination.write(pdf)
+
+    bot.download_file.side_effect = download
+    return bot
+
+
+def _pdf_message():
+    msg = _make_message()
+    doc = MagicMock()
+    doc.file_id = "doc123"
+    doc.mime_type = "application/pdf"
+    msg.document = doc
+    return msg
+
+
+def test_merge_receipt_pages_is_deterministic():
+    from kazo.handlers.receipts import _merge_receipt_pages
+
+    pages = [
+        {
+            "store": "TestMart",
+            "items": [{"name": "Milk", "price": 2.5}],
+            "total": 0,
+            "currency": "EUR",
+            "category": "groceries",
+            "expense_date": "2025-01-15",
+        },
+        {
+            "store": None,
+            "items": [{"name": "Soap", "price": 3.0}],
+            "total": 0,
+            "currency": "EUR",
+            "category": "household",
+            "expense_date": "2025-01-15",
+        },
+        {"items": [{"name": "Bread", "price": 1.8}], "total": 7.3, "currency": "EUR", "category": "groceries"},
+    ]
+
+    merged = _merge_receipt_pages(pages)
+
+    assert [i["name"] for i in merged["items"]] == ["Milk", "Soap", "Bread"]
+    assert merged["total"] == 7.3
+    assert merged["store"] == "TestMart"
+    assert merged["category"] == "groceries"
+    assert merged["expense_date"] == "2025-01-15"
+
+
+def test_merge_receipt_pages_sums_items_without_total():
+    from kazo.handlers.receipts import _merge_receipt_pages
+
+    merged = _merge_receipt_pages(
+        [
+            {"items": [{"name": "A", "price": 1.1}], "total": 0, "currency": "EUR", "category": "food"},
+            {"items": [{"name": "B", "price": 2.2}], "total": 0, "currency": "EUR", "category": "food"},
+        ]
+    )
+    assert merged["total"] == 3.3
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(4.3, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_multi_page_pdf_extracts_each_page(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
+    async def respond(prompt, **kwargs):
+        if kwargs.get("task") == "classify":
+            return MOCK_CLASSIFY_RECEIPT
+        if "page 1 of 2" in prompt:
+            return {**MOCK_PARSED, "items": [{"name": "Milk", "price": 2.5}], "total": 0}
+        return {**MOCK_PARSED, "store": None, "items": [{"name": "Bread", "price": 1.8}], "total": 4.3}
+
+    mock_claude.side_effect = respond
+
+    await handle_receipt_document(_pdf_message(), _make_pdf_bot(_make_pdf(2)))
+    await receipt_jobs.join()
+
+    receipt_calls = [c for c in mock_claude.call_args_list if c.kwargs.get("task") == "receipt"]
+    assert len(receipt_calls) == 2
+    assert all(c.kwargs["media"].media_type == "application/pdf" for c in receipt_calls)
+    expense = mock_pending.call_args.args[1]
+    assert expense.amount == 4.3
+    assert expense.store == "TestMart"
+    assert [i["name"] for i in json.loads(expense.items_json)] == ["Milk", "Bread"]
+
+
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+async def test_pdf_page_guard(mock_claude):
+    from kazo.config import settings
+
+    msg = _pdf_message()
+    bot = _make_pdf_bot(_make_pdf(3))
+
+    with patch.object(settings, "pdf_max_pages", 2):
+        await handle_receipt_document(msg, bot)
+        await receipt_jobs.join()
+
+    mock_claude.assert_not_called()
+    assert "3 pages" in _status_texts(bot)[-1]
+
+
+@patch("kazo.handlers.receipts.store_pending", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(3.5, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_product_session_survives_restart(mock_cats, mock_claude, mock_base, mock_convert, mock_pending):
+    from kazo.handlers.receipts import _product_sessions, handle_product_price_reply
+
+    msg = _make_message()
+    msg.answer.return_value = MagicMock(message_id=555)
+    photo = MagicMock()
+    photo.file_id = "photo123"
+    msg.photo = [photo]
+    mock_claude.side_effect = [MOCK_CLASSIFY_PRODUCT, MOCK_PRODUCTS]
+    await handle_receipt_photo(msg, _make_bot())
+    await receipt_jobs.join()
+    _product_sessions.clear()
+
+    mock_claude.side_effect = None
+    mock_claude.return_value = {"items": [{"name": "Tomatoes", "price": 3.5}], "total": 3.5, "currency": "EUR"}
+    reply = _make_message()
+    reply.text = "3.50 euros"
+    reply.reply_to_message = MagicMock(message_id=555)
+    await handle_product_price_reply(reply)
+
+    expense = mock_pending.call_args.args[1]
+    assert expense.category == "groceries"
+    assert expense.amount == 3.5
+
+
+def _album_message(group_id="album1", file_id="photo"):
+    msg = _make_message()
+    msg.media_group_id = group_id
+    photo = MagicMock()
+    photo.file_id = file_id
+    msg.photo = [photo]
+    return msg
+
+
+@patch("kazo.handlers.receipts.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(2.5, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_album_collected_into_one_confirmation(mock_cats, mock_claude, mock_base, mock_convert, mock_group):
+    import asyncio
+
+    from kazo.config import settings
+
+    mock_claude.return_value = MOCK_PARSED
+    messages = [_album_message(file_id=f"photo{i}") for i in range(3)]
+    bot = _make_bot()
+
+    with patch.object(settings, "album_window_seconds", 0.05):
+        await asyncio.gather(*(handle_receipt_photo(m, bot) for m in messages))
+    await receipt_jobs.join()
+
+    assert bot.get_file.await_count == 3
+    assert [c.kwargs["task"] for c in mock_claude.call_args_list] == ["receipt"] * 3
+    assert all(c.kwargs["chat_id"] is None for c in mock_claude.call_args_list)
+    mock_group.assert_awaited_once()
+    assert len(mock_group.call_args.args[1]) == 3
+    messages[0].answer.assert_awaited_once_with("Processing 3 receipts...")
+    for m in messages[1:]:
+        m.answer.assert_not_awaited()
+
+
+@patch("kazo.handlers.receipts.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(2.5, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_album_reports_failed_parts(mock_cats, mock_claude, mock_base, mock_convert, mock_group):
+    import asyncio
+
+    from kazo.config import settings
+
+    async def respond(prompt, **kwargs):
+        if bytes(kwargs["media"].data) == b"photo0":
+            raise RuntimeError("boom")
+        return MOCK_PARSED
+
+    bot = _make_bot()
+    bot.get_file.side_effect = lambda file_id: MagicMock(file_path=file_id)
+
+    async def download(path, destination):
+        destination.write(path.encode())
+
+    bot.download_file.side_effect = download
+    mock_claude.side_effect = respond
+    messages = [_album_message(file_id=f"photo{i}") for i in range(2)]
+
+    with patch.object(settings, "album_window_seconds", 0.05):
+        await asyncio.gather(*(handle_receipt_photo(m, bot) for m in messages))
+    await receipt_jobs.join()
+
+    assert len(mock_group.call_args.args[1]) == 1
+    assert any("#1" in c.args[0] for c in messages[0].answer.call_args_list)
+
+
+@patch("kazo.handlers.receipts.reserve_claude_calls", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.store_pending_group", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.convert_to_base", new_callable=AsyncMock, return_value=(4.3, 1.0))
+@patch("kazo.handlers.receipts.get_base_currency", new_callable=AsyncMock, return_value="EUR")
+@patch("kazo.handlers.receipts.ask_claude_structured", new_callable=AsyncMock)
+@patch("kazo.handlers.receipts.get_categories_str", new_callable=AsyncMock, return_value="groceries")
+async def test_album_pdfs_are_split_and_page_limited(
+    mock_cats, mock_claude, mock_base, mock_convert, mock_group, mock_reserve
+):
+    import asyncio
+
+    from kazo.config import settings
+
+    pdfs = {"short": _make_pdf(2), "long": _make_pdf(3)}
+    bot = _make_bot()
+    bot.get_file.side_effect = lambda file_id: MagicMock(file_path=file_id)
+
+    async def download(path, destination):
+        destination.write(pdfs[path])
+
+    bot.download_file.side_effect = download
+    mock_claude.return_value = {**MOCK_PARSED, "items": [{"name": "Milk", "price": 2.15}], "total": 4.3}
+    messages = []
+    for file_id in pdfs:
+        msg = _pdf_message()
+        msg.media_group_id = "album1"
+        msg.document.file_id = file_id
+        messages.append(msg)
+
+    with patch.object(settings, "album_window_seconds", 0.05), patch.object(settings, "pdf_max_pages", 2):
+        await asyncio.gather(*(handle_receipt_document(m, bot) for m in messages))
+        await receipt_jobs.join()
+
+    assert [c.kwargs["prompt"] for c in mock_claude.call_args_list] == [
+        PDF_PAGE_PROMPT.format(page=1, pages=2),
+        PDF_PAGE_PROMPT.format(page=2, pages=2),
+    ]
+    assert [c.args[1] for c in mock_reserve.call_args_list] == [2, 1]  # the album's parts, then the extra page
+    assert len(mock_group.call_args.args[1]) == 1
+    assert any("#2: This PDF has 3 pages" in c.args[0] for c in messages[0].answer.call_args_list)
@@ -0,0 +1,190 @@
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import Message
+
+from kazo.claude.client import ask_claude_structured
+from kazo.claude.resilience import (
+    CircuitBreaker,
+    ClaudeCLIError,
+    ClaudeUnavailable,
+    backoff_delay,
+    call_with_breaker,
+    get_breaker,
+    is_retryable,
+    retry_async,
+)
+from kazo.main import _deferred_updates, error_boundary_middleware, replay_deferred_once
+
+
+@pytest.fixture(autouse=True)
+def clear_deferred():
+    _deferred_updates.clear()
+    yield
+    _deferred_updates.clear()
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_is_retryable_classification():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ClaudeCLIError("rc=1"))
+    assert is_retryable(_StatusError(529))
+    assert is_retryable(_StatusError(429))
+    assert not is_retryable(_StatusError(400))
+    assert not is_retryable(RuntimeError("no structured output"))
+    assert not is_retryable(ValueError())
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        delay = backoff_delay(attempt)
+        assert 0 <= delay <= 8.0
+
+
+@patch("kazo.claude.resilience.asyncio.sleep", new_callable=AsyncMock)
+async def test_retry_async_stops_on_non_retryable(mock_sleep):
+    fn = AsyncMock(side_effect=_StatusError(400))
+    with pytest.raises(_StatusError):
+        await retry_async(fn, retries=3, label="test")
+    assert fn.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@patch("kazo.claude.resilience.asyncio.sleep", new_callable=AsyncMock)
+async def test_retry_async_backs_off_between_attempts(mock_sleep):
+    fn = AsyncMock(side_effect=[TimeoutError(), TimeoutError(), "ok"])
+    assert await retry_async(fn, retries=3, label="test") == "ok"
+    assert fn.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(ClaudeUnavailable):
+        breaker.before_call()
+
+
+def test_breaker_half_open_allows_single_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 11
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(ClaudeUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10)
+    breaker.opened_at = time.monotonic() - 11
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+async def test_call_with_breaker_ignores_non_retryable_errors():
+    fn = AsyncMock(side_effect=RuntimeError("bad output"))
+    for _ in range(10):
+        with pytest.raises(RuntimeError):
+            await call_with_breaker("sdk", fn)
+    assert get_breaker("sdk").state == "closed"
+
+
+@patch("kazo.claude.client._use_sdk", return_value=True)
+@patch("kazo.claude.client._ask_sdk_structured", new_callable=AsyncMock)
+async def test_open_circuit_fails_fast(mock_sdk, _):
+    mock_sdk.side_effect = TimeoutError("slow")
+    for _ in range(5):
+        with pytest.raises(TimeoutError):
+            await ask_claude_structured("x", {"type": "object"})
+    with pytest.raises(ClaudeUnavailable):
+        await ask_claude_structured("x", {"type": "object"})
+    assert mock_sdk.call_count == 5
+
+
+async def test_middleware_queues_update_when_unavailable():
+    msg = MagicMock(spec=Message)
+    msg.chat = MagicMock(id=1)
+    msg.answer = AsyncMock()
+    handler = AsyncMock(side_effect=ClaudeUnavailable("sdk", 30))
+
+    await error_boundary_middleware(handler, msg, {})
+
+    assert "message queued" in msg.answer.call_args.args[0]
+    assert len(_deferred_updates) == 1
+    _, _, data = _deferred_updates[0]
+    assert data["claude_replay"] is True
+
+
+async def test_middleware_replay_failure_stays_silent():
+    msg = MagicMock(spec=Message)
+    msg.chat = MagicMock(id=1)
+    msg.answer = AsyncMock()
+    handler = AsyncMock(side_effect=ClaudeUnavailable("sdk", 30))
+
+    await error_boundary_middleware(handler, msg, {"claude_replay": True})
+
+    msg.answer.assert_not_called()
+    assert len(_deferred_updates) == 1
+
+
+@patch("kazo.main._claude_backend", return_value="sdk")
+@patch("kazo.claude.client._use_sdk", return_value=True)
+@patch("kazo.claude.client.get_state_backend")
+@patch("kazo.claude.client._ask_sdk_structured", new_callable=AsyncMock)
+async def test_replay_stops_while_probe_is_held(mock_sdk, mock_state, *_):
+    mock_state.return_value.hit = AsyncMock(return_value=True)
+    breaker = get_breaker("sdk")
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout  # half open
+    breaker.before_call()  # another request holds the probe
+    msg = MagicMock(spec=Message)
+    msg.chat = MagicMock(id=1)
+    msg.answer = AsyncMock()
+
+    async def handler(event, data):
+        return await ask_claude_structured("x", {"type": "object"}, chat_id=1)
+
+    _deferred_updates.append((handler, msg, {"claude_replay": True}))
+
+    await replay_deferred_once()
+
+    assert len(_deferred_updates) == 1
+    mock_state.return_value.hit.assert_not_awaited()  # the chat's quota is untouched
+    mock_sdk.assert_not_called()
+
+    breaker.record_success()
+    mock_sdk.return_value = {}
+    await replay_deferred_once()
+
+    assert not _deferred_updates
+    mock_state.return_value.hit.assert_awaited_once()
+
+
+async def test_update_deferred_again_keeps_its_place():
+    messages = []
+    for name in "abc":
+        msg = MagicMock(spec=Message)
+        msg.chat = MagicMock(id=1)
+        msg.answer = AsyncMock()
+        msg.text = name
+        messages.append(msg)
+    handler = AsyncMock(side_effect=ClaudeUnavailable("sdk", 30))
+    for msg in messages:
+        _deferred_updates.append((handler, msg, {"claude_replay": True}))
+
+    await replay_deferred_once()
+
+    handler.assert_awaited_once()
+    assert [event.text for _, event, _ in _deferred_updates] == ["a", "b", "c"]
@@ -0,0 +1,12 @@
+from scripts.startup_bench import lazy_violations, profile_import
+
+
+def test_startup_leaves_heavy_modules_lazy():
+    profile = profile_import()
+
+    assert profile.total_us > 0
+    assert lazy_violations(profile) == []
+
+
+def test_charts_package_import_is_light():
+    assert lazy_violations(profile_import("kazo.charts")) == []
@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import json
+import time
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import kazo.services.pending_store as pending_store_mod
+import kazo.state as state_mod
+from kazo.db.models import Expense
+from kazo.handlers.pending import PendingExpense, PendingGroup, _group_store, on_group_action
+from kazo.services.pending_store import PendingStore
+from kazo.state import MemoryStateBackend, SQLiteStateBackend, get_state_backend
+
+
+@pytest.fixture
+async def replicas(tmp_path):
+    """Two backends on one file, as two bot instances on a shared volume would have."""
+    path = str(tmp_path / "state.db")
+    a, b = SQLiteStateBackend(path, shared=True), SQLiteStateBackend(path, shared=True)
+    yield a, b
+    await a.close()
+    await b.close()
+
+
+@pytest.mark.parametrize("make", [MemoryStateBackend, SQLiteStateBackend])
+async def test_pending_roundtrip(make):
+    backend = make()
+    now = time.time()
+    await backend.put("ns", "k", "payload", now + 60)
+    assert await backend.get("ns", "k", now) == ("payload", now + 60)
+    assert await backend.live("ns", now) == [("k", now + 60)]
+    assert await backend.pop("ns", "k", now) == "payload"
+    assert await backend.pop("ns", "k", now) is None
+
+
+@pytest.mark.parametrize("make", [MemoryStateBackend, SQLiteStateBackend])
+async def test_delete_expired_returns_only_due(make):
+    backend = make()
+    now = time.time()
+    await backend.put("ns", "old", "a", now - 1)
+    await backend.put("ns", "new", "b", now + 60)
+    await backend.put("other", "old", "c", now - 1)
+
+    assert await backend.delete_expired("ns", now) == [("old", "a")]
+    assert await backend.get("ns", "new", now) is not None
+    assert await backend.get("ns", "old", now) is None
+
+
+@pytest.mark.parametrize("make", [MemoryStateBackend, SQLiteStateBackend])
+async def test_replace_only_from_expected_payload(make):
+    backend = make()
+    now = time.time()
+    await backend.put("ns", "k", "v1", now + 60)
+    assert await backend.replace("ns", "k", "v1", "v2", now)
+    assert not await backend.replace("ns", "k", "v1", "v3", now)
+    assert await backend.get("ns", "k", now) == ("v2", now + 60)
+    assert not await backend.replace("ns", "missing", "v1", "v2", now)
+
+
+async def test_expired_pop_returns_nothing():
+    backend = MemoryStateBackend()
+    await backend.put("ns", "k", "payload", time.time() - 1)
+    assert await backend.pop("ns", "k", time.time()) is None
+
+
+async def test_replicas_pop_once(replicas):
+    a, b = replicas
+    now = time.time()
+    await a.put("expense", "1:2", "payload", now + 60)
+
+    results = await asyncio.gather(a.pop("expense", "1:2", now), b.pop("expense", "1:2", now))
+
+    assert results.count("payload") == 1
+    assert results.count(None) == 1
+
+
+async def test_replicas_share_rate_limit(replicas):
+    a, b = replicas
+    assert await a.hit("claude:1", 3, 3600, cost=2)
+    assert not await b.hit("claude:1", 3, 3600, cost=2)
+    assert await b.hit("claude:1", 3, 3600)
+    assert not await a.hit("claude:1", 3, 3600)
+
+
+async def test_shared_pending_store_confirms_once(replicas, monkeypatch):
+    a, b = replicas
+    store_a = PendingStore("expense", 60, json.dumps, json.loads)
+    store_b = PendingStore("expense", 60, json.dumps, json.loads)
+
+    monkeypatch.setattr(state_mod, "_backend", a)
+    await store_a.put("1:2", {"amount": 5})
+    monkeypatch.setattr(state_mod, "_backend", b)
+    assert await store_b.get("1:2") == {"amount": 5}
+    assert await store_b.pop("1:2") == {"amount": 5}
+
+    monkeypatch.setattr(state_mod, "_backend", a)
+    assert await store_a.get("1:2") is None
+    assert await store_a.pop("1:2") is None
+
+
+async def test_replicas_claim_group_entries_once(replicas, monkeypatch):
+    a, b = replicas
+    replica: contextvars.ContextVar = contextvars.ContextVar("replica", default=a)
+    monkeypatch.setattr(pending_store_mod, "get_state_backend", replica.get)
+    expense = Expense(
+        id=None,
+        chat_id=100,
+        user_id=1,
+        store="Shop",
+        amount=5.0,
+        original_currency="EUR",
+        amount_base=5.0,
+        exchange_rate=1.0,
+        category="groceries",
+        items_json=None,
+        source="text",
+        expense_date=date(2026, 1, 31),
+    )
+    group = PendingGroup(entries=[PendingExpense(expense, "a"), PendingExpense(expense, "b")], status=[None, None])
+    await _group_store.put("100:300", group, group.created_at)
+
+    async def save(expenses, fingerprints):
+        await asyncio.sleep(0.01)  # both taps are in flight before either save finishes
+        return list(range(len(expenses)))
+
+    def tap(backend):
+        callback = AsyncMock()
+        callback.message.chat.id = 100
+        callback.message.message_id = 300
+        callback.data = "expense:group:confirm:all"
+
+        async def run():
+            replica.set(backend)
+            await on_group_action(callback)
+
+        return callback, run()
+
+    (first, run_a), (second, run_b) = tap(a), tap(b)
+    with (
+        patch("kazo.handlers.pending.save_expenses", new_callable=AsyncMock, side_effect=save) as mock_save,
+        patch("kazo.handlers.pending.link_group_message", new_callable=AsyncMock),
+        patch("kazo.handlers.pending.notify_budget_alerts", new_callable=AsyncMock),
+    ):
+        await asyncio.gather(run_a, run_b)
+    _group_store.cache.clear()
+
+    mock_save.assert_awaited_once()
+    assert len(mock_save.call_args.args[0]) == 2
+    answers = [first.answer.call_args.args[0], second.answer.call_args.args[0]]
+    assert sorted(answers) == ["2 receipts saved.", "Already handled."]
+
+
+def test_backend_selected_from_settings(monkeypatch):
+    monkeypatch.setattr(state_mod, "_backend", None)
+    monkeypatch.setattr(state_mod.settings, "state_backend", "memory")
+    assert isinstance(get_state_backend(), MemoryStateBackend)
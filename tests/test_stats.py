@@ -0,0 +1,112 @@
+from kazo.db.database import get_db
+from kazo.db.models import Expense
+from kazo.services.expense_service import delete_last_expense, save_expense, update_expense
+from kazo.services.stats_service import ensure_stats, rebuild_stats, verify_stats
+from kazo.services.summary_service import all_time_stats
+
+
+def _exp(**kw) -> Expense:
+    defaults = dict(
+        id=None,
+        chat_id=1,
+        user_id=1,
+        store=None,
+        amount=10.0,
+        original_currency="EUR",
+        amount_base=10.0,
+        exchange_rate=1.0,
+        category="groceries",
+        items_json=None,
+        source="text",
+        expense_date="2025-03-01",
+    )
+    defaults.update(kw)
+    return Expense(**defaults)
+
+
+async def _seed():
+    await save_expense(_exp(store="Lidl", amount_base=30.0, expense_date="2025-02-10"))
+    await save_expense(_exp(store="Lidl", amount_base=20.0, expense_date="2025-03-05"))
+    await save_expense(_exp(category="dining", store="Cafe", amount_base=15.0, expense_date="2025-03-07"))
+    await save_expense(_exp(category=None, amount_base=5.0, expense_date="2025-03-09"))
+    await save_expense(_exp(chat_id=2, amount_base=99.0))
+
+
+async def test_stats_follow_inserts():
+    await _seed()
+
+    stats = await all_time_stats(1)
+
+    assert stats["count"] == 4
+    assert stats["total"] == 70.0
+    assert stats["avg_expense"] == 17.5
+    assert stats["max_expense"] == 30.0
+    assert (stats["first_date"], stats["last_date"]) == ("2025-02-10", "2025-03-09")
+    assert stats["top_categories"][0] == {"category": "groceries", "total": 50.0}
+    assert {"category": None, "total": 5.0} in stats["top_categories"]
+    assert stats["top_stores"][0] == {"store": "Lidl", "total": 50.0, "count": 2}
+    assert stats["monthly_comparison"] == [{"month": "2025-03", "total": 40.0}, {"month": "2025-02", "total": 30.0}]
+
+
+async def test_stats_follow_updates_and_deletes():
+    await _seed()
+    db = await get_db()
+    cursor = await db.execute("SELECT id FROM expenses WHERE chat_id = 1 AND amount_base = 30.0")
+    biggest = (await cursor.fetchone())["id"]
+
+    await update_expense(biggest, category="dining", store="Cafe")
+    await delete_last_expense(1)  # the uncategorised 5.00 on the last date
+    await db.execute("DELETE FROM expenses WHERE id = ?", (biggest,))
+    await db.commit()
+
+    stats = await all_time_stats(1)
+    assert stats["count"] == 2
+    assert stats["total"] == 35.0
+    assert stats["max_expense"] == 20.0
+    assert (stats["first_date"], stats["last_date"]) == ("2025-03-05", "2025-03-07")
+    assert stats["top_categories"] == [{"category": "groceries", "total": 20.0}, {"category": "dining", "total": 15.0}]
+    assert stats["monthly_comparison"] == [{"month": "2025-03", "total": 35.0}]
+    assert await verify_stats() == []
+
+
+async def test_stats_gone_when_chat_has_no_expenses():
+    await save_expense(_exp())
+    await delete_last_expense(1)
+
+    assert await all_time_stats(1) is None
+
+
+async def test_verify_repairs_drift():
+    await _seed()
+    db = await get_db()
+    await db.execute("UPDATE chat_store_stats SET total = total + 1 WHERE chat_id = 1 AND store = 'Lidl'")
+    await db.execute("DELETE FROM chat_month_stats WHERE chat_id = 2")
+    await db.commit()
+
+    assert await verify_stats() == [1, 2]
+    assert await verify_stats() == []
+    assert (await all_time_stats(1))["top_stores"][0]["total"] == 50.0
+
+
+async def test_ensure_stats_backfills():
+    await _seed()
+    db = await get_db()
+    for table in ("chat_stats", "chat_category_stats", "chat_store_stats", "chat_month_stats"):
+        await db.execute(f"DELETE FROM {table}")
+    await db.commit()
+
+    await ensure_stats()
+
+    assert (await all_time_stats(1))["count"] == 4
+    assert (await all_time_stats(2))["total"] == 99.0
+
+
+async def test_rebuild_single_chat_leaves_others():
+    await _seed()
+    db = await get_db()
+    await db.execute("UPDATE chat_stats SET count = 100 WHERE chat_id = 2")
+    await db.commit()
+
+    await rebuild_stats(1)
+
+    assert (await all_time_stats(2))["count"] == 100
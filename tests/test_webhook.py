@@ -0,0 +1,237 @@
+import asyncio
+import os
+import signal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.types import Update
+from aiohttp.test_utils import TestClient, TestServer
+from pydantic import ValidationError
+
+from kazo.config import Settings
+from kazo.webhook import SECRET_HEADER, UpdatePool, build_webhook_app
+
+UPDATE = {
+    "update_id": 7,
+    "message": {
+        "message_id": 1,
+        "date": 1760000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Ana"},
+        "text": "12 lunch",
+    },
+}
+
+
+def _pool(queue_size=10, workers=2, chat_queue_size=0):
+    dp = MagicMock()
+    dp.feed_update = AsyncMock()
+    return UpdatePool(dp, MagicMock(), workers=workers, queue_size=queue_size, chat_queue_size=chat_queue_size)
+
+
+def test_webhook_mode_requires_secret():
+    with pytest.raises(ValidationError, match="WEBHOOK_SECRET"):
+        Settings(telegram_bot_token="x", webhook_url="https://bot.example.com", webhook_secret=None, _env_file=None)
+    with pytest.raises(ValidationError, match="WEBHOOK_SECRET"):
+        Settings(telegram_bot_token="x", webhook_url="https://bot.example.com", webhook_secret="", _env_file=None)
+
+    assert Settings(telegram_bot_token="x", webhook_url="https://bot.example.com", webhook_secret="s", _env_file=None)
+    assert Settings(telegram_bot_token="x", webhook_url="", webhook_secret="", _env_file=None)
+
+
+async def test_webhook_rejects_bad_secret():
+    pool = _pool()
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook", "s3cret"))) as client:
+        resp = await client.post("/hook", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+        assert resp.status == 401
+        resp = await client.post("/hook", json=UPDATE)
+        assert resp.status == 401
+    pool.dp.feed_update.assert_not_awaited()
+
+
+async def test_webhook_acks_and_processes_update():
+    pool = _pool()
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook", "s3cret"))) as client:
+        resp = await client.post("/hook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+        assert resp.status == 200
+        await asyncio.wait_for(pool.queue.join(), 1)
+
+    pool.dp.feed_update.assert_awaited_once()
+    update = pool.dp.feed_update.call_args.args[1]
+    assert update.update_id == 7
+    assert update.message.text == "12 lunch"
+    assert pool.stats()["processed"] == 1
+
+
+async def test_webhook_acks_before_handler_finishes():
+    pool = _pool()
+    release = asyncio.Event()
+
+    async def slow_feed(bot, update):
+        await release.wait()
+
+    pool.dp.feed_update.side_effect = slow_feed
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        resp = await asyncio.wait_for(client.post("/hook", json=UPDATE), 1)
+        assert resp.status == 200
+        release.set()
+
+
+async def test_webhook_full_queue_asks_for_retry():
+    pool = _pool(queue_size=1, workers=0)
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        assert (await client.post("/hook", json=UPDATE)).status == 200
+        assert (await client.post("/hook", json={**UPDATE, "update_id": 8})).status == 503
+        pool.queue.get_nowait()
+        pool.queue.task_done()
+
+
+async def test_webhook_rejects_malformed_body():
+    pool = _pool()
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        resp = await client.post("/hook", data=b"not json")
+        assert resp.status == 400
+
+
+async def test_webhook_app_serves_health():
+    async def health():
+        return True, {"status": "healthy", "checks": {"db": "ok"}}
+
+    pool = _pool()
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook", health=health))) as client:
+        resp = await client.get("/health")
+        body = await resp.json()
+    assert resp.status == 200
+    assert body["checks"]["webhook"] == {"queued": 0, "processed": 0, "failed": 0, "dropped": 0}
+
+
+async def test_failed_update_does_not_stop_worker():
+    pool = _pool(workers=1)
+    pool.dp.feed_update.side_effect = [RuntimeError("boom"), None]
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        await client.post("/hook", json=UPDATE)
+        await client.post("/hook", json={**UPDATE, "update_id": 8})
+        await asyncio.wait_for(pool.queue.join(), 1)
+    assert pool.stats() == {"queued": 0, "processed": 1, "failed": 1, "dropped": 0}
+
+
+def _update(update_id: int, chat_id: int, **message) -> dict:
+    return {
+        **UPDATE,
+        "update_id": update_id,
+        "message": {**UPDATE["message"], "chat": {"id": chat_id, "type": "private"}, **message},
+    }
+
+
+async def test_busy_chat_holds_one_worker():
+    pool = _pool(workers=2)
+    release = asyncio.Event()
+    seen: list[int] = []
+
+    async def feed(bot, update):
+        seen.append(update.update_id)
+        if update.message.chat.id == 1:
+            await release.wait()
+
+    pool.dp.feed_update.side_effect = feed
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        for update_id in (1, 2, 3):
+            await client.post("/hook", json=_update(update_id, chat_id=1))
+        await client.post("/hook", json=_update(4, chat_id=2))
+        for _ in range(50):
+            if 4 in seen:
+                break
+            await asyncio.sleep(0.01)
+        assert seen == [1, 4]  # chat 2 is served while chat 1's first update is stuck
+        assert pool.stats()["queued"] == 2
+
+        release.set()
+        await asyncio.wait_for(pool.queue.join(), 1)
+    assert seen == [1, 4, 2, 3]
+
+
+async def test_album_parts_of_busy_chat_run_alongside():
+    pool = _pool(workers=2)
+    release = asyncio.Event()
+    seen: list[int] = []
+
+    async def feed(bot, update):
+        seen.append(update.update_id)
+        if update.update_id == 1:
+            await release.wait()
+
+    pool.dp.feed_update.side_effect = feed
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        await client.post("/hook", json=_update(1, chat_id=1, media_group_id="a1"))
+        await client.post("/hook", json=_update(2, chat_id=1, media_group_id="a1"))
+        for _ in range(50):
+            if 2 in seen:
+                break
+            await asyncio.sleep(0.01)
+        assert seen == [1, 2]
+        release.set()
+        await asyncio.wait_for(pool.queue.join(), 1)
+
+
+async def test_flooding_chat_is_capped_and_others_get_through():
+    pool = _pool(queue_size=100, workers=2, chat_queue_size=3)
+    release = asyncio.Event()
+    seen: list[int] = []
+
+    async def feed(bot, update):
+        seen.append(update.update_id)
+        if update.message.chat.id == 1:
+            await release.wait()
+
+    pool.dp.feed_update.side_effect = feed
+    async with TestClient(TestServer(build_webhook_app(pool, "/hook"))) as client:
+        for update_id in range(1, 11):
+            resp = await client.post("/hook", json=_update(update_id, chat_id=1))
+            assert resp.status == 200
+        await client.post("/hook", json=_update(11, chat_id=2))
+        for _ in range(50):
+            if 11 in seen:
+                break
+            await asyncio.sleep(0.01)
+        assert seen == [1, 11]
+        assert pool.stats()["queued"] == 3  # chat 1's backlog stops at the cap
+        assert pool.stats()["dropped"] == 6
+
+        release.set()
+        await asyncio.wait_for(pool.queue.join(), 1)
+    assert seen == [1, 11, 2, 3, 4]
+
+
+async def test_sigterm_drains_pool_before_exit(monkeypatch):
+    from kazo import main
+
+    pool = _pool(workers=1)
+    release = asyncio.Event()
+    seen: list[int] = []
+
+    async def feed(bot, update):
+        await release.wait()
+        seen.append(update.update_id)
+
+    pool.dp.feed_update.side_effect = feed
+    bot = AsyncMock()
+    monkeypatch.setattr(main.settings, "webhook_url", "https://example.test")
+    monkeypatch.setattr(main.settings, "webhook_secret", "s3cret")
+    monkeypatch.setattr(main, "UpdatePool", MagicMock(return_value=pool))
+    monkeypatch.setattr(main.web, "TCPSite", MagicMock(return_value=MagicMock(start=AsyncMock())))
+
+    task = asyncio.create_task(main._run_webhook(MagicMock(), bot))
+    for _ in range(50):
+        if bot.set_webhook.await_count:
+            break
+        await asyncio.sleep(0.01)
+    assert pool.submit(Update.model_validate(UPDATE))
+
+    os.kill(os.getpid(), signal.SIGTERM)
+    await asyncio.sleep(0.05)
+    assert not task.done()  # still draining the acknowledged update
+    assert not pool.submit(Update.model_validate({**UPDATE, "update_id": 8}))  # refused, so Telegram retries
+
+    release.set()
+    await asyncio.wait_for(task, 1)
+    assert seen == [7]